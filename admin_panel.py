@@ -1,12 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import mysql.connector
 from mysql.connector import Error
 import hashlib
 import os
+import billing_service
+import changes
+import db
+import ledger
+import migrations
+import pc_overview
+import query_stats
+import sessions
 import shutil
+import station_grid
+import time
+from datetime import timedelta
 from PIL import Image, ImageTk
-from datetime import datetime
+
+ADMIN_PC_POLL_INTERVAL = 5  # seconds between overview polls; countdowns tick every second
+# Billing charges and top-ups leave pc_units' row_version alone, so balances come from a full reload
+ADMIN_PC_RESYNC_INTERVAL = 60
+# A change in any of these rebuilds a card's widgets; other changes patch labels in place
+ADMIN_PC_CARD_KEYS = ('status', 'is_locked', 'current_user_id', 'current_session_id', 'session_start',
+                      'username')
 
 class AdminApp:
     def __init__(self, root):
@@ -37,9 +53,20 @@ class AdminApp:
         
         self.root.configure(bg=self.bg_color)
         
+        # Screen loads run here so slow MySQL never freezes the panel
+        self.db_executor = db.DatabaseExecutor(self.root)
+        
         self.current_admin = None
-        self.db_connection = None
+        self.admin_pc_grid = None
         self.admin_pc_frames_data = {}
+        self.admin_pc_rows = {}      # unit_name -> latest overview row, merged from change polls
+        self.admin_pc_version = 0    # highest pc_units row_version seen
+        self.admin_pc_summary_label = None
+        self.admin_pc_tick_id = None
+        self.admin_pc_poll_pending = False
+        self.admin_pc_poll_requested = False   # an admin write wants the next tick to poll
+        self.admin_pc_next_poll = 0
+        self.admin_pc_next_resync = 0
         
         # Create images directory if it doesn't exist
         self.images_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
@@ -51,65 +78,9 @@ class AdminApp:
         self.show_admin_login()
     
     def setup_database(self):
-        """Setup database connection"""
+        """Bring the database schema up to date (a single SELECT once fully migrated)"""
         try:
-            self.db_connection = mysql.connector.connect(
-                host='localhost',
-                port=3306,
-                user='root',
-                password='',
-                database='internet_cafe',
-                use_pure=True  # Fix for authentication plugin issue
-            )
-            
-            if self.db_connection.is_connected():
-                cursor = self.db_connection.cursor()
-                
-                # Create admins table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS admins (
-                        admin_id INT AUTO_INCREMENT PRIMARY KEY,
-                        username VARCHAR(50) UNIQUE NOT NULL,
-                        password VARCHAR(255) NOT NULL,
-                        full_name VARCHAR(100) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Create default admin if none exists
-                cursor.execute("SELECT COUNT(*) FROM admins")
-                if cursor.fetchone()[0] == 0:
-                    default_password = hashlib.sha256("admin123".encode()).hexdigest()
-                    cursor.execute(
-                        "INSERT INTO admins (username, password, full_name) VALUES (%s, %s, %s)",
-                        ('admin', default_password, 'System Administrator')
-                    )
-                    print("Default admin created - Username: admin, Password: admin123")
-                
-                # Check if image_path column exists
-                cursor.execute("SHOW COLUMNS FROM cafe_items LIKE 'image_path'")
-                if not cursor.fetchone():
-                    cursor.execute("ALTER TABLE cafe_items ADD COLUMN image_path VARCHAR(255) DEFAULT NULL")
-                    print("✓ Added image_path column to cafe_items")
-                
-                # Create inventory_items table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS inventory_items (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        name VARCHAR(100) NOT NULL,
-                        category VARCHAR(50) DEFAULT NULL,
-                        quantity INT DEFAULT 0,
-                        unit_price DECIMAL(10,2) DEFAULT 0.00,
-                        min_stock_level INT DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-                    )
-                """)
-                print("✓ Inventory table created/verified")
-                
-                self.db_connection.commit()
-                cursor.close()
-                
+            migrations.migrate()
         except Error as e:
             messagebox.showerror("Database Error", f"Error connecting to database: {e}")
     
@@ -141,21 +112,6 @@ class AdminApp:
             entry.config(show="*")
             var.set(True)
     
-    def refresh_db_connection(self):
-        """Refresh database connection to ensure fresh data"""
-        try:
-            if self.db_connection and self.db_connection.is_connected():
-                # Consume any unread results
-                try:
-                    cursor = self.db_connection.cursor()
-                    cursor.fetchall()  # Consume any unread results
-                    cursor.close()
-                except:
-                    pass
-                self.db_connection.commit()
-        except Error:
-            self.setup_database()
-    
     def clear_window(self):
         """Clear all widgets from root window"""
         for widget in self.root.winfo_children():
@@ -216,15 +172,12 @@ class AdminApp:
             return
         
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
             hashed_pw = self.hash_password(password)
             
-            cursor.execute(
+            admin = db.fetchone(
                 "SELECT * FROM admins WHERE username = %s AND password = %s",
                 (username, hashed_pw)
             )
-            admin = cursor.fetchone()
-            cursor.close()
             
             if admin:
                 self.current_admin = admin
@@ -280,6 +233,9 @@ class AdminApp:
                           command=command)
             btn.pack(fill='x', ipady=12, pady=1)
         
+        # Hidden diagnostics screen for tracking down slow queries
+        self.root.bind('<Control-Shift-D>', lambda e: self.show_query_diagnostics(content))
+        
         self.show_pc_overview(content)
     
     def show_pc_overview(self, parent):
@@ -314,180 +270,188 @@ class AdminApp:
                             command=lambda: self.show_pc_overview(parent))
         refresh_btn.pack(side='left')
         
-        # Status summary
-        try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT status, COUNT(*) as count FROM pc_units GROUP BY status")
-            status_counts = cursor.fetchall()
-            cursor.close()
+        loading_label = tk.Label(container, text="Loading PC units...", font=("Segoe UI", 14),
+                                bg=self.bg_color, fg=self.text_secondary)
+        loading_label.pack(pady=20)
+        
+        self.db_executor.submit(
+            self.load_pc_overview_data,
+            on_success=lambda data: self.render_pc_overview(container, loading_label, parent, data),
+            on_error=lambda e: self.render_pc_overview(container, loading_label, parent, None, e)
+        )
+    
+    def load_pc_overview_data(self):
+        """Worker half of show_pc_overview: fetch everything the grid needs in one query"""
+        pc_units = pc_overview.load()
+        
+        if not pc_units:
+            with db.transaction() as tx:
+                tx.executemany("""
+                    INSERT IGNORE INTO pc_units (unit_name, status) VALUES (%s, %s)
+                """, pc_overview.default_pc_units())
             
+            pc_units = pc_overview.load()
+        
+        # The summary counts the same rows the grid shows
+        return {'status_counts': pc_overview.status_counts(pc_units), 'pc_units': pc_units}
+    
+    def render_pc_overview(self, container, loading_label, parent, data, error=None):
+        """Build the PC grid on the Tk thread from load_pc_overview_data's result"""
+        # The admin navigated away (or pressed Refresh) before the data arrived
+        if not container.winfo_exists():
+            return
+        loading_label.destroy()
+        
+        # Status summary
+        self.admin_pc_summary_label = None
+        if data:
             summary_frame = tk.Frame(container, bg=self.bg_color)
             summary_frame.pack(fill='x', pady=(0, 20))
             
-            summary_text = " | ".join([f"{s['status']}: {s['count']}" for s in status_counts])
-            tk.Label(summary_frame, text=f"Status Summary: {summary_text}", font=("Segoe UI", 14),
-                    bg=self.bg_color, fg=self.text_secondary).pack()
-        except:
-            pass
+            self.admin_pc_summary_label = tk.Label(summary_frame, text=self.format_status_summary(data['status_counts']),
+                                                   font=("Segoe UI", 14), bg=self.bg_color, fg=self.text_secondary)
+            self.admin_pc_summary_label.pack()
         
-        # PC Units grid
-        grid_frame = tk.Frame(container, bg=self.bg_color)
+        # PC Units grid; only the cards in view exist, so any number of PCs scrolls smoothly
+        grid_frame = station_grid.StationGrid(
+            container, lambda pc_frame, pc: self.build_admin_pc_card(pc_frame, pc, parent),
+            card_width=450, card_height=180, gap=15, bg=self.bg_color, fg=self.text_secondary,
+            card_options={'bg': self.secondary_bg, 'relief': 'raised', 'bd': 2})
         grid_frame.pack(fill='both', expand=True)
+        self.admin_pc_grid = grid_frame
+        self.admin_pc_frames_data = grid_frame.cards
         
         try:
-            self.refresh_db_connection()
-            
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM pc_units ORDER BY unit_name")
-            pc_units = cursor.fetchall()
-            cursor.close()
-            
-            if not pc_units:
-                cursor = self.db_connection.cursor()
-                for i in range(1, 11):
-                    cursor.execute("""
-                        INSERT IGNORE INTO pc_units (unit_name, status, current_user_id, session_start) 
-                        VALUES (%s, %s, %s, %s)
-                    """, (f'PC-{i:02d}', 'Available', None, None))
-                self.db_connection.commit()
-                cursor.close()
-                
-                cursor = self.db_connection.cursor(dictionary=True)
-                cursor.execute("SELECT * FROM pc_units ORDER BY unit_name")
-                pc_units = cursor.fetchall()
-                cursor.close()
-            
-            for i, pc in enumerate(pc_units[:10]):
-                row = i // 2
-                col = i % 2
-                
-                pc_frame = tk.Frame(grid_frame, bg=self.secondary_bg, relief='raised', bd=2, 
-                                   width=450, height=180)
-                pc_frame.grid(row=row, column=col, padx=15, pady=15, sticky='nsew')
-                pc_frame.pack_propagate(False)
-                
-                # PC name
-                name_label = tk.Label(pc_frame, text=pc['unit_name'], font=("Segoe UI", 18, "bold"),
-                        bg=self.secondary_bg, fg=self.text_color)
-                name_label.pack(pady=8)
-                
-                # Status with color
-                status_color = self.get_pc_status_color(pc['status'])
-                status_label = tk.Label(pc_frame, text=f"Status: {pc['status']}", font=("Segoe UI", 13),
-                        bg=self.secondary_bg, fg=status_color)
-                status_label.pack()
-                
-                # Store frame references
-                frame_data = {
-                    'frame': pc_frame,
-                    'name_label': name_label,
-                    'status_label': status_label,
-                    'pc_data': pc,
-                    'user_label': None,
-                    'time_label': None,
-                    'remaining_label': None,
-                    'end_button': None
-                }
-                
-                # Current user if occupied
-                if pc['status'] == 'Occupied' and pc['current_user_id']:
-                    try:
-                        user_cursor = self.db_connection.cursor(dictionary=True)
-                        user_cursor.execute("""
-                            SELECT username, session_time_limit FROM users WHERE user_id = %s
-                        """, (pc['current_user_id'],))
-                        user = user_cursor.fetchone()
-                        user_cursor.close()
-                        
-                        if user:
-                            user_label = tk.Label(pc_frame, text=f"User: {user['username']}", 
-                                                 font=("Segoe UI", 11, "bold"),
-                                    bg=self.secondary_bg, fg=self.text_color)
-                            user_label.pack(pady=(8, 0))
-                            frame_data['user_label'] = user_label
-                            
-                            # Session time
-                            if pc['session_start']:
-                                duration = datetime.now() - pc['session_start']
-                                elapsed_minutes = int(duration.total_seconds() / 60)
-                                time_limit = user['session_time_limit']
-                                remaining_minutes = max(0, time_limit - elapsed_minutes)
-                                
-                                hours, minutes = divmod(elapsed_minutes, 60)
-                                rem_hours, rem_mins = divmod(remaining_minutes, 60)
-                                
-                                time_label = tk.Label(pc_frame, text=f"Used: {hours:02d}:{minutes:02d}", 
-                                                     font=("Segoe UI", 10),
-                                        bg=self.secondary_bg, fg=self.text_secondary)
-                                time_label.pack()
-                                frame_data['time_label'] = time_label
-                                
-                                rem_color = self.danger_color if remaining_minutes <= 10 else (
-                                    self.warning_color if remaining_minutes < 30 else self.text_secondary
-                                )
-                                
-                                remaining_label = tk.Label(pc_frame, text=f"Left: {rem_hours:02d}:{rem_mins:02d}", 
-                                                          font=("Segoe UI", 10, "bold" if remaining_minutes < 30 else "normal"),
-                                        bg=self.secondary_bg, fg=rem_color)
-                                remaining_label.pack()
-                                frame_data['remaining_label'] = remaining_label
-                                
-                                # Auto-logout if expired
-                                if remaining_minutes <= 0:
-                                    self.auto_logout_expired_session(pc['id'])
-                    except:
-                        pass
-                
-                # Force logout button
-                if pc['status'] == 'Occupied':
-                    end_btn = tk.Button(pc_frame, text="⚡", font=("Segoe UI", 11, "bold"),
-                                       bg=self.danger_color, fg=self.text_color, bd=0, cursor="hand2",
-                                       width=3, height=1,
-                                       command=lambda pc_id=pc['id']: self.end_pc_session(pc_id, parent))
-                    end_btn.place(x=405, y=5)
-                else:
-                    end_btn = tk.Button(pc_frame, text="⚡", font=("Segoe UI", 11, "bold"),
-                                       bg="#6c757d", fg=self.text_color, bd=0, cursor="arrow",
-                                       width=3, height=1, state='disabled')
-                    end_btn.place(x=405, y=5)
-                
-                frame_data['end_button'] = end_btn
-                self.admin_pc_frames_data[pc['unit_name']] = frame_data
-
-                frame_data['end_button'] = end_btn
-                
-            
-                if pc['status'] != 'Occupied':
-                    is_locked = pc.get('is_locked', False)
-                    lock_text = "🔓" if is_locked else "🔒"
-                    lock_color = self.success_color if is_locked else "#6c757d"
-                    
-                    lock_btn = tk.Button(pc_frame, text=lock_text, font=("Segoe UI", 11, "bold"),
-                                        bg=lock_color, fg=self.text_color, bd=0, cursor="hand2",
-                                        width=3, height=1,
-                                        command=lambda pc_id=pc['id'], locked=is_locked: self.toggle_pc_lock(pc_id, locked, parent))
-                    lock_btn.place(x=360, y=5)
-                    frame_data['lock_button'] = lock_btn
-                else:
-                    # Can't lock occupied PC
-                    lock_btn = tk.Button(pc_frame, text="🔒", font=("Segoe UI", 11, "bold"),
-                                        bg="#3d3d3d", fg=self.text_color, bd=0, cursor="arrow",
-                                        width=3, height=1, state='disabled')
-                    lock_btn.place(x=360, y=5)
-                    frame_data['lock_button'] = lock_btn
-                
-                
-                self.admin_pc_frames_data[pc['unit_name']] = frame_data
+            if error is not None:
+                raise error
             
-            for i in range(5):
-                grid_frame.grid_rowconfigure(i, weight=1)
-            for i in range(2):
-                grid_frame.grid_columnconfigure(i, weight=1)
+            self.admin_pc_rows = {pc['unit_name']: pc for pc in data['pc_units']}
+            self.admin_pc_version = changes.latest(data['pc_units'], 0)
+            grid_frame.set_items(data['pc_units'])
                 
         except Error as e:
             messagebox.showerror("Database Error", f"Error loading PC units: {e}")
         
-        self.root.after(5000, lambda: self.refresh_admin_pc_data(parent))
+        # One live-update loop per grid: a new grid replaces the old loop
+        if self.admin_pc_tick_id is not None:
+            self.root.after_cancel(self.admin_pc_tick_id)
+        self.admin_pc_next_poll = time.monotonic() + ADMIN_PC_POLL_INTERVAL
+        self.admin_pc_next_resync = time.monotonic() + ADMIN_PC_RESYNC_INTERVAL
+        self.admin_pc_tick_id = self.root.after(1000, lambda: self.tick_admin_pc_cards(grid_frame, parent))
+    
+    def format_status_summary(self, status_counts):
+        summary_text = " | ".join([f"{s['status']}: {s['count']}" for s in status_counts])
+        return f"Status Summary: {summary_text}"
+    
+    def build_admin_pc_card(self, pc_frame, pc, parent):
+        """Fill an empty card frame for one pc_overview row; returns its frame_data"""
+        # PC name
+        name_label = tk.Label(pc_frame, text=pc['unit_name'], font=("Segoe UI", 18, "bold"),
+                bg=self.secondary_bg, fg=self.text_color)
+        name_label.pack(pady=8)
+        
+        # Status with color
+        status_color = self.get_pc_status_color(pc['status'])
+        status_label = tk.Label(pc_frame, text=f"Status: {pc['status']}", font=("Segoe UI", 13),
+                bg=self.secondary_bg, fg=status_color)
+        status_label.pack()
+        
+        # Store frame references
+        frame_data = {
+            'frame': pc_frame,
+            'name_label': name_label,
+            'status_label': status_label,
+            'pc_data': pc,
+            'read_at': pc['read_at'],
+            'user_label': None,
+            'time_label': None,
+            'remaining_label': None,
+            'end_button': None
+        }
+        
+        # Current user if occupied
+        if pc['status'] == 'Occupied' and pc['username']:
+            user_label = tk.Label(pc_frame, text=self.format_pc_user(pc), font=("Segoe UI", 11, "bold"),
+                    bg=self.secondary_bg, fg=self.text_color)
+            user_label.pack(pady=(8, 0))
+            frame_data['user_label'] = user_label
+            
+            # Session time; "Left" runs to the projected expiry (time limit or balance)
+            if pc['elapsed_minutes'] is not None:
+                time_label = tk.Label(pc_frame, font=("Segoe UI", 10),
+                        bg=self.secondary_bg, fg=self.text_secondary)
+                time_label.pack()
+                frame_data['time_label'] = time_label
+                
+                remaining_label = tk.Label(pc_frame, bg=self.secondary_bg)
+                remaining_label.pack()
+                frame_data['remaining_label'] = remaining_label
+                self.update_admin_pc_countdown(frame_data)
+        
+        # Force logout button
+        if pc['status'] == 'Occupied':
+            end_btn = tk.Button(pc_frame, text="⚡", font=("Segoe UI", 11, "bold"),
+                               bg=self.danger_color, fg=self.text_color, bd=0, cursor="hand2",
+                               width=3, height=1,
+                               command=lambda pc_id=pc['id']: self.end_pc_session(pc_id, parent))
+            end_btn.place(x=405, y=5)
+        else:
+            end_btn = tk.Button(pc_frame, text="⚡", font=("Segoe UI", 11, "bold"),
+                               bg="#6c757d", fg=self.text_color, bd=0, cursor="arrow",
+                               width=3, height=1, state='disabled')
+            end_btn.place(x=405, y=5)
+        
+        frame_data['end_button'] = end_btn
+        
+        if pc['status'] != 'Occupied':
+            is_locked = pc.get('is_locked', False)
+            lock_text = "🔓" if is_locked else "🔒"
+            lock_color = self.success_color if is_locked else "#6c757d"
+            
+            lock_btn = tk.Button(pc_frame, text=lock_text, font=("Segoe UI", 11, "bold"),
+                                bg=lock_color, fg=self.text_color, bd=0, cursor="hand2",
+                                width=3, height=1,
+                                command=lambda pc_id=pc['id'], locked=is_locked: self.toggle_pc_lock(pc_id, locked, parent))
+            lock_btn.place(x=360, y=5)
+            frame_data['lock_button'] = lock_btn
+        else:
+            # Can't lock occupied PC
+            lock_btn = tk.Button(pc_frame, text="🔒", font=("Segoe UI", 11, "bold"),
+                                bg="#3d3d3d", fg=self.text_color, bd=0, cursor="arrow",
+                                width=3, height=1, state='disabled')
+            lock_btn.place(x=360, y=5)
+            frame_data['lock_button'] = lock_btn
+        
+        return frame_data
+    
+    def format_pc_user(self, pc):
+        return f"User: {pc['username']} · ₱{float(pc['account_balance']):.2f}"
+    
+    def update_admin_pc_countdown(self, frame_data):
+        """Advance a card's Used/Left labels on the local clock since its last poll"""
+        pc = frame_data['pc_data']
+        if frame_data['time_label'] is None:
+            return
+        now = pc['db_now'] + timedelta(seconds=time.monotonic() - frame_data['read_at'])
+        elapsed_minutes = int((now - pc['session_start']).total_seconds() // 60)
+        remaining_minutes = max(0, int((pc['expires_at'] - now).total_seconds() // 60))
+        hours, minutes = divmod(elapsed_minutes, 60)
+        rem_hours, rem_mins = divmod(remaining_minutes, 60)
+        
+        used_text = f"Used: {hours:02d}:{minutes:02d}"
+        left_text = f"Left: {rem_hours:02d}:{rem_mins:02d}"
+        # Labels are only touched when their minute changes
+        if frame_data.get('used_text') != used_text:
+            frame_data['time_label'].config(text=used_text)
+            frame_data['used_text'] = used_text
+        if frame_data.get('left_text') != left_text:
+            rem_color = self.danger_color if remaining_minutes <= 10 else (
+                self.warning_color if remaining_minutes < 30 else self.text_secondary
+            )
+            frame_data['remaining_label'].config(
+                text=left_text, fg=rem_color,
+                font=("Segoe UI", 10, "bold" if remaining_minutes < 30 else "normal"))
+            frame_data['left_text'] = left_text
     
     def get_pc_status_color(self, status):
         """Get color for PC status"""
@@ -499,48 +463,90 @@ class AdminApp:
         }
         return colors.get(status, self.text_color)
     
-    def refresh_admin_pc_data(self, parent):
-        """Refresh PC data without redrawing"""
-        try:
-            if hasattr(self, 'admin_pc_frames_data') and self.admin_pc_frames_data:
-                self.refresh_db_connection()
-                
-                cursor = self.db_connection.cursor(dictionary=True)
-                cursor.execute("SELECT * FROM pc_units ORDER BY unit_name")
-                pc_units = cursor.fetchall()
-                cursor.close()
-                
-                for pc in pc_units[:10]:
-                    pc_name = pc['unit_name']
-                    if pc_name in self.admin_pc_frames_data:
-                        frame_data = self.admin_pc_frames_data[pc_name]
-                        old_pc_data = frame_data['pc_data']
-                        
-                        if (old_pc_data['status'] != pc['status'] or 
-                            old_pc_data['current_user_id'] != pc['current_user_id'] or
-                            old_pc_data['session_start'] != pc['session_start']):
-                            
-                            # Update will be handled on next full refresh
-                            pass
-                
-                self.root.after(5000, lambda: self.refresh_admin_pc_data(parent))
-                
-        except Exception as e:
-            print(f"Error refreshing admin PC data: {e}")
-            self.root.after(10000, lambda: self.refresh_admin_pc_data(parent))
+    def tick_admin_pc_cards(self, grid_frame, parent):
+        """Once a second: run the countdowns, and poll for changes every ADMIN_PC_POLL_INTERVAL"""
+        if not grid_frame.winfo_exists():
+            self.admin_pc_tick_id = None
+            return
+        for frame_data in self.admin_pc_frames_data.values():
+            self.update_admin_pc_countdown(frame_data)
+        # One poll in flight at most; a requested one waits for it, since it may have read before the write
+        if not self.admin_pc_poll_pending and (self.admin_pc_poll_requested
+                                               or time.monotonic() >= self.admin_pc_next_poll):
+            self.refresh_admin_pc_data(grid_frame, parent)
+        self.admin_pc_tick_id = self.root.after(1000, lambda: self.tick_admin_pc_cards(grid_frame, parent))
+    
+    def refresh_admin_pc_data(self, grid_frame, parent):
+        """Poll for PCs changed since the last poll and patch only their cards"""
+        self.admin_pc_poll_pending = True
+        self.admin_pc_poll_requested = False
+        since = self.admin_pc_version
+        if time.monotonic() >= self.admin_pc_next_resync:
+            since = None   # every PC, for the balances
+            self.admin_pc_next_resync = time.monotonic() + ADMIN_PC_RESYNC_INTERVAL
+        self.db_executor.submit(
+            pc_overview.load, since,
+            on_success=lambda pc_units: self.apply_admin_pc_data(grid_frame, pc_units, parent),
+            on_error=self.on_admin_pc_refresh_error
+        )
+    
+    def request_admin_pc_poll(self):
+        """Have the live-update loop poll on its next tick, after any poll in flight"""
+        self.admin_pc_poll_requested = True
+    
+    def apply_admin_pc_data(self, grid_frame, pc_units, parent):
+        self.admin_pc_poll_pending = False
+        self.admin_pc_next_poll = time.monotonic() + ADMIN_PC_POLL_INTERVAL
+        # The overview was left or rebuilt while the poll was in flight, or nothing changed
+        if grid_frame is not self.admin_pc_grid or self.admin_pc_tick_id is None or not pc_units:
+            return
+        
+        self.admin_pc_version = changes.latest(pc_units, self.admin_pc_version)
+        for pc in pc_units:
+            self.admin_pc_rows[pc['unit_name']] = pc
+        
+        if self.admin_pc_summary_label is not None:
+            summary_text = self.format_status_summary(pc_overview.status_counts(self.admin_pc_rows.values()))
+            if self.admin_pc_summary_label.cget('text') != summary_text:
+                self.admin_pc_summary_label.config(text=summary_text)
+        
+        # Cards scrolled into view are built from the fresh rows; visible changed ones are patched
+        self.admin_pc_grid.set_items(sorted(self.admin_pc_rows.values(), key=lambda pc: pc['unit_name']))
+        for pc in pc_units:
+            frame_data = self.admin_pc_frames_data.get(pc['unit_name'])
+            if frame_data is not None:
+                self.admin_pc_frames_data[pc['unit_name']] = self.patch_admin_pc_card(frame_data, pc, parent)
+    
+    def patch_admin_pc_card(self, frame_data, pc, parent):
+        """Bring one card up to date with a fresh overview row; returns its frame_data"""
+        old_pc = frame_data['pc_data']
+        if any(old_pc[key] != pc[key] for key in ADMIN_PC_CARD_KEYS):
+            # Different session or state: the card's widgets change, so refill just this card
+            for widget in frame_data['frame'].winfo_children():
+                widget.destroy()
+            return self.build_admin_pc_card(frame_data['frame'], pc, parent)
+        
+        frame_data['pc_data'] = pc
+        frame_data['read_at'] = pc['read_at']
+        if frame_data['user_label'] is not None and old_pc['account_balance'] != pc['account_balance']:
+            frame_data['user_label'].config(text=self.format_pc_user(pc))
+        self.update_admin_pc_countdown(frame_data)
+        return frame_data
+    
+    def on_admin_pc_refresh_error(self, e):
+        print(f"Error refreshing admin PC data: {e}")
+        self.admin_pc_poll_pending = False
+        self.admin_pc_next_poll = time.monotonic() + 2 * ADMIN_PC_POLL_INTERVAL
     
     def end_pc_session(self, pc_id, parent):
         """Force logout user from PC"""
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
+            pc_info = db.fetchone("""
                 SELECT pc.unit_name, pc.current_user_id, u.username, u.full_name
                 FROM pc_units pc
                 LEFT JOIN users u ON pc.current_user_id = u.user_id
                 WHERE pc.id = %s
             """, (pc_id,))
-            pc_info = cursor.fetchone()
-            cursor.close()
             
             if not pc_info:
                 messagebox.showerror("Error", "PC not found")
@@ -550,33 +556,21 @@ class AdminApp:
             confirm_msg = f"Force logout from {pc_info['unit_name']}?\n\n{user_info}\n\nThis will immediately end their session."
             
             if messagebox.askyesno("Force Logout Confirmation", confirm_msg):
-                cursor = self.db_connection.cursor()
-                cursor.execute("""
-                    UPDATE pc_units 
-                    SET status = 'Available', current_user_id = NULL, session_start = NULL 
-                    WHERE id = %s
-                """, (pc_id,))
-                
-                self.db_connection.commit()
-                cursor.close()
+                with db.transaction() as tx:
+                    billing_service.end_session(tx, pc_info['unit_name'], sessions.FORCE_LOGOUT)
                 
                 messagebox.showinfo("Success", f"User logged out from {pc_info['unit_name']}")
-                self.show_pc_overview(parent)
+                self.request_admin_pc_poll()
                 
         except Error as e:
             messagebox.showerror("Database Error", f"Error during force logout: {e}")
-            if 'cursor' in locals():
-                self.db_connection.rollback()
 
     def toggle_pc_lock(self, pc_id, current_locked_status, parent):
         """Lock or unlock a PC"""
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
+            pc_info = db.fetchone("""
                 SELECT unit_name, status FROM pc_units WHERE id = %s
             """, (pc_id,))
-            pc_info = cursor.fetchone()
-            cursor.close()
             
             if not pc_info:
                 messagebox.showerror("Error", "PC not found")
@@ -596,37 +590,17 @@ class AdminApp:
                                 f"{action.capitalize()} {pc_info['unit_name']}?\n\n"
                                 f"{'Users will not be able to login to this PC.' if new_status else 'Users will be able to login to this PC.'}"):
                 
-                cursor = self.db_connection.cursor()
-                cursor.execute("""
+                db.execute("""
                     UPDATE pc_units 
                     SET is_locked = %s 
                     WHERE id = %s
                 """, (new_status, pc_id))
                 
-                self.db_connection.commit()
-                cursor.close()
-                
                 messagebox.showinfo("Success", f"{pc_info['unit_name']} has been {action}ed!")
-                self.show_pc_overview(parent)
+                self.request_admin_pc_poll()
                 
         except Error as e:
             messagebox.showerror("Database Error", f"Error toggling lock: {e}")
-            if 'cursor' in locals():
-                self.db_connection.rollback()
-    
-    def auto_logout_expired_session(self, pc_id):
-        """Auto logout when session expires"""
-        try:
-            cursor = self.db_connection.cursor()
-            cursor.execute("""
-                UPDATE pc_units 
-                SET status = 'Available', current_user_id = NULL, session_start = NULL 
-                WHERE id = %s
-            """, (pc_id,))
-            self.db_connection.commit()
-            cursor.close()
-        except:
-            pass
     
     def show_inventory_management(self, parent):
         """Display Inventory Management"""
@@ -804,32 +778,26 @@ class AdminApp:
                 messagebox.showerror("Error", f"Invalid input: {str(e)}")
                 return
             
-            cursor = self.db_connection.cursor()
-            
             if hasattr(self, 'selected_inventory_id') and self.selected_inventory_id:
-                cursor.execute("""
+                db.execute("""
                     UPDATE inventory_items 
                     SET name = %s, category = %s, quantity = %s, unit_price = %s, min_stock_level = %s
                     WHERE id = %s
                 """, (name, category, quantity, price, min_stock, self.selected_inventory_id))
                 message = "Item updated successfully!"
             else:
-                cursor.execute("""
+                db.execute("""
                     INSERT INTO inventory_items (name, category, quantity, unit_price, min_stock_level)
                     VALUES (%s, %s, %s, %s, %s)
                 """, (name, category, quantity, price, min_stock))
                 message = "Item added successfully!"
             
-            self.db_connection.commit()
-            cursor.close()
-            
             messagebox.showinfo("Success", message)
             self.clear_inventory_form()
             self.refresh_inventory()
             
         except Error as e:
             messagebox.showerror("Database Error", f"Error saving item: {e}")
-            self.db_connection.rollback()
 
     def edit_inventory_item(self):
         """Edit selected inventory item"""
@@ -841,10 +809,7 @@ class AdminApp:
         item_id = self.inventory_tree.item(selection[0])['values'][0]
         
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM inventory_items WHERE id = %s", (item_id,))
-            item = cursor.fetchone()
-            cursor.close()
+            item = db.fetchone("SELECT * FROM inventory_items WHERE id = %s", (item_id,))
             
             if item:
                 self.inv_name_entry.delete(0, tk.END)
@@ -881,17 +846,13 @@ class AdminApp:
         
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{item_name}'?"):
             try:
-                cursor = self.db_connection.cursor()
-                cursor.execute("DELETE FROM inventory_items WHERE id = %s", (item_id,))
-                self.db_connection.commit()
-                cursor.close()
+                db.execute("DELETE FROM inventory_items WHERE id = %s", (item_id,))
                 
                 messagebox.showinfo("Success", "Item deleted successfully!")
                 self.refresh_inventory()
                 
             except Error as e:
                 messagebox.showerror("Database Error", f"Error deleting item: {e}")
-                self.db_connection.rollback()
 
     def clear_inventory_form(self):
         """Clear all inventory form fields"""
@@ -909,10 +870,7 @@ class AdminApp:
             for item in self.inventory_tree.get_children():
                 self.inventory_tree.delete(item)
             
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM inventory_items ORDER BY name")
-            items = cursor.fetchall()
-            cursor.close()
+            items = db.fetchall("SELECT * FROM inventory_items ORDER BY name")
             
             for item in items:
                 min_stock = item.get('min_stock_level', 0)
@@ -944,18 +902,14 @@ class AdminApp:
             self.inventory_tree.delete(item)
         
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
             if search_term:
-                cursor.execute("""
+                items = db.fetchall("""
                     SELECT * FROM inventory_items 
                     WHERE LOWER(name) LIKE %s OR LOWER(category) LIKE %s
                     ORDER BY name
                 """, (f'%{search_term}%', f'%{search_term}%'))
             else:
-                cursor.execute("SELECT * FROM inventory_items ORDER BY name")
-            
-            items = cursor.fetchall()
-            cursor.close()
+                items = db.fetchall("SELECT * FROM inventory_items ORDER BY name")
             
             for item in items:
                 min_stock = item.get('min_stock_level', 0)
@@ -1059,45 +1013,51 @@ class AdminApp:
     
     def load_orders(self, status_filter):
         """Load orders based on filter"""
-        try:
-            for item in self.orders_tree.get_children():
-                self.orders_tree.delete(item)
-            
-            cursor = self.db_connection.cursor(dictionary=True)
-            
-            if status_filter == "All":
-                cursor.execute("""
-                    SELECT o.*, u.username 
-                    FROM orders o
-                    JOIN users u ON o.user_id = u.user_id
-                    ORDER BY o.order_date DESC
-                """)
-            else:
-                cursor.execute("""
-                    SELECT o.*, u.username 
-                    FROM orders o
-                    JOIN users u ON o.user_id = u.user_id
-                    WHERE o.order_status = %s
-                    ORDER BY o.order_date DESC
-                """, (status_filter,))
-            
-            orders = cursor.fetchall()
-            cursor.close()
-            
-            for order in orders:
-                self.orders_tree.insert('', tk.END, values=(
-                    order['order_id'],
-                    order['username'],
-                    order['item_name'],
-                    order['quantity'],
-                    f"₱{order['price']:.2f}",
-                    f"₱{order['total_price']:.2f}",
-                    order['order_status'],
-                    order['order_date'].strftime("%Y-%m-%d %H:%M")
-                ))
-                
-        except Error as e:
-            messagebox.showerror("Database Error", f"Error loading orders: {e}")
+        for item in self.orders_tree.get_children():
+            self.orders_tree.delete(item)
+        
+        if status_filter == "All":
+            query, params = """
+                SELECT o.*, u.username 
+                FROM orders o
+                JOIN users u ON o.user_id = u.user_id
+                ORDER BY o.order_date DESC
+            """, None
+        else:
+            query, params = """
+                SELECT o.*, u.username 
+                FROM orders o
+                JOIN users u ON o.user_id = u.user_id
+                WHERE o.order_status = %s
+                ORDER BY o.order_date DESC
+            """, (status_filter,)
+        
+        # Only the most recent filter click gets rendered
+        self.orders_request = status_filter
+        orders_tree = self.orders_tree
+        self.db_executor.submit(
+            db.fetchall, query, params,
+            on_success=lambda orders: self.show_orders(orders_tree, status_filter, orders),
+            on_error=lambda e: messagebox.showerror("Database Error", f"Error loading orders: {e}")
+        )
+    
+    def show_orders(self, orders_tree, status_filter, orders):
+        """Fill the orders table once load_orders has fetched the rows"""
+        if (orders_tree is not self.orders_tree or self.orders_request != status_filter
+                or not orders_tree.winfo_exists()):
+            return
+        
+        for order in orders:
+            self.orders_tree.insert('', tk.END, values=(
+                order['order_id'],
+                order['username'],
+                order['item_name'],
+                order['quantity'],
+                f"₱{order['price']:.2f}",
+                f"₱{order['total_price']:.2f}",
+                order['order_status'],
+                order['order_date'].strftime("%Y-%m-%d %H:%M")
+            ))
     
     def approve_order(self):
         """Approve order with inventory check"""
@@ -1110,63 +1070,63 @@ class AdminApp:
         
         if messagebox.askyesno("Confirm", "Approve this order?\n\nThis will deduct items from inventory."):
             try:
-                cursor = self.db_connection.cursor(dictionary=True)
-                
-                cursor.execute("""
-                    SELECT item_name, quantity FROM orders 
-                    WHERE order_id = %s
-                """, (order_id,))
-                order_details = cursor.fetchone()
-                
-                if order_details:
-                    cursor.execute("""
-                        SELECT quantity FROM inventory_items 
-                        WHERE name = %s
-                    """, (order_details['item_name'],))
-                    inventory_item = cursor.fetchone()
-                    
-                    if inventory_item:
-                        if inventory_item['quantity'] >= order_details['quantity']:
-                            cursor.execute(
-                                "UPDATE orders SET order_status = 'Approved' WHERE order_id = %s",
-                                (order_id,)
-                            )
-                            
-                            cursor.execute("""
-                                UPDATE inventory_items 
-                                SET quantity = GREATEST(0, quantity - %s)
-                                WHERE name = %s
-                            """, (order_details['quantity'], order_details['item_name']))
-                            
-                            self.db_connection.commit()
-                            
-                            messagebox.showinfo("Success", 
-                                              f"Order approved!\n"
-                                              f"Deducted {order_details['quantity']} x {order_details['item_name']}")
-                        else:
-                            messagebox.showwarning("Insufficient Stock", 
-                                                 f"Cannot approve order!\n"
-                                                 f"Requested: {order_details['quantity']} x {order_details['item_name']}\n"
-                                                 f"Available: {inventory_item['quantity']}")
-                            cursor.close()
-                            return
-                    else:
-                        cursor.execute(
-                            "UPDATE orders SET order_status = 'Approved' WHERE order_id = %s",
-                            (order_id,)
-                        )
-                        self.db_connection.commit()
-                        
-                        messagebox.showwarning("Item Not in Inventory", 
-                                             f"Order approved, but '{order_details['item_name']}' not found in inventory.\n"
-                                             f"Please add this item to inventory management.")
-                
-                cursor.close()
-                self.load_orders(self.order_filter.get())
-                
+                result, order_details, available = db.run_in_transaction(self._approve_order, order_id)
             except Error as e:
                 messagebox.showerror("Database Error", f"Error approving order: {e}")
-                self.db_connection.rollback()
+                return
+            
+            # Dialogs only after the commit, so row locks are not held while they are open
+            if result == 'approved':
+                messagebox.showinfo("Success", 
+                                  f"Order approved!\n"
+                                  f"Deducted {order_details['quantity']} x {order_details['item_name']}")
+            elif result == 'insufficient':
+                messagebox.showwarning("Insufficient Stock", 
+                                     f"Cannot approve order!\n"
+                                     f"Requested: {order_details['quantity']} x {order_details['item_name']}\n"
+                                     f"Available: {available}")
+                return
+            elif result == 'not_in_inventory':
+                messagebox.showwarning("Item Not in Inventory", 
+                                     f"Order approved, but '{order_details['item_name']}' not found in inventory.\n"
+                                     f"Please add this item to inventory management.")
+            self.load_orders(self.order_filter.get())
+    
+    def _approve_order(self, tx, order_id):
+        """Approve an order and deduct its stock in one transaction
+        
+        Returns (result, order_details, available_quantity).
+        """
+        order_details = tx.fetchone("""
+            SELECT item_name, quantity FROM orders 
+            WHERE order_id = %s
+            FOR UPDATE
+        """, (order_id,))
+        if not order_details:
+            return None, None, None
+        
+        inventory_item = tx.fetchone("""
+            SELECT quantity FROM inventory_items 
+            WHERE name = %s
+            FOR UPDATE
+        """, (order_details['item_name'],))
+        
+        if inventory_item and inventory_item['quantity'] < order_details['quantity']:
+            return 'insufficient', order_details, inventory_item['quantity']
+        
+        tx.execute(
+            "UPDATE orders SET order_status = 'Approved' WHERE order_id = %s",
+            (order_id,)
+        )
+        if not inventory_item:
+            return 'not_in_inventory', order_details, None
+        
+        tx.execute("""
+            UPDATE inventory_items 
+            SET quantity = GREATEST(0, quantity - %s)
+            WHERE name = %s
+        """, (order_details['quantity'], order_details['item_name']))
+        return 'approved', order_details, inventory_item['quantity']
     
     def reject_order(self):
         """Reject selected order"""
@@ -1179,20 +1139,16 @@ class AdminApp:
         
         if messagebox.askyesno("Confirm", "Reject this order?"):
             try:
-                cursor = self.db_connection.cursor()
-                cursor.execute(
+                db.execute(
                     "UPDATE orders SET order_status = 'Rejected' WHERE order_id = %s",
                     (order_id,)
                 )
-                self.db_connection.commit()
-                cursor.close()
                 
                 messagebox.showinfo("Success", "Order rejected")
                 self.load_orders(self.order_filter.get())
                 
             except Error as e:
                 messagebox.showerror("Database Error", f"Error rejecting order: {e}")
-                self.db_connection.rollback()
 
     # COMPLETE IMPLEMENTATIONS FOR ALL ADMIN FEATURES
 # Add these methods to your AdminApp class in admin_panel.py
@@ -1388,32 +1344,26 @@ class AdminApp:
                 messagebox.showerror("Error", "Invalid price format")
                 return
             
-            cursor = self.db_connection.cursor()
-            
             if self.selected_menu_id:
-                cursor.execute("""
+                db.execute("""
                     UPDATE cafe_items 
                     SET item_name = %s, category = %s, price = %s, available = %s, image_path = %s
                     WHERE item_id = %s
                 """, (name, category, price, available, image_path if image_path else None, self.selected_menu_id))
                 message = "Menu item updated successfully!"
             else:
-                cursor.execute("""
+                db.execute("""
                     INSERT INTO cafe_items (item_name, category, price, available, image_path)
                     VALUES (%s, %s, %s, %s, %s)
                 """, (name, category, price, available, image_path if image_path else None))
                 message = "Menu item added successfully!"
             
-            self.db_connection.commit()
-            cursor.close()
-            
             messagebox.showinfo("Success", message)
             self.clear_menu_form()
             self.refresh_menu_items()
             
         except Error as e:
             messagebox.showerror("Database Error", f"Error saving menu item: {e}")
-            self.db_connection.rollback()
     
     def edit_menu_item(self):
         """Edit selected menu item"""
@@ -1425,10 +1375,7 @@ class AdminApp:
         item_id = self.menu_tree.item(selection[0])['values'][0]
         
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM cafe_items WHERE item_id = %s", (item_id,))
-            item = cursor.fetchone()
-            cursor.close()
+            item = db.fetchone("SELECT * FROM cafe_items WHERE item_id = %s", (item_id,))
             
             if item:
                 self.menu_name_entry.delete(0, tk.END)
@@ -1461,17 +1408,13 @@ class AdminApp:
         
         if messagebox.askyesno("Confirm Delete", f"Delete '{item_name}' from menu?"):
             try:
-                cursor = self.db_connection.cursor()
-                cursor.execute("DELETE FROM cafe_items WHERE item_id = %s", (item_id,))
-                self.db_connection.commit()
-                cursor.close()
+                db.execute("DELETE FROM cafe_items WHERE item_id = %s", (item_id,))
                 
                 messagebox.showinfo("Success", "Menu item deleted!")
                 self.refresh_menu_items()
                 
             except Error as e:
                 messagebox.showerror("Database Error", f"Error deleting item: {e}")
-                self.db_connection.rollback()
     
     def clear_menu_form(self):
         """Clear menu form"""
@@ -1489,10 +1432,7 @@ class AdminApp:
             for item in self.menu_tree.get_children():
                 self.menu_tree.delete(item)
             
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM cafe_items ORDER BY category, item_name")
-            items = cursor.fetchall()
-            cursor.close()
+            items = db.fetchall("SELECT * FROM cafe_items ORDER BY category, item_name")
             
             for item in items:
                 self.menu_tree.insert('', tk.END, values=(
@@ -1515,18 +1455,14 @@ class AdminApp:
             self.menu_tree.delete(item)
         
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
             if search_term:
-                cursor.execute("""
+                items = db.fetchall("""
                     SELECT * FROM cafe_items 
                     WHERE LOWER(item_name) LIKE %s OR LOWER(category) LIKE %s
                     ORDER BY category, item_name
                 """, (f'%{search_term}%', f'%{search_term}%'))
             else:
-                cursor.execute("SELECT * FROM cafe_items ORDER BY category, item_name")
-            
-            items = cursor.fetchall()
-            cursor.close()
+                items = db.fetchall("SELECT * FROM cafe_items ORDER BY category, item_name")
             
             for item in items:
                 self.menu_tree.insert('', tk.END, values=(
@@ -1701,18 +1637,14 @@ class AdminApp:
             return
         
         try:
-            cursor = self.db_connection.cursor()
             hashed_pw = self.hash_password(password)
             
-            cursor.execute("""
+            db.execute("""
                 INSERT INTO users (username, password, full_name, phone_number, account_balance, 
                                   session_time_limit, hourly_rate, is_approved)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """, (username, hashed_pw, fullname, phone, balance, time_limit, rate, auto_approve))
             
-            self.db_connection.commit()
-            cursor.close()
-            
             messagebox.showinfo("Success", 
                               f"Account created successfully!\n\n"
                               f"Username: {username}\n"
@@ -1723,7 +1655,6 @@ class AdminApp:
                 messagebox.showerror("Error", "Username already exists!")
             else:
                 messagebox.showerror("Database Error", f"Error creating account: {e}")
-            self.db_connection.rollback()
     
     def clear_account_form(self, *entries):
         """Clear account creation form"""
@@ -1805,15 +1736,13 @@ class AdminApp:
             for item in self.pending_tree.get_children():
                 self.pending_tree.delete(item)
             
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT user_id, username, full_name, phone_number, account_balance, created_at
-                FROM users 
+            accounts = db.fetchall(f"""
+                SELECT user_id, username, full_name, phone_number, {ledger.LIVE_BALANCE} AS account_balance,
+                       created_at
+                FROM users u
                 WHERE is_approved = FALSE
                 ORDER BY created_at DESC
             """)
-            accounts = cursor.fetchall()
-            cursor.close()
             
             for acc in accounts:
                 self.pending_tree.insert('', tk.END, values=(
@@ -1840,10 +1769,7 @@ class AdminApp:
         
         if messagebox.askyesno("Confirm Approval", f"Approve account for '{username}'?"):
             try:
-                cursor = self.db_connection.cursor()
-                cursor.execute("UPDATE users SET is_approved = TRUE WHERE user_id = %s", (user_id,))
-                self.db_connection.commit()
-                cursor.close()
+                db.execute("UPDATE users SET is_approved = TRUE WHERE user_id = %s", (user_id,))
                 # FINAL METHODS - Add these to complete the AdminApp class
 
                 messagebox.showinfo("Success", f"Account approved for '{username}'")
@@ -1851,7 +1777,6 @@ class AdminApp:
                 
             except Error as e:
                 messagebox.showerror("Database Error", f"Error approving account: {e}")
-                self.db_connection.rollback()
     
     def reject_account(self):
         """Reject and delete selected account"""
@@ -1866,17 +1791,13 @@ class AdminApp:
         if messagebox.askyesno("Confirm Rejection", 
                               f"Reject and DELETE account for '{username}'?\n\nThis action cannot be undone!"):
             try:
-                cursor = self.db_connection.cursor()
-                cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
-                self.db_connection.commit()
-                cursor.close()
+                db.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
                 
                 messagebox.showinfo("Success", f"Account rejected and deleted")
                 self.load_pending_accounts()
                 
             except Error as e:
                 messagebox.showerror("Database Error", f"Error rejecting account: {e}")
-                self.db_connection.rollback()
 
     def show_all_users(self, parent):
         """Display all users with management options"""
@@ -2019,41 +1940,37 @@ class AdminApp:
         self.users_filter.set(status)
         self.load_all_users(status)
     
-    def load_all_users(self, status_filter):
-        """Load all users"""
+    def load_all_users(self, status_filter, primary=False):
+        """Load all users; `primary` reads past replica lag, e.g. right after a write"""
+        fetch = db.fetchall if primary else db.report_fetchall
         try:
             for item in self.users_tree.get_children():
                 self.users_tree.delete(item)
             
-            cursor = self.db_connection.cursor(dictionary=True)
-            
             if status_filter == "All":
-                cursor.execute("""
-                    SELECT user_id, username, full_name, phone_number, account_balance,
+                users = fetch(f"""
+                    SELECT user_id, username, full_name, phone_number, {ledger.LIVE_BALANCE} AS account_balance,
                            hourly_rate, session_time_limit, is_approved, created_at
-                    FROM users 
+                    FROM users u
                     ORDER BY created_at DESC
                 """)
             elif status_filter == "Approved":
-                cursor.execute("""
-                    SELECT user_id, username, full_name, phone_number, account_balance,
+                users = fetch(f"""
+                    SELECT user_id, username, full_name, phone_number, {ledger.LIVE_BALANCE} AS account_balance,
                            hourly_rate, session_time_limit, is_approved, created_at
-                    FROM users 
+                    FROM users u
                     WHERE is_approved = TRUE
                     ORDER BY created_at DESC
                 """)
             else:  # Pending
-                cursor.execute("""
-                    SELECT user_id, username, full_name, phone_number, account_balance,
+                users = fetch(f"""
+                    SELECT user_id, username, full_name, phone_number, {ledger.LIVE_BALANCE} AS account_balance,
                            hourly_rate, session_time_limit, is_approved, created_at
-                    FROM users 
+                    FROM users u
                     WHERE is_approved = FALSE
                     ORDER BY created_at DESC
                 """)
             
-            users = cursor.fetchall()
-            cursor.close()
-            
             for user in users:
                 self.users_tree.insert('', tk.END, values=(
                     user['user_id'],
@@ -2078,26 +1995,22 @@ class AdminApp:
             self.users_tree.delete(item)
         
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
             if search_term:
-                cursor.execute("""
-                    SELECT user_id, username, full_name, phone_number, account_balance,
+                users = db.report_fetchall(f"""
+                    SELECT user_id, username, full_name, phone_number, {ledger.LIVE_BALANCE} AS account_balance,
                            hourly_rate, session_time_limit, is_approved, created_at
-                    FROM users 
+                    FROM users u
                     WHERE LOWER(username) LIKE %s OR LOWER(full_name) LIKE %s
                     ORDER BY created_at DESC
                 """, (f'%{search_term}%', f'%{search_term}%'))
             else:
-                cursor.execute("""
-                    SELECT user_id, username, full_name, phone_number, account_balance,
+                users = db.report_fetchall(f"""
+                    SELECT user_id, username, full_name, phone_number, {ledger.LIVE_BALANCE} AS account_balance,
                            hourly_rate, session_time_limit, is_approved, created_at
-                    FROM users 
+                    FROM users u
                     ORDER BY created_at DESC
                 """)
             
-            users = cursor.fetchall()
-            cursor.close()
-            
             for user in users:
                 self.users_tree.insert('', tk.END, values=(
                     user['user_id'],
@@ -2149,24 +2062,17 @@ class AdminApp:
                     messagebox.showerror("Error", "Amount must be positive")
                     return
                 
-                cursor = self.db_connection.cursor()
-                cursor.execute("""
-                    UPDATE users 
-                    SET account_balance = account_balance + %s 
-                    WHERE user_id = %s
-                """, (amount, user_id))
-                self.db_connection.commit()
-                cursor.close()
+                # The users list shows the live balance, so the entry needs no rollup
+                ledger.record(user_id, ledger.TOPUP, amount, reference='admin')
                 
                 messagebox.showinfo("Success", f"Added ₱{amount:.2f} to {username}'s account")
                 dialog.destroy()
-                self.load_all_users(self.users_filter.get())
+                self.load_all_users(self.users_filter.get(), primary=True)
                 
             except ValueError:
                 messagebox.showerror("Error", "Invalid amount")
             except Error as e:
                 messagebox.showerror("Database Error", f"Error adding balance: {e}")
-                self.db_connection.rollback()
         
         tk.Button(dialog, text="Add Balance", font=("Segoe UI", 11, "bold"),
                  bg=self.accent_color, fg=self.text_color, bd=0, cursor="hand2",
@@ -2208,24 +2114,20 @@ class AdminApp:
                     messagebox.showerror("Error", "Time limit must be positive")
                     return
                 
-                cursor = self.db_connection.cursor()
-                cursor.execute("""
+                db.execute("""
                     UPDATE users 
                     SET session_time_limit = %s 
                     WHERE user_id = %s
                 """, (limit, user_id))
-                self.db_connection.commit()
-                cursor.close()
                 
                 messagebox.showinfo("Success", f"Set time limit to {limit} minutes for {username}")
                 dialog.destroy()
-                self.load_all_users(self.users_filter.get())
+                self.load_all_users(self.users_filter.get(), primary=True)
                 
             except ValueError:
                 messagebox.showerror("Error", "Invalid time limit")
             except Error as e:
                 messagebox.showerror("Database Error", f"Error setting time limit: {e}")
-                self.db_connection.rollback()
         
         tk.Button(dialog, text="Set Time Limit", font=("Segoe UI", 11, "bold"),
                  bg=self.accent_color, fg=self.text_color, bd=0, cursor="hand2",
@@ -2267,24 +2169,20 @@ class AdminApp:
                     messagebox.showerror("Error", "Rate must be positive")
                     return
                 
-                cursor = self.db_connection.cursor()
-                cursor.execute("""
+                db.execute("""
                     UPDATE users 
                     SET hourly_rate = %s 
                     WHERE user_id = %s
                 """, (rate, user_id))
-                self.db_connection.commit()
-                cursor.close()
                 
                 messagebox.showinfo("Success", f"Set hourly rate to ₱{rate:.2f} for {username}")
                 dialog.destroy()
-                self.load_all_users(self.users_filter.get())
+                self.load_all_users(self.users_filter.get(), primary=True)
                 
             except ValueError:
                 messagebox.showerror("Error", "Invalid rate")
             except Error as e:
                 messagebox.showerror("Database Error", f"Error setting rate: {e}")
-                self.db_connection.rollback()
         
         tk.Button(dialog, text="Set Rate", font=("Segoe UI", 11, "bold"),
                  bg=self.accent_color, fg=self.text_color, bd=0, cursor="hand2",
@@ -2307,21 +2205,17 @@ class AdminApp:
         
         if messagebox.askyesno("Confirm", f"Change {username}'s status to {new_status}?"):
             try:
-                cursor = self.db_connection.cursor()
-                cursor.execute("""
+                db.execute("""
                     UPDATE users 
                     SET is_approved = %s 
                     WHERE user_id = %s
                 """, (new_status == "Active", user_id))
-                self.db_connection.commit()
-                cursor.close()
                 
                 messagebox.showinfo("Success", f"Status changed to {new_status}")
-                self.load_all_users(self.users_filter.get())
+                self.load_all_users(self.users_filter.get(), primary=True)
                 
             except Error as e:
                 messagebox.showerror("Database Error", f"Error updating status: {e}")
-                self.db_connection.rollback()
     
     def delete_user(self):
         """Delete selected user"""
@@ -2336,23 +2230,18 @@ class AdminApp:
         if messagebox.askyesno("Confirm Delete", 
                               f"Permanently delete user '{username}'?\n\nThis will also delete all their orders!"):
             try:
-                cursor = self.db_connection.cursor()
-                
-                # Delete orders first (foreign key constraint)
-                cursor.execute("DELETE FROM orders WHERE user_id = %s", (user_id,))
-                
-                # Delete user
-                cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
-                
-                self.db_connection.commit()
-                cursor.close()
+                with db.transaction() as tx:
+                    # Delete orders first (foreign key constraint)
+                    tx.execute("DELETE FROM orders WHERE user_id = %s", (user_id,))
+                    
+                    # Delete user
+                    tx.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
                 
                 messagebox.showinfo("Success", f"User '{username}' deleted")
-                self.load_all_users(self.users_filter.get())
+                self.load_all_users(self.users_filter.get(), primary=True)
                 
             except Error as e:
                 messagebox.showerror("Database Error", f"Error deleting user: {e}")
-                self.db_connection.rollback()
 
     def show_all_orders(self, parent):
         """Display all orders history"""
@@ -2370,10 +2259,7 @@ class AdminApp:
         
         # Stats
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT COUNT(*) as total, SUM(total_price) as revenue FROM orders")
-            stats = cursor.fetchone()
-            cursor.close()
+            stats = db.report_fetchone("SELECT COUNT(*) as total, SUM(total_price) as revenue FROM orders")
             
             stats_frame = tk.Frame(header, bg=self.bg_color)
             stats_frame.pack(side='right')
@@ -2798,10 +2684,8 @@ class AdminApp:
             for item in self.all_orders_tree.get_children():
                 self.all_orders_tree.delete(item)
             
-            cursor = self.db_connection.cursor(dictionary=True)
-            
             if status_filter == "All":
-                cursor.execute("""
+                orders = db.report_fetchall("""
                     SELECT o.order_id, u.username, o.item_name, o.quantity, 
                            o.price, o.total_price, o.order_status, o.order_date
                     FROM orders o
@@ -2809,7 +2693,7 @@ class AdminApp:
                     ORDER BY o.order_date DESC
                 """)
             else:
-                cursor.execute("""
+                orders = db.report_fetchall("""
                     SELECT o.order_id, u.username, o.item_name, o.quantity, 
                            o.price, o.total_price, o.order_status, o.order_date
                     FROM orders o
@@ -2818,9 +2702,6 @@ class AdminApp:
                     ORDER BY o.order_date DESC
                 """, (status_filter,))
             
-            orders = cursor.fetchall()
-            cursor.close()
-            
             for order in orders:
                 self.all_orders_tree.insert('', tk.END, values=(
                     order['order_id'],
@@ -3163,12 +3044,9 @@ class AdminApp:
     def create_admin_user(self, username, password):
         """Create a new admin user account"""
         try:
-            cursor = self.db_connection.cursor()
-            
             # Check if username already exists
-            cursor.execute("SELECT COUNT(*) FROM admins WHERE username = %s", (username,))
-            if cursor.fetchone()[0] > 0:
-                cursor.close()
+            existing = db.fetchone("SELECT COUNT(*) FROM admins WHERE username = %s", (username,), dictionary=False)
+            if existing[0] > 0:
                 messagebox.showerror("Error", f"Username '{username}' already exists")
                 return False
             
@@ -3176,31 +3054,22 @@ class AdminApp:
             hashed_password = self.hash_password(password)
             
             # Insert new admin
-            cursor.execute("""
+            db.execute("""
                 INSERT INTO admins (username, password, full_name) 
                 VALUES (%s, %s, %s)
             """, (username, hashed_password, f"Admin {username}"))
             
-            self.db_connection.commit()
-            cursor.close()
-            
             print(f"✅ Admin account created: {username}")
             return True
             
         except Error as e:
             print(f"❌ Error creating admin account: {e}")
-            if 'cursor' in locals():
-                cursor.close()
-                self.db_connection.rollback()
             return False
 
     def get_kiosk_mode_status(self):
         """Get kiosk mode status from database"""
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT setting_value FROM system_settings WHERE setting_name = 'kiosk_mode_enabled'")
-            result = cursor.fetchone()
-            cursor.close()
+            result = db.fetchone("SELECT setting_value FROM system_settings WHERE setting_name = 'kiosk_mode_enabled'")
             
             if result:
                 return result['setting_value'].lower() == 'true'
@@ -3224,23 +3093,24 @@ class AdminApp:
             
             try:
                 # Store kiosk mode preference in database
-                cursor = self.db_connection.cursor()
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS system_settings (
-                        setting_name VARCHAR(50) PRIMARY KEY,
-                        setting_value VARCHAR(100),
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                cursor.execute("""
-                    INSERT INTO system_settings (setting_name, setting_value) 
-                    VALUES ('kiosk_mode_enabled', 'true')
-                    ON DUPLICATE KEY UPDATE setting_value = 'true'
-                """)
-                
-                self.db_connection.commit()
-                cursor.close()
+                with db.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS system_settings (
+                            setting_name VARCHAR(50) PRIMARY KEY,
+                            setting_value VARCHAR(100),
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                        )
+                    """)
+                    
+                    cursor.execute("""
+                        INSERT INTO system_settings (setting_name, setting_value) 
+                        VALUES ('kiosk_mode_enabled', 'true')
+                        ON DUPLICATE KEY UPDATE setting_value = 'true'
+                    """)
+                    
+                    conn.commit()
+                    cursor.close()
                 
                 messagebox.showinfo("Kiosk Mode Enabled", 
                                   "Kiosk Mode has been ENABLED system-wide.\n\n"
@@ -3274,23 +3144,24 @@ class AdminApp:
             
             try:
                 # Store kiosk mode preference in database
-                cursor = self.db_connection.cursor()
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS system_settings (
-                        setting_name VARCHAR(50) PRIMARY KEY,
-                        setting_value VARCHAR(100),
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                cursor.execute("""
-                    INSERT INTO system_settings (setting_name, setting_value) 
-                    VALUES ('kiosk_mode_enabled', 'false')
-                    ON DUPLICATE KEY UPDATE setting_value = 'false'
-                """)
-                
-                self.db_connection.commit()
-                cursor.close()
+                with db.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS system_settings (
+                            setting_name VARCHAR(50) PRIMARY KEY,
+                            setting_value VARCHAR(100),
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                        )
+                    """)
+                    
+                    cursor.execute("""
+                        INSERT INTO system_settings (setting_name, setting_value) 
+                        VALUES ('kiosk_mode_enabled', 'false')
+                        ON DUPLICATE KEY UPDATE setting_value = 'false'
+                    """)
+                    
+                    conn.commit()
+                    cursor.close()
                 
                 messagebox.showinfo("Kiosk Mode Disabled", 
                                   "Kiosk Mode has been DISABLED system-wide.\n\n"
@@ -3322,10 +3193,90 @@ class AdminApp:
                 
         except Exception as e:
             print(f"🔧 Error notifying main app about kiosk mode change: {e}")
+    
+    def show_query_diagnostics(self, parent):
+        """Hidden screen (Ctrl+Shift+D) with per-statement query latency stats"""
+        if not parent.winfo_exists():
+            return
+        self.clear_content(parent)
+        
+        container = tk.Frame(parent, bg=self.bg_color)
+        container.pack(fill='both', expand=True, padx=40, pady=40)
+        
+        header = tk.Frame(container, bg=self.bg_color)
+        header.pack(fill='x', pady=(0, 10))
+        
+        tk.Label(header, text="Query Diagnostics", font=("Segoe UI", 32, "bold"),
+                bg=self.bg_color, fg=self.text_color).pack(side='left')
+        
+        btn_frame = tk.Frame(header, bg=self.bg_color)
+        btn_frame.pack(side='right')
+        
+        tk.Button(btn_frame, text="↻ Refresh", font=("Segoe UI", 11),
+                 bg=self.accent_color, fg=self.secondary_bg, bd=0, cursor="hand2", padx=15, pady=8,
+                 command=lambda: self.show_query_diagnostics(parent)).pack(side='left', padx=(0, 10))
+        
+        tk.Button(btn_frame, text="💾 Dump to File", font=("Segoe UI", 11),
+                 bg=self.secondary_bg, fg=self.text_color, bd=0, cursor="hand2", padx=15, pady=8,
+                 command=self.dump_query_stats).pack(side='left', padx=(0, 10))
+        
+        tk.Button(btn_frame, text="✗ Reset", font=("Segoe UI", 11),
+                 bg=self.danger_color, fg="white", bd=0, cursor="hand2", padx=15, pady=8,
+                 command=lambda: (query_stats.stats.reset(), self.show_query_diagnostics(parent))
+                 ).pack(side='left')
+        
+        pool = db.get_pool().stats()
+        summary = (f"Backend: {db.get_backend()}  |  Pool: {pool['in_use']} in use, {pool['idle']} idle "
+                   f"of {pool['max_size']}  |  Reconnects: {pool['reconnects']}")
+        replica = db.get_replica_pool()
+        if replica is not None:
+            replica_stats = replica.stats()
+            summary += (f"  |  Replica: {replica_stats['in_use']} in use, {replica_stats['idle']} idle"
+                        f"{' (down, using primary)' if db.replica_down() else ''}")
+        tk.Label(container, text=summary, font=("Segoe UI", 11),
+                bg=self.bg_color, fg=self.text_secondary).pack(anchor='w', pady=(0, 15))
+        
+        columns = ('Count', 'p50 ms', 'p95 ms', 'p99 ms', 'Max ms', 'Total ms', 'Avg Rows', 'Caller', 'Statement')
+        tree = ttk.Treeview(container, columns=columns, show='headings', height=20)
+        for col in columns:
+            tree.heading(col, text=col)
+            if col == 'Statement':
+                tree.column(col, width=500)
+            elif col == 'Caller':
+                tree.column(col, width=220)
+            else:
+                tree.column(col, width=75, anchor='e')
+        
+        scrollbar = ttk.Scrollbar(container, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+        
+        for row in query_stats.stats.snapshot():
+            top_caller = next(iter(row['callers']), '?')
+            tree.insert('', tk.END, values=(
+                row['count'],
+                f"{row['p50_ms']:.1f}",
+                f"{row['p95_ms']:.1f}",
+                f"{row['p99_ms']:.1f}",
+                f"{row['max_ms']:.1f}",
+                f"{row['total_ms']:.0f}",
+                f"{row['avg_rows']:.1f}",
+                top_caller,
+                row['statement']
+            ))
+    
+    def dump_query_stats(self):
+        """Write the current query stats snapshot to the rotating log file"""
+        replica = db.get_replica_pool()
+        path = query_stats.stats.dump({'pool': db.get_pool().stats(),
+                                       'replica_pool': replica.stats() if replica else None})
+        messagebox.showinfo("Query Stats", f"Snapshot written to:\n{path}")
 
 
 # Don't forget to keep the __main__ section at the end of admin_panel.py
 if __name__ == "__main__":
     root = tk.Tk()
     app = AdminApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    db.close_pool()
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Benchmark: text-protocol vs prepared execution of the kiosk's hot queries.
+
+Simulates N stations, each running one minute's worth of the statements
+the kiosk issues (billing read + charge, session check, two home screen
+refreshes), first through the db helpers and then through prepared.py.
+On MySQL the server's statement counters are sampled around each run so
+the parse (COM_QUERY vs COM_STMT_EXECUTE) and round-trip counts can be
+compared alongside the latency.
+
+Usage:
+    python bench_prepared.py                          # against the configured database
+    python bench_prepared.py --stations 100 --minutes 10
+    CAFE_DB_BACKEND=sqlite CAFE_DB_PATH=:memory: python bench_prepared.py
+
+The benchmark creates bench-NNN users and BENCH-NNN PCs and removes them
+afterwards.
+"""
+
+import argparse
+import time
+
+import db
+import migrations
+import prepared
+
+PC_STATUS = """
+    SELECT status, current_user_id, is_locked
+    FROM pc_units
+    WHERE unit_name = %s
+"""
+BILLING_SESSION = """
+    SELECT pc.session_start, pc.is_locked, pc.status, pc.current_user_id,
+           u.hourly_rate, u.account_balance, u.session_time_limit
+    FROM pc_units pc
+    JOIN users u ON pc.current_user_id = u.user_id
+    WHERE pc.unit_name = %s AND pc.current_user_id = %s
+    FOR UPDATE
+"""
+BILLING_CHARGE = "UPDATE users SET account_balance = %s WHERE user_id = %s"
+HOME_BALANCE = "SELECT account_balance FROM users WHERE user_id = %s"
+HOME_SESSION = """
+    SELECT pc.session_start, u.session_time_limit
+    FROM pc_units pc
+    JOIN users u ON pc.current_user_id = u.user_id
+    WHERE pc.unit_name = %s AND pc.current_user_id = %s
+"""
+
+SERVER_COUNTERS = ('Questions', 'Com_select', 'Com_update', 'Com_stmt_prepare',
+                   'Com_stmt_execute', 'Com_stmt_reset', 'Com_stmt_close')
+
+
+def setup_stations(count):
+    """Create one logged-in user per benchmark PC; returns [(pc_name, user_id)]"""
+    stations = []
+    with db.transaction() as tx:
+        for i in range(1, count + 1):
+            username, pc_name = f'bench-{i:03d}', f'BENCH-{i:03d}'
+            tx.execute("""
+                INSERT INTO users (username, password, full_name, account_balance, is_approved)
+                VALUES (%s, 'x', %s, 100000, TRUE)
+            """, (username, username))
+            user_id = tx.fetchone("SELECT user_id FROM users WHERE username = %s", (username,))['user_id']
+            tx.execute("""
+                INSERT INTO pc_units (unit_name, status, current_user_id, session_start)
+                VALUES (%s, 'Occupied', %s, NOW())
+            """, (pc_name, user_id))
+            stations.append((pc_name, user_id))
+    return stations
+
+
+def teardown_stations():
+    with db.transaction() as tx:
+        tx.execute("DELETE FROM pc_units WHERE unit_name LIKE 'BENCH-%'")
+        tx.execute("DELETE FROM users WHERE username LIKE 'bench-%'")
+
+
+def station_minute(api, pc_name, user_id):
+    """The statements one kiosk issues per minute of an active session"""
+    api.fetchone(PC_STATUS, (pc_name,))
+    with db.transaction():
+        session = api.fetchone(BILLING_SESSION, (pc_name, user_id))
+        api.execute(BILLING_CHARGE, (float(session['account_balance']) - 1 / 3, user_id))
+    for _ in range(2):  # HomeFrame refreshes every 30 seconds
+        api.fetchone(HOME_BALANCE, (user_id,))
+        api.fetchone(HOME_SESSION, (pc_name, user_id))
+
+
+def server_counters():
+    if db.dialect() != 'mysql':
+        return None
+    rows = db.fetchall("SHOW GLOBAL STATUS", dictionary=False)
+    return {name: int(value) for name, value in rows if name in SERVER_COUNTERS}
+
+
+def run(label, api, stations, minutes):
+    before = server_counters()
+    start = time.perf_counter()
+    for _ in range(minutes):
+        for pc_name, user_id in stations:
+            station_minute(api, pc_name, user_id)
+    elapsed = time.perf_counter() - start
+    after = server_counters()
+
+    statements = minutes * len(stations) * 6
+    print(f"\n{label}")
+    print(f"  {statements} statements in {elapsed:.3f}s "
+          f"({elapsed / statements * 1e6:.1f} µs/statement, "
+          f"{elapsed / (minutes * len(stations)) * 1e3:.2f} ms per station-minute)")
+    if before is not None:
+        for name in SERVER_COUNTERS:
+            print(f"  {name:<18} {after[name] - before[name]:>8}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=100)
+    parser.add_argument('--minutes', type=int, default=5, help="simulated minutes per run")
+    args = parser.parse_args()
+
+    migrations.migrate()
+
+    print(f"Backend: {db.get_backend()}  |  {args.stations} stations x {args.minutes} minutes")
+    stations = setup_stations(args.stations)
+    try:
+        for pc_name, user_id in stations[:1]:  # warm the pool and caches
+            station_minute(db, pc_name, user_id)
+            station_minute(prepared, pc_name, user_id)
+
+        text = run("Text protocol (db helpers)", db, stations, args.minutes)
+        binary = run("Prepared statements (prepared.py)", prepared, stations, args.minutes)
+        print(f"\nPrepared / text wall time: {binary / text:.2f}")
+    finally:
+        teardown_stations()
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
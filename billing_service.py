@@ -0,0 +1,467 @@
+"""
+Central billing service: charges every occupied PC once a minute.
+
+Instead of each kiosk charging its own session, one process per cafe runs
+
+    python billing_service.py
+
+and on every tick charges all occupied, unlocked PCs in a single set-based
+statement, then ends the sessions whose balance or time limit has run out.
+The cost per tick stays at a handful of statements however many stations
+there are, and billing carries on when a kiosk hangs or crashes.
+
+Charges are appended to balance_ledger (see ledger.py) rather than written
+to users, and the service rolls the ledger tail up into account_balance
+every few ticks.
+
+Between ticks the service sleeps until the next session expiry (see
+expiry.py), so sessions end on the second their time or balance runs out.
+
+The service records a heartbeat in system_settings. While the heartbeat is
+fresh, kiosks only read their session state; if the service stops, they go
+back to charging their own sessions through charge_session().
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from mysql.connector import Error
+
+import db
+import expiry
+import ledger
+import migrations
+import prepared
+import sessions
+import tariff
+
+BILLING_INTERVAL = 60        # seconds between ticks
+HEARTBEAT_SETTING = 'billing_service_heartbeat'
+HEARTBEAT_TIMEOUT = 3 * BILLING_INTERVAL  # kiosks take over billing after this much silence
+SERVICE_LOCK = 'cafe_billing_service'
+CHARGE_PRECISION = Decimal('0.0001')  # ledger amounts are DECIMAL(12, 4)
+ROLLUP_EVERY_TICKS = 5       # fold the ledger tail into users.account_balance this often
+EXPIRY_POLL_INTERVAL = 5     # seconds between checks for top-ups and new sessions
+
+
+def db_now(tx):
+    """The database clock, which session_start and the watermarks also use"""
+    return to_datetime(tx.fetchone("SELECT NOW() AS now")['now'])
+
+
+def to_datetime(value):
+    # SQLite returns computed timestamps as text
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def charge_occupied(tx, now):
+    """Charge every occupied, unlocked session up to `now`; returns the users charged
+
+    Each session is charged for the time since its last_charged_at watermark,
+    so a late or missed tick is caught up in the next one. All sessions are
+    priced in one tariff.price_batch() call (prepaid bundle time first), and
+    the charges, capped at each live balance, are appended to the ledger in
+    one batched insert and added to their open sessions in one batched
+    update. One more UPDATE advances every watermark to `now`. Locked PCs
+    have their watermark advanced without being charged.
+    """
+    rows = tx.fetchall("""
+        SELECT pc.unit_name, pc.tier, pc.current_session_id, pc.last_charged_at, u.user_id, u.hourly_rate,
+               u.account_balance + COALESCE((
+                   SELECT SUM(l.amount) FROM balance_ledger l
+                   WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+               ), 0) AS balance
+        FROM pc_units pc
+        JOIN users u ON pc.current_user_id = u.user_id
+        WHERE pc.status = 'Occupied' AND pc.is_locked = FALSE AND pc.last_charged_at IS NOT NULL
+          AND pc.last_charged_at < %s
+        FOR UPDATE
+    """, (now,))
+
+    entries, session_charges, bundle_use = [], [], []
+    if rows:
+        rates = tariff.current()
+        due = rates.price_batch([row['hourly_rate'] for row in rows], [row['tier'] for row in rows],
+                                [row['last_charged_at'] for row in rows], [now] * len(rows))
+        bundles = tariff.active_bundles(tx, {row['user_id'] for row in rows}, now)
+        for row, amount in zip(rows, due):
+            amount = Decimal(str(round(float(amount), 6)))
+            if row['user_id'] in bundles:
+                amount, used = rates.price_with_bundles(row['hourly_rate'], row['tier'], row['last_charged_at'],
+                                                        now, bundles[row['user_id']])
+                if used:
+                    bundle_use.append((used[1], used[0]))
+            charge = cap_charge(amount, row['balance'])
+            if charge > 0:
+                entries.append((row['user_id'], -charge, row['unit_name'], row['current_session_id']))
+            if row['current_session_id'] is not None:
+                session_charges.append((charge, now, row['current_session_id']))
+
+    if entries:
+        tx.executemany("""
+            INSERT INTO balance_ledger (user_id, entry_type, amount, reference, session_id)
+            VALUES (%s, 'session_charge', %s, %s, %s)
+        """, entries)
+    if session_charges:
+        tx.executemany("""
+            UPDATE sessions SET amount_charged = amount_charged + %s, last_billed_at = %s
+            WHERE session_id = %s AND ended_at IS NULL
+        """, session_charges)
+    if bundle_use:
+        tx.executemany("UPDATE user_bundles SET seconds_used = seconds_used + %s WHERE bundle_id = %s",
+                       bundle_use)
+    tx.execute("""
+        UPDATE pc_units SET last_charged_at = %s
+        WHERE status = 'Occupied' AND session_start IS NOT NULL
+          AND (last_charged_at IS NULL OR last_charged_at < %s)
+    """, (now, now))
+    return len(entries)
+
+
+def cap_charge(amount, balance):
+    """A charge never takes the live balance below zero"""
+    return min(Decimal(amount), max(Decimal(str(balance)), Decimal(0))).quantize(CHARGE_PRECISION)
+
+
+def charge_elapsed(user_id, pc_name, hourly_rate, balance, last_charged_at, now, session_id=None, key=None,
+                   tier=None):
+    """Charge one session from its watermark up to `now`; returns the amount charged
+
+    The caller must hold the session's pc_units row (SELECT ... FOR UPDATE in
+    the current transaction), which is what keeps a kiosk and the service
+    from charging the same interval twice. `key` is stored as the ledger
+    row's idempotency_key (see journal.py). `tier` is the PC's pc_units.tier
+    as just read; without it the tariff's cached tier is used. The user's
+    bundles are always read here, since a bundle bought on another station
+    is not in this process's cached tariff yet.
+    """
+    rates = tariff.current()
+    tier = tier or rates.tier_of(pc_name)
+    amount, used = rates.price(hourly_rate, tier, last_charged_at, now), None
+    if now > last_charged_at:
+        bundles = tariff.active_bundles(db.current_transaction(), [user_id], now).get(user_id)
+        if bundles:
+            amount, used = rates.price_with_bundles(hourly_rate, tier, last_charged_at, now, bundles)
+    charge = cap_charge(amount, balance)
+    if charge > 0:
+        prepared.execute("""
+            INSERT INTO balance_ledger (user_id, entry_type, amount, reference, session_id, idempotency_key)
+            VALUES (%s, 'session_charge', %s, %s, %s, %s)
+        """, (user_id, -charge, pc_name, session_id, key))
+    if used:
+        prepared.execute("UPDATE user_bundles SET seconds_used = seconds_used + %s WHERE bundle_id = %s",
+                         (used[1], used[0]))
+    prepared.execute("""
+        UPDATE pc_units SET last_charged_at = %s
+        WHERE unit_name = %s AND current_user_id = %s
+    """, (now, pc_name, user_id))
+    if session_id is not None:
+        prepared.execute("""
+            UPDATE sessions SET amount_charged = amount_charged + %s, last_billed_at = %s
+            WHERE session_id = %s
+        """, (charge, now, session_id))
+    return charge
+
+
+def charge_session(pc_name, user_id):
+    """A kiosk's billing tick: validate, charge and read its session in one call
+
+    On MySQL this is a single CALL charge_session(...) (migration 7), which
+    locks the PC row, charges the time since the watermark unless the
+    central service is running, and returns the session state. The
+    procedure charges the flat member rate, so PCs under time-of-day
+    periods or tier surcharges - and SQLite - run the same steps as one
+    transaction from Python. The procedure also leaves users holding a
+    bundle, and PCs whose tier changed since the tariff was cached,
+    uncharged (migration 16); those are charged from Python right after.
+    Returns the PC and user
+    row with the post-charge 'account_balance', the amount 'charged',
+    'elapsed_minutes' and 'remaining_minutes', or None if the PC is unknown.
+    """
+    if db.dialect() == 'mysql' and tariff.current().is_flat_for(pc_name):
+        session_data = db.run_in_transaction(_call_charge_session, pc_name, user_id)
+        if session_data and session_data.pop('needs_tariff'):
+            session_data = db.run_in_transaction(_charge_session, pc_name, user_id)
+    else:
+        session_data = db.run_in_transaction(_charge_session, pc_name, user_id)
+    if session_data:
+        session_data['remaining_minutes'] = remaining_minutes(session_data, pc_name)
+    return session_data
+
+
+def _call_charge_session(tx, pc_name, user_id):
+    cursor = tx.conn.cursor(dictionary=True)
+    try:
+        cursor.callproc('charge_session', (pc_name, user_id, HEARTBEAT_SETTING, HEARTBEAT_TIMEOUT))
+        rows = [row for result in cursor.stored_results() for row in result.fetchall()]
+    finally:
+        cursor.close()
+    return rows[0] if rows else None
+
+
+def _charge_session(tx, pc_name, user_id):
+    # Prepared statements run on tx's connection, inside the transaction
+    session_data = prepared.fetchone("""
+        SELECT pc.session_start, pc.last_charged_at, pc.is_locked, pc.status, pc.current_user_id,
+               pc.current_session_id, pc.tier, u.hourly_rate, u.session_time_limit, NOW() AS db_now,
+               u.account_balance + COALESCE((
+                   SELECT SUM(l.amount) FROM balance_ledger l
+                   WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+               ), 0) AS account_balance,
+               (SELECT COUNT(*) FROM system_settings
+                WHERE setting_name = %s
+                  AND updated_at >= DATE_SUB(NOW(), INTERVAL %s SECOND)) AS central_billing
+        FROM pc_units pc
+        JOIN users u ON u.user_id = %s
+        WHERE pc.unit_name = %s
+        FOR UPDATE
+    """, (HEARTBEAT_SETTING, HEARTBEAT_TIMEOUT, user_id, pc_name))
+    if not session_data:
+        return None
+
+    now = to_datetime(session_data.pop('db_now'))
+    last_charged_at = session_data.pop('last_charged_at')
+    charge = Decimal(0)
+    if (session_data['status'] == 'Occupied' and session_data['current_user_id'] == user_id
+            and not session_data['is_locked'] and last_charged_at is not None
+            and not session_data['central_billing']):
+        charge = charge_elapsed(user_id, pc_name, session_data['hourly_rate'],
+                                session_data['account_balance'], last_charged_at, now,
+                                session_data['current_session_id'], tier=session_data['tier'])
+
+    session_data['account_balance'] = Decimal(str(session_data['account_balance'])) - charge
+    session_data['charged'] = charge
+    session_data['elapsed_minutes'] = (
+        int((now - session_data['session_start']).total_seconds() // 60)
+        if session_data['session_start'] else None
+    )
+    return session_data
+
+
+def remaining_minutes(session_data, pc_name=None):
+    """Whole minutes left before the balance or the time limit runs out, at the current rate"""
+    rates = tariff.current()
+    rate = rates.hourly_rate_at(session_data['hourly_rate'] or 0, rates.tier_of(pc_name), datetime.now())
+    by_balance = int(float(session_data['account_balance']) * 60 / rate) if rate > 0 else None
+    if session_data['elapsed_minutes'] is None:
+        return by_balance
+    by_time = session_data['session_time_limit'] - session_data['elapsed_minutes']
+    return max(0, by_time if by_balance is None else min(by_time, by_balance))
+
+
+def end_expired_sessions(tx):
+    """Release PCs whose user ran out of balance or time; returns the ended sessions"""
+    expired = tx.fetchall("""
+        SELECT pc.id, pc.unit_name, pc.current_user_id, pc.current_session_id, u.username, u.session_time_limit,
+               u.account_balance + COALESCE((
+                   SELECT SUM(l.amount) FROM balance_ledger l
+                   WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+               ), 0) AS account_balance,
+               TIMESTAMPDIFF(MINUTE, pc.session_start, NOW()) AS elapsed_minutes
+        FROM pc_units pc
+        JOIN users u ON pc.current_user_id = u.user_id
+        WHERE pc.status = 'Occupied' AND pc.session_start IS NOT NULL
+        FOR UPDATE
+    """)
+    expired = [pc for pc in expired
+               if float(pc['account_balance']) <= 0 or pc['elapsed_minutes'] >= pc['session_time_limit']]
+    if expired:
+        sessions.close_sessions(tx, [
+            (sessions.NO_BALANCE if float(pc['account_balance']) <= 0 else sessions.EXPIRED,
+             pc['current_session_id'])
+            for pc in expired if pc['current_session_id'] is not None
+        ])
+        tx.executemany("""
+            UPDATE pc_units
+            SET status = 'Available', current_user_id = NULL, session_start = NULL, current_session_id = NULL
+            WHERE id = %s AND current_user_id = %s
+        """, [(pc['id'], pc['current_user_id']) for pc in expired])
+    return expired
+
+
+def expire_session(tx, pc_name, user_id):
+    """End one session if its time or balance has run out
+
+    Charges the session up to now under its row lock first. Returns the
+    end reason, or None with the session's new expiry instant if it still
+    has time left; (None, None) if the PC is no longer the user's.
+    """
+    session_data = settle_session(tx, pc_name, user_id)
+    if not session_data or session_data['status'] != 'Occupied' or session_data['session_start'] is None:
+        return None, None
+
+    now, balance = session_data['db_now'], session_data['account_balance']
+    # Less than a second's worth left counts as empty, since charges are per whole second
+    rates = tariff.current()
+    if balance * 3600 < Decimal(str(rates.hourly_rate_at(session_data['hourly_rate'], session_data['tier'], now))):
+        reason = sessions.NO_BALANCE
+    elif now - session_data['session_start'] >= timedelta(minutes=session_data['session_time_limit']):
+        reason = sessions.EXPIRED
+    else:
+        return None, expiry.expiry_of(session_data)
+    sessions.end_session(tx, pc_name, reason, user_id)
+    return reason, None
+
+
+def settle_session(tx, pc_name, user_id=None):
+    """Lock the PC's session and charge it from its watermark up to now
+
+    Every path that ends a session - logout, expiry, a forced logout - goes
+    through here first, so the last partial interval is billed before the
+    session closes. With user_id, only a PC still assigned to that user is
+    touched. Returns the session row with the post-charge 'account_balance'
+    and 'last_charged_at' and the database clock in 'db_now', or None if the
+    PC has no user.
+    """
+    session_data = tx.fetchone(f"""
+        SELECT {expiry.SCHEDULE_COLUMNS}, pc.status, pc.is_locked, pc.current_session_id, NOW() AS db_now
+        FROM pc_units pc
+        JOIN users u ON pc.current_user_id = u.user_id
+        WHERE pc.unit_name = %s AND pc.current_user_id = COALESCE(%s, pc.current_user_id)
+        FOR UPDATE
+    """, (pc_name, user_id))
+    if not session_data:
+        return None
+
+    now = session_data['db_now'] = to_datetime(session_data['db_now'])
+    balance = Decimal(str(session_data['account_balance']))
+    watermark = session_data['last_charged_at'] or session_data['session_start']
+    if watermark is not None and not session_data['is_locked']:
+        balance -= charge_elapsed(session_data['user_id'], pc_name, session_data['hourly_rate'], balance,
+                                  watermark, now, session_data['current_session_id'], tier=session_data['tier'])
+        session_data['last_charged_at'] = now
+    session_data['account_balance'] = balance
+    return session_data
+
+
+def end_session(tx, pc_name, reason, user_id=None):
+    """Settle the PC's session up to now, then close it and release the PC
+
+    Same arguments and return value as sessions.end_session.
+    """
+    settle_session(tx, pc_name, user_id)
+    return sessions.end_session(tx, pc_name, reason, user_id)
+
+
+def end_due_sessions(scheduler):
+    """Fire every expiry the scheduler has due; returns the number of sessions ended"""
+    ended = 0
+    now = scheduler.now()
+    for pc_name, user_id in scheduler.pop_due(now):
+        reason, expires_at = db.run_in_transaction(expire_session, pc_name, user_id)
+        if reason:
+            ended += 1
+            print(f"⏹ Ended session on {pc_name} ({reason})")
+        elif expires_at:
+            # Charges are per whole second, so never re-check sooner than that
+            scheduler.schedule(pc_name, user_id, max(expires_at, now + timedelta(seconds=1)))
+    return ended
+
+
+def write_heartbeat(tx):
+    tx.execute("""
+        INSERT INTO system_settings (setting_name, setting_value, updated_at)
+        VALUES (%s, 'running', NOW())
+        ON DUPLICATE KEY UPDATE setting_value = VALUES(setting_value), updated_at = NOW()
+    """, (HEARTBEAT_SETTING,))
+
+
+def tick(tx):
+    """One billing pass; returns (users charged, sessions ended)"""
+    charged = charge_occupied(tx, db_now(tx))
+    expired = end_expired_sessions(tx)
+    write_heartbeat(tx)
+    return charged, expired
+
+
+def run_tick():
+    charged, expired = db.run_in_transaction(tick)
+    for pc in expired:
+        reason = "balance" if float(pc['account_balance']) <= 0 else "time limit"
+        print(f"⏹ Ended {pc['username']}'s session on {pc['unit_name']} ({reason})")
+    return charged, expired
+
+
+def acquire_service_lock(conn):
+    """Make sure only one billing service charges this database (MySQL only)"""
+    if db.dialect() != 'mysql':
+        return True
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (SERVICE_LOCK,))
+        return bool(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+
+
+def serve(interval=BILLING_INTERVAL, ticks=None):
+    """Run billing ticks on a fixed schedule until interrupted (or for `ticks` ticks)"""
+    migrations.migrate()
+
+    # The named lock lives as long as this session, so keep it out of the pool
+    lock_conn = db.get_backend().connect()
+    try:
+        if not acquire_service_lock(lock_conn):
+            print("❌ Another billing service is already running against this database")
+            return False
+
+        print(f"✓ Billing service started ({db.get_backend()}, every {interval}s)")
+        scheduler = expiry.ExpiryScheduler()
+        next_tick = time.monotonic()
+        next_poll = next_tick
+        done = 0
+        while ticks is None or done < ticks:
+            if time.monotonic() >= next_tick:
+                try:
+                    charged, expired = run_tick()
+                    print(f"✓ Charged {charged} sessions, ended {len(expired)}")
+                    db.run_in_transaction(scheduler.sync)
+                except Error as e:
+                    print(f"Billing error: {e}")
+                done += 1
+
+                if done % ROLLUP_EVERY_TICKS == 0:
+                    try:
+                        ledger.rollup()
+                    except Error as e:
+                        print(f"Ledger rollup error: {e}")
+
+                # Fixed schedule: a slow tick shortens the wait instead of shifting every later tick
+                next_tick += interval
+                next_poll = time.monotonic() + EXPIRY_POLL_INTERVAL
+            else:
+                try:
+                    if time.monotonic() >= next_poll:
+                        db.run_in_transaction(scheduler.refresh)
+                        next_poll = time.monotonic() + EXPIRY_POLL_INTERVAL
+                    end_due_sessions(scheduler)
+                except Error as e:
+                    print(f"Expiry error: {e}")
+
+            if ticks is not None and done >= ticks:
+                break
+            # Sleep until the next tick, expiry or change poll, whichever comes first
+            wake = min(next_tick, next_poll)
+            until_expiry = scheduler.seconds_until_next() if len(scheduler) else None
+            if until_expiry is not None:
+                wake = min(wake, time.monotonic() + until_expiry)
+            delay = wake - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return True
+    finally:
+        lock_conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Central per-minute billing for all PCs")
+    parser.add_argument('--interval', type=float, default=BILLING_INTERVAL, help="seconds between ticks")
+    args = parser.parse_args()
+    try:
+        serve(args.interval)
+    except KeyboardInterrupt:
+        print("\n✓ Billing service stopped")
+    finally:
+        db.close_pool()
@@ -0,0 +1,48 @@
+"""
+Change feed over pc_units, orders and system_settings.
+
+Every insert or update stamps the row with the next row_version of its
+table (triggers from migration 13 draw it from a per-table counter in
+row_versions). A pc_units update that only moves the billing watermark,
+last_charged_at, keeps its version (migration 14; see
+migrations.PC_VERSIONED_COLUMNS). A poller keeps the highest version it
+has seen and asks only for the rows above it, so an unchanged table costs
+one lookup on the row_version index that returns nothing.
+
+Versions are not reused, and a writer holds its table's counter until it
+commits, so a version is only visible once every lower one is. Deleted rows
+do not show up; a poller that cares about deletions reloads in full.
+"""
+
+import migrations
+import prepared
+
+TABLES = migrations.VERSIONED_TABLES
+
+_queries = {}
+
+
+def current(table):
+    """The table's latest row_version, to poll from after a full load"""
+    row = prepared.fetchone("SELECT version FROM row_versions WHERE table_name = %s", (table,))
+    return row['version'] if row else 0
+
+
+def since(table, version, columns='*'):
+    """(rows of `table` changed after `version`, oldest first; the version to ask from next)
+
+    `columns` must include row_version.
+    """
+    if table not in TABLES:
+        raise ValueError(f"No change feed for table '{table}'")
+    key = (table, columns)
+    if key not in _queries:
+        _queries[key] = f"SELECT {columns} FROM {table} WHERE row_version > %s ORDER BY row_version"
+    rows = prepared.fetchall(_queries[key], (version,))
+    return rows, latest(rows, version)
+
+
+def latest(rows, version):
+    """The highest row_version among `rows`, or `version` if there are none"""
+    return max([version] + [row['row_version'] for row in rows])
+
@@ -0,0 +1,625 @@
+"""
+Shared database access for the kiosk and admin windows.
+
+All windows draw connections from one bounded pool instead of opening their
+own, so the number of MySQL sessions follows the amount of concurrent work.
+The pool gets its connections from a storage backend (see storage.py), so the
+same code runs against MySQL or an embedded SQLite database.
+
+Heavy admin report reads go through report_fetchall/report_fetchone, which
+use a separate pool on a read replica when one is configured, so closing-time
+reports do not compete with the kiosks' billing writes on the primary.
+"""
+
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+import query_stats
+import storage
+
+DB_CONFIG = {
+    'host': 'localhost',
+    'port': 3306,
+    'user': 'root',
+    'password': '',
+    'database': 'internet_cafe',
+    'use_pure': True  # Fix for authentication plugin issue
+}
+
+POOL_MAX_SIZE = 6          # connections per process (kiosk + admin panel + workers)
+POOL_IDLE_TIMEOUT = 300    # seconds before an idle connection is closed
+POOL_ACQUIRE_TIMEOUT = 10  # seconds to wait for a free connection
+PING_INTERVAL = 30         # connections idle for less than this skip the pre-ping
+
+RECONNECT_ATTEMPTS = 4     # connection attempts before giving up
+RECONNECT_BASE_DELAY = 0.2 # seconds, doubled after each failed attempt
+RECONNECT_MAX_DELAY = 5
+
+REPLICA_POOL_MAX_SIZE = 2  # report connections; reports are few and sequential
+REPLICA_ACQUIRE_TIMEOUT = 2
+REPLICA_RETRY_INTERVAL = 60  # seconds to use the primary after the replica failed
+
+DEADLOCK_RETRIES = 3       # extra attempts for a unit of work that hit a deadlock
+DEADLOCK_BACKOFF = 0.05    # seconds, doubled (with jitter) after each retry
+
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+RETRYABLE_ERRNOS = {ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK}
+
+EXECUTOR_WORKERS = 2       # background query threads per window
+EXECUTOR_POLL_MS = 16      # how often finished results are handed to Tk (~60 fps)
+
+
+class PoolTimeoutError(Error):
+    """Raised when no pooled connection becomes free in time"""
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections with idle reaping and pre-ping"""
+
+    def __init__(self, connect=None, max_size=POOL_MAX_SIZE,
+                 idle_timeout=POOL_IDLE_TIMEOUT, acquire_timeout=POOL_ACQUIRE_TIMEOUT,
+                 ping_interval=PING_INTERVAL, reconnect_attempts=RECONNECT_ATTEMPTS,
+                 reconnect_delay=RECONNECT_BASE_DELAY):
+        self._connect = connect or (lambda: mysql.connector.connect(**DB_CONFIG))
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.ping_interval = ping_interval
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.reconnects = 0  # dead connections replaced since startup
+
+        self._idle = deque()  # (connection, returned_at), most recent on the right
+        self._in_use = 0
+        self._lock = threading.Condition()
+
+    @property
+    def size(self):
+        """Number of open connections, idle or checked out"""
+        with self._lock:
+            return len(self._idle) + self._in_use
+
+    def stats(self):
+        """Snapshot of pool usage for diagnostics"""
+        with self._lock:
+            return {'idle': len(self._idle), 'in_use': self._in_use, 'max_size': self.max_size,
+                    'reconnects': self.reconnects}
+
+    def acquire(self):
+        """Check out a live connection, opening one if the pool has room"""
+        deadline = time.monotonic() + self.acquire_timeout
+
+        with self._lock:
+            while True:
+                self._reap_locked()
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+
+                if self._in_use < self.max_size:
+                    self._in_use += 1
+                    conn, returned_at = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(msg="Timed out waiting for a database connection")
+                self._lock.wait(remaining)
+
+        try:
+            # Pre-ping connections that sat idle long enough for the server
+            # to drop them; recently used ones are trusted to save a round trip
+            if conn is not None and time.monotonic() - returned_at >= self.ping_interval:
+                if not self._is_alive(conn):
+                    self._close_quietly(conn)
+                    conn = self._reconnect()
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        return conn
+
+    def release(self, conn):
+        """Return a connection, ending any transaction the caller left open"""
+        healthy = True
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            self._reap_locked()
+            self._lock.notify()
+
+        if not healthy:
+            self._close_quietly(conn)
+
+    def ping(self, reconnect=True):
+        """Check that the server is reachable, optionally replacing a dead connection
+
+        Returns True when a live connection is available afterwards, and
+        False - never raises - when the pool is exhausted or the server is down.
+        """
+        try:
+            conn = self.acquire()
+        except Error:
+            return False   # PoolTimeoutError, or acquire() could not connect
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            self._close_quietly(conn)
+            conn = None
+            if not reconnect:
+                return False
+            try:
+                conn = self._reconnect()
+                return True
+            except Error:
+                return False
+        finally:
+            if conn is not None:
+                self.release(conn)
+            else:
+                with self._lock:
+                    self._in_use -= 1
+                    self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def reap_idle(self):
+        """Close connections that have been idle longer than idle_timeout"""
+        with self._lock:
+            self._reap_locked()
+
+    def close_all(self):
+        """Close every idle connection (used on application exit)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _open(self):
+        """Open a new connection, backing off exponentially between failed attempts"""
+        delay = self.reconnect_delay
+        for attempt in range(1, self.reconnect_attempts + 1):
+            try:
+                return self._connect()
+            except Error:
+                if attempt == self.reconnect_attempts:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _reconnect(self):
+        # Only a fresh session is needed - the schema is already migrated
+        conn = self._open()
+        with self._lock:
+            self.reconnects += 1
+        return conn
+
+    def _reap_locked(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        # Oldest connections sit on the left; stop at the first fresh one
+        while self._idle and self._idle[0][1] < cutoff:
+            conn, _ = self._idle.popleft()
+            self._close_quietly(conn)
+
+    def _is_alive(self, conn):
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class DatabaseExecutor:
+    """Runs database work on background threads and delivers results on the Tk thread
+
+    Tk widgets may only be touched from the thread running mainloop, so
+    finished jobs are queued and drained by a root.after poll that only runs
+    while jobs are outstanding. Callbacks must check that their widgets still
+    exist, since the user may have navigated away in the meantime.
+    """
+
+    def __init__(self, root, max_workers=EXECUTOR_WORKERS, poll_interval=EXECUTOR_POLL_MS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._workers = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db-worker')
+        self._done = queue.SimpleQueue()
+        self._pending = 0       # only touched on the Tk thread
+        self._poll_id = None
+        self._closed = False
+
+    def submit(self, fn, *args, on_success=None, on_error=None, **kwargs):
+        """Run fn(*args, **kwargs) on a worker; must be called from the Tk thread
+
+        on_success(result) or on_error(exception) is then called on the Tk
+        thread. Returns the underlying Future.
+        """
+        if self._closed:
+            raise RuntimeError("DatabaseExecutor has been shut down")
+
+        self._pending += 1
+        caller = query_stats.find_caller()
+        future = self._workers.submit(self._run, fn, args, kwargs, on_success, on_error, caller)
+        self._schedule_poll()
+        return future
+
+    def shutdown(self):
+        """Stop accepting work and drop any results not yet delivered"""
+        self._closed = True
+        if self._poll_id is not None:
+            try:
+                self.root.after_cancel(self._poll_id)
+            except Exception:
+                pass
+            self._poll_id = None
+        self._workers.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, args, kwargs, on_success, on_error, caller):
+        query_stats.set_caller_hint(caller)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._done.put((on_error or self._report_error, e))
+            raise
+        self._done.put((on_success, result))
+        return result
+
+    def _schedule_poll(self):
+        if self._poll_id is None and not self._closed:
+            try:
+                self._poll_id = self.root.after(self.poll_interval, self._drain)
+            except Exception:
+                # Window destroyed - nothing left to deliver results to
+                self.shutdown()
+
+    def _drain(self):
+        self._poll_id = None
+        while True:
+            try:
+                callback, value = self._done.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if callback is None:
+                continue
+            try:
+                callback(value)
+            except Exception as e:
+                print(f"Error in database callback: {e}")
+
+        if self._pending > 0:
+            self._schedule_poll()
+
+    def _report_error(self, error):
+        print(f"Background database error: {error}")
+
+
+_backend = None
+_pool = None
+_replica_backend = None
+_replica_pool = None
+_replica_down_until = 0.0
+_pool_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the storage backend, chosen from CAFE_DB_BACKEND on first use"""
+    global _backend, _replica_backend
+    with _pool_lock:
+        if _backend is None:
+            _backend = storage.backend_from_env(DB_CONFIG)
+            _replica_backend = storage.replica_backend_from_env(DB_CONFIG)
+        return _backend
+
+
+def configure(backend, replica=None):
+    """Switch the process to another storage backend (tests, simulators)
+
+    replica is an optional backend for report reads. Idle connections of the
+    previous pools are closed; callers must not be holding connections when
+    switching.
+    """
+    global _backend, _pool, _replica_backend, _replica_pool, _replica_down_until
+    with _pool_lock:
+        old_pools = [_pool, _replica_pool]
+        _pool = _replica_pool = None
+        _backend = backend
+        _replica_backend = replica
+        _replica_down_until = 0.0
+    for old_pool in old_pools:
+        if old_pool is not None:
+            old_pool.close_all()
+
+
+def dialect():
+    """SQL dialect of the active backend: 'mysql' or 'sqlite'"""
+    return get_backend().dialect
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    backend = get_backend()
+    with _pool_lock:
+        if _pool is None:
+            # Every pooled connection hands out timing cursors (see query_stats.py)
+            _pool = ConnectionPool(connect=lambda: query_stats.instrument(backend.connect()))
+        return _pool
+
+
+def get_replica_pool():
+    """Return the report pool on the read replica, or None if there is no replica"""
+    global _replica_pool
+    get_backend()
+    with _pool_lock:
+        if _replica_backend is None:
+            return None
+        if _replica_pool is None:
+            replica = _replica_backend
+            # Fail fast: a dead replica should cost a report one attempt, not a backoff
+            _replica_pool = ConnectionPool(connect=lambda: query_stats.instrument(replica.connect()),
+                                           max_size=REPLICA_POOL_MAX_SIZE,
+                                           acquire_timeout=REPLICA_ACQUIRE_TIMEOUT,
+                                           reconnect_attempts=1)
+        return _replica_pool
+
+
+def connection():
+    """Borrow a connection from the shared pool: `with db.connection() as conn:`"""
+    return get_pool().connection()
+
+
+def ping(reconnect=True):
+    """Cheap liveness check on the shared pool; see ConnectionPool.ping"""
+    return get_pool().ping(reconnect)
+
+
+class Transaction:
+    """A unit of work on one pooled connection, committed once at the end
+
+    Obtained from `with db.transaction() as tx:`. Statements run through
+    tx.execute/fetchall/... (or the module-level helpers, which join the
+    active transaction on this thread) and are committed together.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._savepoints = 0
+
+    def execute(self, query, params=None):
+        """Run a write statement without committing; returns the affected row count"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params or ())
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def insert(self, query, params=None):
+        """Run an INSERT without committing; returns the new row's AUTO_INCREMENT id"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params or ())
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+
+    def executemany(self, query, seq_params):
+        """Run one statement for every parameter tuple; returns the affected row count"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(query, list(seq_params))
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def fetchall(self, query, params=None, dictionary=True):
+        cursor = self.conn.cursor(dictionary=dictionary)
+        try:
+            cursor.execute(query, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def fetchone(self, query, params=None, dictionary=True):
+        rows = self.fetchall(query, params, dictionary)
+        return rows[0] if rows else None
+
+    @contextmanager
+    def savepoint(self):
+        """Nested unit of work: rolled back on its own if the block raises"""
+        self._savepoints += 1
+        name = f"sp_{self._savepoints}"
+        if getattr(self.conn, 'dialect', 'mysql') == 'sqlite' and not self.conn.in_transaction:
+            # Releasing an outermost SQLite savepoint would commit on the spot
+            self.execute("BEGIN")
+        self.execute(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except BaseException:
+            self.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            self.execute(f"RELEASE SAVEPOINT {name}")
+            raise
+        else:
+            self.execute(f"RELEASE SAVEPOINT {name}")
+
+
+_local = threading.local()
+
+
+def current_transaction():
+    """The transaction open on this thread, if any"""
+    return getattr(_local, 'transaction', None)
+
+
+@contextmanager
+def transaction():
+    """Group statements into one commit: `with db.transaction() as tx:`
+
+    Nested use on the same thread becomes a savepoint inside the outer
+    transaction. Any exception rolls the block back and propagates.
+    """
+    outer = current_transaction()
+    if outer is not None:
+        with outer.savepoint():
+            yield outer
+        return
+
+    with connection() as conn:
+        tx = Transaction(conn)
+        _local.transaction = tx
+        try:
+            yield tx
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Error:
+                pass  # the pool discards connections it cannot reset
+            raise
+        finally:
+            _local.transaction = None
+
+
+def run_in_transaction(fn, *args, retries=DEADLOCK_RETRIES, **kwargs):
+    """Call fn(tx, *args, **kwargs) in a transaction, retrying it on deadlock
+
+    InnoDB rolls back the whole transaction when it picks a deadlock victim,
+    so the entire unit of work is re-run. Nested calls are not retried here;
+    the error propagates to the outermost unit of work.
+    """
+    nested = current_transaction() is not None
+    attempt = 0
+    while True:
+        try:
+            with transaction() as tx:
+                return fn(tx, *args, **kwargs)
+        except Error as e:
+            if nested or e.errno not in RETRYABLE_ERRNOS or attempt >= retries:
+                raise
+            attempt += 1
+            time.sleep(DEADLOCK_BACKOFF * (2 ** (attempt - 1)) * (1 + random.random()))
+
+
+def fetchall(query, params=None, dictionary=True):
+    """Run a read query on a pooled connection and return all rows"""
+    tx = current_transaction()
+    if tx is not None:
+        return tx.fetchall(query, params, dictionary)
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            cursor.execute(query, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def fetchone(query, params=None, dictionary=True):
+    """Run a read query on a pooled connection and return the first row"""
+    rows = fetchall(query, params, dictionary)
+    return rows[0] if rows else None
+
+
+def replica_down():
+    """True while report reads are falling back to the primary after a replica failure"""
+    return time.monotonic() < _replica_down_until
+
+
+def report_fetchall(query, params=None, dictionary=True):
+    """Run a read-only report query on the replica, falling back to the primary
+
+    Results may lag the primary by the replication delay, so only use this
+    for reporting screens, never for reads that decide a write.
+    """
+    global _replica_down_until
+    pool = get_replica_pool()
+    if pool is None or current_transaction() is not None or replica_down():
+        return fetchall(query, params, dictionary)
+
+    try:
+        conn = pool.acquire()
+        try:
+            cursor = conn.cursor(dictionary=dictionary)
+            try:
+                cursor.execute(query, params or ())
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            pool.release(conn)
+    except (PoolTimeoutError, mysql.connector.InterfaceError, mysql.connector.OperationalError) as e:
+        # Connection-level trouble only; a bad query would fail on the primary too
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_INTERVAL
+        print(f"Read replica unavailable, reporting from the primary: {e}")
+        return fetchall(query, params, dictionary)
+
+
+def report_fetchone(query, params=None, dictionary=True):
+    """Like report_fetchall, returning the first row"""
+    rows = report_fetchall(query, params, dictionary)
+    return rows[0] if rows else None
+
+
+def execute(query, params=None):
+    """Run a single write statement and commit it; returns the affected row count
+
+    Inside db.transaction() the statement joins that transaction instead.
+    """
+    tx = current_transaction()
+    if tx is not None:
+        return tx.execute(query, params)
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params or ())
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+def close_pool():
+    """Close idle pooled connections on shutdown"""
+    with _pool_lock:
+        pools = [_pool, _replica_pool]
+    for pool in pools:
+        if pool is not None:
+            pool.close_all()
@@ -0,0 +1,165 @@
+"""
+Session expiry scheduler.
+
+Keeps a min-heap of the instant each occupied PC's session runs out -
+whichever comes first of its time limit (session_start +
+session_time_limit) and its balance (last_charged_at + live balance /
+hourly rate) - so the billing service can sleep until exactly the next
+expiry instead of noticing it on its next tick.
+
+The heap is maintained incrementally. refresh() polls for what changed
+since the last call (sessions opened, top-ups and other non-billing ledger
+entries) and reschedules only those PCs; sync() re-reads every occupied PC
+once per billing tick to pick up rate and time-limit changes, touching the
+heap only where an expiry moved. Entries are never removed in place: a
+rescheduled PC gets a new entry and the stale one is skipped when it
+reaches the top.
+
+A due entry is only a hint. The service re-checks the session under its row
+lock before ending it (billing_service.expire_session), so an entry made
+stale by a change the scheduler has not seen yet is rescheduled instead.
+"""
+
+import heapq
+import math
+import time
+from datetime import datetime, timedelta
+
+import tariff
+
+SCHEDULE_COLUMNS = """
+    pc.unit_name, pc.tier, pc.current_user_id AS user_id, pc.session_start, pc.last_charged_at,
+    u.session_time_limit, u.hourly_rate,
+    u.account_balance + COALESCE((
+        SELECT SUM(l.amount) FROM balance_ledger l
+        WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+    ), 0) AS account_balance
+"""
+
+
+def expiry_of(session, rates=None):
+    """When a session runs out of time or balance, on the database clock
+
+    The balance side follows the tariff (see tariff.py); bundle time is not
+    counted, so a session living on a bundle is re-checked and rescheduled
+    when its balance would have run out.
+    """
+    by_time = session['session_start'] + timedelta(minutes=session['session_time_limit'])
+    charged_until = session['last_charged_at'] or session['session_start']
+    by_balance = (rates or tariff.current()).affordable_until(session['hourly_rate'] or 0, session['tier'], charged_until,
+                                                   max(float(session['account_balance']), 0))
+    if by_balance is None:
+        return by_time
+    # Whole seconds, rounded up past float noise
+    seconds = math.ceil((by_balance - charged_until).total_seconds() - 0.001)
+    return min(by_time, charged_until + timedelta(seconds=seconds))
+
+
+class ExpiryScheduler:
+    """Min-heap of (expires_at, unit_name, user_id) for occupied PCs"""
+
+    def __init__(self):
+        self._heap = []
+        self._scheduled = {}  # unit_name -> (expires_at, user_id) of its live entry
+        self._ledger_mark = 0
+        self._session_mark = 0
+        self._clock = None    # (database time, time.monotonic()) at the last read
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def schedule(self, unit_name, user_id, expires_at):
+        """(Re)schedule a PC; returns False if it was already scheduled then"""
+        if self._scheduled.get(unit_name) == (expires_at, user_id):
+            return False
+        self._scheduled[unit_name] = (expires_at, user_id)
+        heapq.heappush(self._heap, (expires_at, unit_name, user_id))
+        return True
+
+    def discard(self, unit_name):
+        self._scheduled.pop(unit_name, None)
+
+    def next_expiry(self):
+        """The earliest scheduled expiry, or None"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return (unit_name, user_id) of every PC due at `now`"""
+        due = []
+        while self.next_expiry() is not None and self._heap[0][0] <= now:
+            _, unit_name, user_id = heapq.heappop(self._heap)
+            del self._scheduled[unit_name]
+            due.append((unit_name, user_id))
+        return due
+
+    def _drop_stale(self):
+        while self._heap:
+            expires_at, unit_name, user_id = self._heap[0]
+            if self._scheduled.get(unit_name) == (expires_at, user_id):
+                return
+            heapq.heappop(self._heap)
+
+    def now(self):
+        """Current database time, estimated from the last read and the monotonic clock"""
+        db_time, read_at = self._clock
+        return db_time + timedelta(seconds=time.monotonic() - read_at)
+
+    def seconds_until_next(self):
+        """Seconds until the next expiry (0 if overdue), or None if nothing is scheduled"""
+        expires_at = self.next_expiry()
+        if expires_at is None:
+            return None
+        return max(0.0, (expires_at - self.now()).total_seconds())
+
+    def _read_clock(self, tx):
+        row = tx.fetchone("""
+            SELECT NOW() AS db_now,
+                   (SELECT COALESCE(MAX(entry_id), 0) FROM balance_ledger) AS ledger_mark,
+                   (SELECT COALESCE(MAX(session_id), 0) FROM sessions) AS session_mark
+        """)
+        db_now = row['db_now']
+        if isinstance(db_now, str):  # SQLite returns computed timestamps as text
+            db_now = datetime.fromisoformat(db_now)
+        self._clock = (db_now, time.monotonic())
+        return row
+
+    def sync(self, tx):
+        """Re-read every occupied PC; returns the number of PCs rescheduled"""
+        marks = self._read_clock(tx)
+        rows = tx.fetchall(f"""
+            SELECT {SCHEDULE_COLUMNS}
+            FROM pc_units pc
+            JOIN users u ON pc.current_user_id = u.user_id
+            WHERE pc.status = 'Occupied' AND pc.session_start IS NOT NULL
+        """)
+        occupied = {row['unit_name'] for row in rows}
+        for unit_name in [name for name in self._scheduled if name not in occupied]:
+            self.discard(unit_name)
+        self._ledger_mark, self._session_mark = marks['ledger_mark'], marks['session_mark']
+        return self._apply(rows)
+
+    def refresh(self, tx):
+        """Reschedule PCs whose session opened or whose user's balance changed since the last read"""
+        if self._clock is None:
+            return self.sync(tx)
+        ledger_mark, session_mark = self._ledger_mark, self._session_mark
+        marks = self._read_clock(tx)
+        if (marks['ledger_mark'], marks['session_mark']) == (ledger_mark, session_mark):
+            return 0
+        self._ledger_mark, self._session_mark = marks['ledger_mark'], marks['session_mark']
+        rows = tx.fetchall(f"""
+            SELECT {SCHEDULE_COLUMNS}
+            FROM pc_units pc
+            JOIN users u ON pc.current_user_id = u.user_id
+            WHERE pc.status = 'Occupied' AND pc.session_start IS NOT NULL
+              AND (pc.current_session_id > %s
+                   OR pc.current_user_id IN (
+                       SELECT l.user_id FROM balance_ledger l
+                       WHERE l.entry_id > %s AND l.entry_type <> 'session_charge'
+                   ))
+        """, (session_mark, ledger_mark))
+        return self._apply(rows)
+
+    def _apply(self, rows):
+        return sum(self.schedule(row['unit_name'], row['user_id'], expiry_of(row)) for row in rows)
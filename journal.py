@@ -0,0 +1,274 @@
+"""
+Local charge journal for kiosks.
+
+A kiosk does not need the server every minute to bill its session. Each
+billing tick appends a charge record - the session, the instant it is
+charged up to (on the database clock) and the locally priced amount - to an
+append-only file, fsync'd before the tick returns. The journal is flushed
+to the server in one transaction every FLUSH_INTERVAL seconds, on the first
+tick after an outage and at logout. Between flushes a tick costs one
+primary-key read of the PC row, or nothing while the server is unreachable,
+and a session gets one ledger row per flush instead of one per minute.
+
+Flushing is idempotent. A session's records are applied as one
+charge_elapsed() from its server-side watermark up to the latest journaled
+instant, under the PC's row lock, so nothing the central service or an
+earlier flush charged is charged again. The ledger row carries the batch's
+idempotency key, and the batch is acknowledged in the file only after the
+transaction commits. Records of a session that has ended since are
+acknowledged without charging; whoever ended it settled it.
+
+The server stays the authority on price. The local amount only keeps the
+kiosk's balance estimate and warnings right between flushes, so the journal
+defers only while the balance lasts longer than a flush interval and the
+central billing service is not running; otherwise every tick goes to the
+server as before.
+
+File format, one JSON object per line: a header {"journal": id, "seq": n},
+charge records {"seq": n, "session_id", "pc_name", "user_id", "charged_to",
+"amount"} and acknowledgements {"ack": n} covering every record up to n.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from mysql.connector import Error
+
+import billing_service
+import db
+import prepared
+import tariff
+
+JOURNAL_PATH = os.environ.get('CAFE_JOURNAL_PATH', 'charge_journal.log')
+FLUSH_INTERVAL = int(os.environ.get('CAFE_JOURNAL_FLUSH_MINUTES', 5)) * 60  # seconds
+COMPACT_SIZE = 64 * 1024  # rewrite a fully acknowledged journal past this many bytes
+
+STATUS_QUERY = """
+    SELECT pc.status, pc.is_locked, pc.current_user_id, pc.current_session_id, pc.last_charged_at,
+           NOW() AS db_now,
+           (SELECT COUNT(*) FROM system_settings
+            WHERE setting_name = %s
+              AND updated_at >= DATE_SUB(NOW(), INTERVAL %s SECOND)) AS central_billing
+    FROM pc_units pc
+    WHERE pc.unit_name = %s
+"""
+
+
+def apply_charges(tx, records, journal_id):
+    """Charge each journaled session up to its latest record; returns the total charged"""
+    batches = {}
+    for record in records:
+        batch = batches.setdefault(record['session_id'], dict(record, first_seq=record['seq']))
+        batch['charged_to'] = max(batch['charged_to'], record['charged_to'])
+        batch['seq'] = record['seq']
+
+    total = Decimal(0)
+    for session_id, batch in batches.items():
+        session_data = tx.fetchone("""
+            SELECT pc.last_charged_at, pc.is_locked, pc.tier, u.hourly_rate, NOW() AS db_now,
+                   u.account_balance + COALESCE((
+                       SELECT SUM(l.amount) FROM balance_ledger l
+                       WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+                   ), 0) AS account_balance
+            FROM pc_units pc
+            JOIN users u ON pc.current_user_id = u.user_id
+            WHERE pc.unit_name = %s AND pc.current_user_id = %s AND pc.current_session_id = %s
+            FOR UPDATE
+        """, (batch['pc_name'], batch['user_id'], session_id))
+        if not session_data or session_data['is_locked'] or session_data['last_charged_at'] is None:
+            continue
+
+        key = f"{journal_id}:{batch['first_seq']}-{batch['seq']}"
+        if tx.fetchone("SELECT entry_id FROM balance_ledger WHERE idempotency_key = %s", (key,)):
+            continue  # committed before, acknowledgement lost
+        charged_to = min(batch['charged_to'], billing_service.to_datetime(session_data['db_now']))
+        if charged_to <= session_data['last_charged_at']:
+            continue
+        total += billing_service.charge_elapsed(
+            batch['user_id'], batch['pc_name'], session_data['hourly_rate'], session_data['account_balance'],
+            session_data['last_charged_at'], charged_to, session_id, key, session_data['tier']
+        )
+    return total
+
+
+class ChargeJournal:
+    """One kiosk's journal of charges not yet applied on the server"""
+
+    def __init__(self, path=JOURNAL_PATH, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()  # ticks run on DB executor workers, logout on the Tk thread
+        self._journal_id, self._seq, self.pending = self._load()
+        self._next_flush = time.monotonic()  # flush what a previous run left first
+        self._billing = None    # (pc_name, user_id, session data) of the session billed locally
+        self._generation = 0    # bumped by reset(); a tick started before it does not resume local billing
+        self._charged_to = None
+        self._defer = False
+        self._clock = None      # (database time, time.monotonic()) at the last read
+
+    # -- file -----------------------------------------------------------
+
+    def _load(self):
+        """Replay the file: its id, the last sequence number and the unacknowledged records"""
+        journal_id, seq, records, acked = None, 0, [], 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            complete = data[:data.rfind(b'\n') + 1]
+            if len(complete) < len(data):
+                # A record torn by a crash; its tick never returned, so drop it
+                with open(self.path, 'r+b') as f:
+                    f.truncate(len(complete))
+                    os.fsync(f.fileno())
+            for line in complete.decode('utf-8').splitlines():
+                record = json.loads(line)
+                if 'journal' in record:
+                    journal_id, seq = record['journal'], record['seq']
+                elif 'ack' in record:
+                    acked = max(acked, record['ack'])
+                else:
+                    record['charged_to'] = datetime.fromisoformat(record['charged_to'])
+                    record['amount'] = Decimal(record['amount'])
+                    records.append(record)
+                    seq = record['seq']
+        if journal_id is None:
+            journal_id = uuid.uuid4().hex
+            self._rewrite(journal_id, seq)
+        return journal_id, seq, [record for record in records if record['seq'] > acked]
+
+    def _append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self, journal_id, seq):
+        """Replace the file with a bare header; only valid when nothing is pending"""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'journal': journal_id, 'seq': seq}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def record_charge(self, session_id, pc_name, user_id, charged_to, amount):
+        """Durably append a charge of the session up to `charged_to`"""
+        with self._lock:
+            self._seq += 1
+            record = {'seq': self._seq, 'session_id': session_id, 'pc_name': pc_name, 'user_id': user_id,
+                      'charged_to': charged_to, 'amount': amount}
+            self._append(dict(record, charged_to=charged_to.isoformat(), amount=str(amount)))
+            self.pending.append(record)
+            return record
+
+    def flush(self):
+        """Apply every pending record on the server; returns the amount charged"""
+        with self._lock:
+            total = Decimal(0)
+            if self.pending:
+                batch = list(self.pending)
+                total = db.run_in_transaction(apply_charges, batch, self._journal_id)
+                self._append({'ack': batch[-1]['seq']})
+                self.pending = self.pending[len(batch):]
+                if not self.pending and os.path.getsize(self.path) > COMPACT_SIZE:
+                    self._rewrite(self._journal_id, self._seq)
+            self._next_flush = time.monotonic() + self.flush_interval
+            return total
+
+    # -- billing ticks --------------------------------------------------
+
+    def tick(self, pc_name, user_id):
+        """A kiosk's billing tick; returns session data like billing_service.charge_session()
+
+        Goes to the server when a flush is due or the session cannot be
+        deferred, and charges locally otherwise or when the server is
+        unreachable. Raises Error only if the server is unreachable before
+        this session's first tick.
+        """
+        with self._lock:
+            # reset() may clear _billing mid-tick; this tick works from what it started with
+            generation, billed = self._generation, self._billing
+            billing = billed is not None and billed[:2] == (pc_name, user_id)
+            if not (billing and self._defer and time.monotonic() < self._next_flush):
+                try:
+                    return self._sync(pc_name, user_id, generation)
+                except Error:
+                    if not billing:
+                        raise
+                    return self._charge_locally(None, billed)
+
+            try:
+                status = prepared.fetchone(STATUS_QUERY, (billing_service.HEARTBEAT_SETTING,
+                                                          billing_service.HEARTBEAT_TIMEOUT, pc_name))
+            except Error:
+                return self._charge_locally(None, billed)
+            session_data = billed[2]
+            if (not status or status['current_session_id'] != session_data['current_session_id']
+                    or status['status'] != 'Occupied' or status['is_locked'] or status['central_billing']):
+                try:
+                    return self._sync(pc_name, user_id, generation)  # something changed; let the server say what
+                except Error:
+                    return self._charge_locally(None, billed)
+            return self._charge_locally(status, billed)
+
+    def reset(self):
+        """Stop billing the current session locally, e.g. at logout
+
+        Takes no lock, so the Tk thread never waits behind a tick stuck on
+        the server; a tick already running finishes without resuming local
+        billing.
+        """
+        self._generation += 1
+        self._billing = None
+
+    def _sync(self, pc_name, user_id, generation):
+        self.flush()
+        session_data = billing_service.charge_session(pc_name, user_id)
+        self._billing = None
+        if generation != self._generation:
+            return session_data   # reset() while the server was answering
+        if (session_data and session_data['current_user_id'] == user_id and session_data['status'] == 'Occupied'
+                and not session_data['is_locked'] and not session_data['central_billing']):
+            status = prepared.fetchone(STATUS_QUERY, (billing_service.HEARTBEAT_SETTING,
+                                                      billing_service.HEARTBEAT_TIMEOUT, pc_name))
+            if status and status['last_charged_at'] is not None:
+                self._clock = (billing_service.to_datetime(status['db_now']), time.monotonic())
+                self._billing = (pc_name, user_id, dict(session_data))
+                self._charged_to = status['last_charged_at']
+                remaining = session_data['remaining_minutes']
+                self._defer = remaining is None or remaining * 60 > self.flush_interval
+        return session_data
+
+    def _charge_locally(self, status, billed):
+        """Journal the time since the last charge and estimate the session `billed` from it"""
+        pc_name, user_id, session_data = billed
+        if status is not None:
+            self._clock = (billing_service.to_datetime(status['db_now']), time.monotonic())
+            self._charged_to = max(self._charged_to, status['last_charged_at'])
+        else:
+            self._next_flush = 0  # try the server again next tick
+        db_time, read_at = self._clock
+        now = db_time + timedelta(seconds=time.monotonic() - read_at)
+
+        rates = tariff.current()
+        balance = Decimal(str(session_data['account_balance']))
+        amount = Decimal(0)
+        if now > self._charged_to:
+            price = rates.price(session_data['hourly_rate'], rates.tier_of(pc_name), self._charged_to, now)
+            amount = billing_service.cap_charge(price, balance)
+            self.record_charge(session_data['current_session_id'], pc_name, user_id, now, amount)
+            self._charged_to = now
+
+        session_data['account_balance'] = balance - amount
+        session_data['charged'] = amount
+        session_data['elapsed_minutes'] = int((now - session_data['session_start']).total_seconds() // 60)
+        session_data['remaining_minutes'] = billing_service.remaining_minutes(session_data, pc_name)
+        if session_data['remaining_minutes'] is not None and \
+                session_data['remaining_minutes'] * 60 <= self.flush_interval:
+            self._defer = False
+        return dict(session_data)
@@ -0,0 +1,143 @@
+"""
+Append-only balance ledger.
+
+Top-ups, session charges and cafe orders are written as rows in
+balance_ledger instead of overwriting users.account_balance, so every
+change has a history and writers never contend on the users row.
+
+users.account_balance is the rolled-up snapshot: rollup() folds the
+unrolled tail into it in batches and marks those rows rolled_up. The live
+balance of a user is therefore the snapshot plus the sum of their
+unrolled entries, which is what live_balance() computes (LIVE_BALANCE is
+the expression for queries over users u; the billing queries inline it).
+
+Run `python ledger.py` to roll up the tail, or
+`python ledger.py --history USER_ID` to print a user's recent entries.
+"""
+
+import argparse
+from collections import defaultdict
+from decimal import Decimal
+
+import db
+
+TOPUP = 'topup'
+SESSION_CHARGE = 'session_charge'
+CAFE_ORDER = 'cafe_order'
+ADJUSTMENT = 'adjustment'
+BUNDLE_PURCHASE = 'bundle_purchase'
+
+ROLLUP_BATCH_SIZE = 5000  # ledger rows folded into users per rollup transaction
+
+# Live balance of each row of `users u`: the snapshot plus the unrolled tail
+LIVE_BALANCE = """u.account_balance + COALESCE((
+        SELECT SUM(l.amount) FROM balance_ledger l
+        WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+    ), 0)"""
+
+
+def record(user_id, entry_type, amount, reference=None):
+    """Append one entry (positive amount credits, negative debits)"""
+    db.execute("""
+        INSERT INTO balance_ledger (user_id, entry_type, amount, reference)
+        VALUES (%s, %s, %s, %s)
+    """, (user_id, entry_type, amount, reference))
+
+
+def record_many(entries):
+    """Append (user_id, entry_type, amount, reference) entries in one batched insert"""
+    entries = list(entries)
+    if not entries:
+        return 0
+    with db.transaction() as tx:
+        return tx.executemany("""
+            INSERT INTO balance_ledger (user_id, entry_type, amount, reference)
+            VALUES (%s, %s, %s, %s)
+        """, entries)
+
+
+def live_balance(user_id):
+    """Snapshot plus unrolled tail; None if the user does not exist"""
+    row = db.fetchone(f"""
+        SELECT {LIVE_BALANCE} AS balance
+        FROM users u
+        WHERE u.user_id = %s
+    """, (user_id,))
+    return Decimal(str(row['balance'])) if row else None
+
+
+def history(user_id, limit=50):
+    """Most recent ledger entries of a user, newest first"""
+    return db.fetchall("""
+        SELECT entry_id, entry_type, amount, reference, rolled_up, created_at
+        FROM balance_ledger
+        WHERE user_id = %s
+        ORDER BY entry_id DESC
+        LIMIT %s
+    """, (user_id, limit))
+
+
+def _rollup_batch(tx, batch_size, user_id):
+    if user_id is None:
+        rows = tx.fetchall("""
+            SELECT entry_id, user_id, amount FROM balance_ledger
+            WHERE rolled_up = FALSE
+            ORDER BY entry_id
+            LIMIT %s
+            FOR UPDATE
+        """, (batch_size,))
+    else:
+        rows = tx.fetchall("""
+            SELECT entry_id, user_id, amount FROM balance_ledger
+            WHERE user_id = %s AND rolled_up = FALSE
+            ORDER BY entry_id
+            LIMIT %s
+            FOR UPDATE
+        """, (user_id, batch_size))
+    if not rows:
+        return 0
+
+    totals = defaultdict(Decimal)
+    for row in rows:
+        totals[row['user_id']] += Decimal(str(row['amount']))
+
+    tx.executemany(
+        "UPDATE users SET account_balance = account_balance + %s WHERE user_id = %s",
+        [(amount, uid) for uid, amount in totals.items()]
+    )
+    # Mark exactly the rows that were read: an entry committed meanwhile with a
+    # lower id must stay in the tail for the next rollup
+    tx.executemany(
+        "UPDATE balance_ledger SET rolled_up = TRUE WHERE entry_id = %s",
+        [(row['entry_id'],) for row in rows]
+    )
+    return len(rows)
+
+
+def rollup(batch_size=ROLLUP_BATCH_SIZE, user_id=None):
+    """Fold the unrolled tail (of one user, or everyone) into users.account_balance
+
+    Returns the number of ledger rows rolled up.
+    """
+    total = 0
+    while True:
+        rolled = db.run_in_transaction(_rollup_batch, batch_size, user_id)
+        total += rolled
+        if rolled < batch_size:
+            return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Balance ledger maintenance")
+    parser.add_argument('--history', type=int, metavar='USER_ID', help="print a user's recent entries")
+    args = parser.parse_args()
+    try:
+        if args.history is not None:
+            for entry in history(args.history):
+                print(f"{entry['created_at']}  {entry['entry_type']:<15} {float(entry['amount']):>10.2f}  "
+                      f"{entry['reference'] or ''}")
+            print(f"Live balance: ₱{live_balance(args.history) or 0:.2f}")
+        else:
+            print(f"✓ Rolled up {rollup()} ledger entries")
+    finally:
+        db.close_pool()
@@ -1,15 +1,27 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import mysql.connector
 from mysql.connector import Error
 import hashlib
 import sys
 import os
+import time
+import billing_service
+import changes
+import db
+import journal
+import ledger
+import prepared
+import migrations
+import sessions
+import station_grid
 from user_home import HomeFrame
 from user_cafe import CafeFrame
 from user_account import AccountsFrame
 from admin_panel import AdminApp
 
+PC_REFRESH_INTERVAL = 5  # seconds between PC picker polls
+PC_CARD_COLUMNS = 'unit_name, status, is_locked, zone, row_version'  # what a picker card shows
+
 # Windows-specific imports for PC locking
 try:
     if sys.platform == "win32":
@@ -48,12 +60,22 @@ class CafeSystemApp:
 
         self.root.configure(bg=self.bg_color)
 
+        # Queries on hot paths run here so slow MySQL never freezes the UI
+        self.db_executor = db.DatabaseExecutor(self.root)
+
+        # Billing ticks are journaled locally and flushed to the server in batches
+        self.charge_journal = journal.ChargeJournal()
+
         self.current_user = None
-        self.db_connection = None
 
         # PC Selection variables
         self.selected_pc = None
+        self.pc_grid = None
         self.pc_frames_data = {}
+        self.pc_status = None  # selected PC's row as of the last check_authentication
+        self.pc_version = 0    # highest pc_units row_version the PC picker has seen
+        self.pc_refresh_id = None
+        self.billing_after_id = None
         
         # PC Lock variables
         self.is_locked = False
@@ -71,191 +93,17 @@ class CafeSystemApp:
 
     
     def setup_database(self):
-        """Setup database with ALL features"""
+        """Bring the database schema up to date (a single SELECT once fully migrated)"""
         try:
-            self.db_connection = mysql.connector.connect(
-                host='localhost',
-                port=3306,  # Your port
-                user='root',
-                password='',
-                database='internet_cafe',
-                use_pure=True  # Fix for authentication plugin issue
-            )
-            
-
-
-            if self.db_connection.is_connected():
-                cursor = self.db_connection.cursor()
-                
-                # Admins table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS admins (
-                        admin_id INT AUTO_INCREMENT PRIMARY KEY,
-                        username VARCHAR(50) UNIQUE NOT NULL,
-                        password VARCHAR(255) NOT NULL,
-                        full_name VARCHAR(100) NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Users table with NEW fields
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id INT AUTO_INCREMENT PRIMARY KEY,
-                        username VARCHAR(50) UNIQUE NOT NULL,
-                        password VARCHAR(255) NOT NULL,
-                        full_name VARCHAR(100) NOT NULL,
-                        phone_number VARCHAR(20),
-                        account_balance DECIMAL(10, 2) DEFAULT 0.00,
-                        session_time_limit INT DEFAULT 120,
-                        hourly_rate DECIMAL(10, 2) DEFAULT 20.00,
-                        is_approved BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # NEW: PC Units table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS pc_units (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        unit_name VARCHAR(20) UNIQUE NOT NULL,
-                        status ENUM('Available', 'Occupied', 'Offline', 'Maintenance') DEFAULT 'Available',
-                        current_user_id INT NULL,
-                        session_start TIMESTAMP NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (current_user_id) REFERENCES users(user_id) ON DELETE SET NULL
-                    )
-                """)
-                
-                # Cafe items with image support (create BEFORE orders table)
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS cafe_items (
-                        item_id INT AUTO_INCREMENT PRIMARY KEY,
-                        item_name VARCHAR(100) NOT NULL,
-                        category VARCHAR(50) NOT NULL,
-                        price DECIMAL(10, 2) NOT NULL,
-                        image_path VARCHAR(255) DEFAULT NULL,
-                        available BOOLEAN DEFAULT TRUE
-                    )
-                """)
-                
-                # Orders table (create AFTER cafe_items table)
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS orders (
-                        order_id INT AUTO_INCREMENT PRIMARY KEY,
-                        user_id INT,
-                        item_id INT NULL,
-                        item_name VARCHAR(100) NOT NULL,
-                        quantity INT NOT NULL,
-                        price DECIMAL(10, 2) NOT NULL,
-                        total_price DECIMAL(10, 2) NOT NULL,
-                        order_status VARCHAR(20) DEFAULT 'Pending',
-                        order_type VARCHAR(50) DEFAULT 'Deliver to PC',
-                        order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id),
-                        FOREIGN KEY (item_id) REFERENCES cafe_items(item_id)
-                    )
-                """)
-                
-                # Check if order_type column exists, if not add it (for existing databases)
-                cursor.execute("SHOW COLUMNS FROM orders LIKE 'order_type'")
-                if not cursor.fetchone():
-                    cursor.execute("ALTER TABLE orders ADD COLUMN order_type VARCHAR(50) DEFAULT 'Deliver to PC'")
-                    print("✅ Added order_type column to orders table")
-                
-                # NEW: Inventory table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS inventory_items (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        name VARCHAR(100) NOT NULL,
-                        category VARCHAR(50) DEFAULT 'General',
-                        quantity INT DEFAULT 0,
-                        unit_price DECIMAL(10,2) NOT NULL,
-                        min_stock_level INT DEFAULT 0,
-                        description TEXT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                # Check if is_locked column exists, if not add it
-                cursor.execute("SHOW COLUMNS FROM pc_units LIKE 'is_locked'")
-                if not cursor.fetchone():
-                    cursor.execute("ALTER TABLE pc_units ADD COLUMN is_locked BOOLEAN DEFAULT FALSE")
-                    print("✅ Added is_locked column to pc_units")
-                
-                # Create system settings table and set default kiosk mode
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS system_settings (
-                        setting_name VARCHAR(50) PRIMARY KEY,
-                        setting_value VARCHAR(100),
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Set default kiosk mode to enabled (for security)
-                cursor.execute("""
-                    INSERT IGNORE INTO system_settings (setting_name, setting_value) 
-                    VALUES ('kiosk_mode_enabled', 'true')
-                """)
-                print("✅ System settings table created with default kiosk mode")
-                
-                # Create default admin
-                cursor.execute("SELECT COUNT(*) FROM admins")
-                if cursor.fetchone()[0] == 0:
-                    default_password = hashlib.sha256("admin123".encode()).hexdigest()
-                    cursor.execute(
-                        "INSERT INTO admins (username, password, full_name) VALUES (%s, %s, %s)",
-                        ('admin', default_password, 'System Administrator')
-                    )
-                    print("✓ Default admin created")
-                
-                # NEW: Create default PC units
-                cursor.execute("SELECT COUNT(*) FROM pc_units")
-                if cursor.fetchone()[0] == 0:
-                    for i in range(1, 11):
-                        cursor.execute(
-                            "INSERT INTO pc_units (unit_name, status) VALUES (%s, %s)",
-                            (f'PC-{i:02d}', 'Available')
-                        )
-                    print("✓ Default PC units created")
-                
-                # Create sample cafe items (from ORIGINAL - more items)
-                cursor.execute("SELECT COUNT(*) FROM cafe_items")
-                if cursor.fetchone()[0] == 0:
-                    sample_items = [
-                        ('Espresso', 'Coffee', 45.00),
-                        ('Cappuccino', 'Coffee', 65.00),
-                        ('Latte', 'Coffee', 70.00),
-                        ('Iced Coffee', 'Coffee', 60.00),
-                        ('Americano', 'Coffee', 55.00),
-                        ('Mocha', 'Coffee', 75.00),
-                        ('Club Sandwich', 'Food', 120.00),
-                        ('Burger', 'Food', 150.00),
-                        ('Fries', 'Snack', 50.00),
-                        ('Pizza Slice', 'Food', 80.00),
-                        ('Pasta', 'Food', 130.00),
-                        ('Bottled Water', 'Drinks', 20.00),
-                        ('Soda', 'Drinks', 35.00),
-                        ('Iced Tea', 'Drinks', 40.00),
-                        ('Fruit Juice', 'Drinks', 45.00),
-                        ('Cookies', 'Snack', 35.00),
-                        ('Muffin', 'Snack', 45.00),
-                        ('Donut', 'Dessert', 40.00),
-                        ('Cake Slice', 'Dessert', 65.00),
-                        ('Ice Cream', 'Dessert', 55.00)
-                    ]
-                    cursor.executemany(
-                        "INSERT INTO cafe_items (item_name, category, price) VALUES (%s, %s, %s)",
-                        sample_items
-                    )
-                    print("✓ Sample cafe items added")
-                
-                self.db_connection.commit()
-                cursor.close()
-                print("✓ Database setup complete!")
-                
+            migrations.migrate()
         except Error as e:
             messagebox.showerror("Database Error", f"Error: {e}")
+            return
+        
+        # Apply charges a previous run journaled but could not flush
+        if self.charge_journal.pending:
+            self.db_executor.submit(self.charge_journal.flush,
+                                    on_error=lambda e: print(f"Charge journal flush error: {e}"))
 
 
         # main.py
@@ -280,6 +128,8 @@ class CafeSystemApp:
     def on_admin_panel_close(self):
         """Clean up references when the admin panel is closed."""
         if self.admin_window:
+            if self.admin_app_instance:
+                self.admin_app_instance.db_executor.shutdown()
             self.admin_window.destroy()
             self.admin_window = None
             self.admin_app_instance = None
@@ -330,13 +180,7 @@ class CafeSystemApp:
     def should_enable_kiosk_mode(self):
         """Check if kiosk mode should be enabled from database settings"""
         try:
-            if not self.db_connection or not self.db_connection.is_connected():
-                return True  # Default to enabled for security
-                
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT setting_value FROM system_settings WHERE setting_name = 'kiosk_mode_enabled'")
-            result = cursor.fetchone()
-            cursor.close()
+            result = db.fetchone("SELECT setting_value FROM system_settings WHERE setting_name = 'kiosk_mode_enabled'")
             
             if result:
                 is_enabled = result['setting_value'].lower() == 'true'
@@ -754,15 +598,11 @@ class CafeSystemApp:
             return
             
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
             hashed_pw = self.hash_password(password)
-            
-            cursor.execute(
+            admin = db.fetchone(
                 "SELECT * FROM admins WHERE username = %s AND password = %s",
                 (username, hashed_pw)
             )
-            admin = cursor.fetchone()
-            cursor.close()
             
             if admin:
                 # Valid admin - disable PC lock
@@ -952,15 +792,11 @@ class CafeSystemApp:
             return
             
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
             hashed_pw = self.hash_password(password)
-            
-            cursor.execute(
+            admin = db.fetchone(
                 "SELECT * FROM admins WHERE username = %s AND password = %s",
                 (username, hashed_pw)
             )
-            admin = cursor.fetchone()
-            cursor.close()
             
             if admin:
                 # Valid admin - emergency exit
@@ -981,7 +817,7 @@ class CafeSystemApp:
                     
                     # Log out current user if any
                     if self.current_user:
-                        self.logout()
+                        self.logout(wait=True)
                     
                     try:
                         # Force close application immediately
@@ -1006,21 +842,6 @@ class CafeSystemApp:
         except Error as e:
             messagebox.showerror("Database Error", f"Error verifying admin: {e}", parent=window)
     
-    def refresh_db_connection(self):
-        """Refresh database connection"""
-        try:
-            if self.db_connection and self.db_connection.is_connected():
-                # Consume any unread results
-                try:
-                    cursor = self.db_connection.cursor()
-                    cursor.fetchall()  # Consume any unread results
-                    cursor.close()
-                except:
-                    pass
-                self.db_connection.commit()
-        except Error:
-            self.setup_database()
-    
     def show_pc_selection(self):
         """NEW: Display PC selection screen with LOCK status"""
         self.clear_window()
@@ -1074,118 +895,131 @@ class CafeSystemApp:
                 bg=self.light_brown, fg=self.dark_brown, bd=0, cursor="hand2",
                 command=self.open_admin_panel, padx=20, pady=10).pack(side='right')
         
-        # PC Grid with ORIGINAL styling
-        pc_frame = tk.Frame(container, bg=self.bg_color)
-        pc_frame.pack(fill='both', expand=True)
-        
-        try:
-            self.refresh_db_connection()
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM pc_units ORDER BY unit_name")
-            pc_units = cursor.fetchall()
-            cursor.close()
-            
-            for i, pc in enumerate(pc_units[:10]):
-                row = i // 5
-                col = i % 5
-                
-                pc_btn_frame = tk.Frame(pc_frame, bg=self.secondary_bg, relief='flat', bd=0,
-                                    width=180, height=140)
-                pc_btn_frame.grid(row=row, column=col, padx=10, pady=10, sticky='nsew')
-                pc_btn_frame.pack_propagate(False)
-                
-                # Check if PC is locked and determine status
-                is_locked = pc.get('is_locked', False)
-                
-                # Enhanced status display with lock information
-                if is_locked:
-                    status_color = "#6c757d"  # Gray for locked
-                    status_text = "🔒 Admin Locked"
-                    btn_state = 'disabled'
-                    tooltip_text = "This PC has been locked by an administrator"
-                elif pc['status'] == 'Available':
-                    status_color = self.accent_color  # Sage green
-                    status_text = "✅ Available"
-                    btn_state = 'normal'
-                    tooltip_text = "Click to login to this PC"
-                elif pc['status'] == 'Occupied':
-                    status_color = "#FFA726"  # Orange
-                    status_text = "👤 In Use"
-                    btn_state = 'disabled'
-                    tooltip_text = "This PC is currently being used"
-                elif pc['status'] == 'Offline':
-                    status_color = "#e74c3c"  # Red
-                    status_text = "⚠️ Offline"
-                    btn_state = 'disabled'
-                    tooltip_text = "This PC is offline"
-                elif pc['status'] == 'Maintenance':
-                    status_color = "#9C27B0"  # Purple
-                    status_text = "🔧 Maintenance"
-                    btn_state = 'disabled'
-                    tooltip_text = "This PC is under maintenance"
-                else:
-                    status_color = "#e74c3c"  # Red
-                    status_text = pc['status']
-                    btn_state = 'disabled'
-                    tooltip_text = f"PC status: {pc['status']}"
-                
-                # Icon - centered
-                icon_frame = tk.Frame(pc_btn_frame, bg=self.secondary_bg)
-                icon_frame.pack(pady=(15, 5))
-                tk.Label(icon_frame, text="     🖥️", font=("Segoe UI", 40),
-                        bg=self.secondary_bg).pack()
-                
-                # PC name - centered
-                tk.Label(pc_btn_frame, text=pc['unit_name'], font=("Segoe UI", 14, "bold"),
-                        bg=self.secondary_bg, fg=self.text_color).pack()
-                
-                # Status badge - centered
-                status_badge = tk.Label(pc_btn_frame, text=status_text,
-                                    font=("Segoe UI", 9, "bold"),
-                                    bg=status_color, fg="#FFFFFF",
-                                    padx=10, pady=3)
-                status_badge.pack(pady=(5, 0))
-                
-                # Make clickable only if not locked and available
-                if btn_state == 'normal':
-                    pc_btn_frame.bind("<Button-1>", lambda e, pc_name=pc['unit_name']: self.select_pc(pc_name))
-                    pc_btn_frame.config(cursor="hand2")
-                    for child in pc_btn_frame.winfo_children():
-                        child.bind("<Button-1>", lambda e, pc_name=pc['unit_name']: self.select_pc(pc_name))
-                        child.config(cursor="hand2")
-                
-                self.pc_frames_data[pc['unit_name']] = {
-                    'frame': pc_btn_frame,
-                    'pc_data': pc
-                }
-            
-            for i in range(2):
-                pc_frame.grid_rowconfigure(i, weight=1)
-            for i in range(5):
-                pc_frame.grid_columnconfigure(i, weight=1)
-                
-        except Error as e:
-            messagebox.showerror("Database Error", f"Error loading PCs: {e}")
-        
         # Refresh button
         refresh_btn = tk.Button(container, text="↻ Refresh Status", font=("Segoe UI", 11),
                             bg=self.primary_btn, fg=self.secondary_bg, bd=0,
                             cursor="hand2", padx=20, pady=10,
                             command=self.refresh_pc_selection_with_kiosk_check)
-        refresh_btn.pack(pady=20)
+        refresh_btn.pack(side='bottom', pady=20)
         
-        # Auto-refresh
-        self.root.after(5000, self.refresh_pc_data)
+        # PC Grid with ORIGINAL styling; only the cards in view exist, so any number of PCs scrolls smoothly
+        pc_frame = station_grid.StationGrid(
+            container, self.build_pc_card, card_width=180, card_height=140, gap=10,
+            bg=self.bg_color, fg=self.text_secondary,
+            card_options={'bg': self.secondary_bg, 'relief': 'flat', 'bd': 0})
+        pc_frame.pack(fill='both', expand=True)
+        self.pc_grid = pc_frame
+        self.pc_frames_data = pc_frame.cards
         
-    def refresh_pc_data(self):
-        """NEW: Auto-refresh PC status"""
         try:
-            if hasattr(self, 'pc_frames_data') and self.pc_frames_data:
-                self.refresh_db_connection()
-                # Refresh logic here (simplified for space)
-                self.root.after(5000, self.refresh_pc_data)
-        except:
-            pass
+            pc_units = db.fetchall("SELECT * FROM pc_units ORDER BY unit_name")
+            self.pc_version = changes.latest(pc_units, 0)
+            pc_frame.set_items(pc_units)
+        except Error as e:
+            messagebox.showerror("Database Error", f"Error loading PCs: {e}")
+        
+        # Auto-refresh; clear_window cancels it when the screen goes away
+        self.pc_refresh_id = self.root.after(PC_REFRESH_INTERVAL * 1000, self.refresh_pc_data)
+        
+    def pc_card_status(self, pc):
+        """(badge color, badge text, button state) for a PC card, with lock information"""
+        if pc.get('is_locked', False):
+            return "#6c757d", "🔒 Admin Locked", 'disabled'  # Gray for locked
+        if pc['status'] == 'Available':
+            return self.accent_color, "✅ Available", 'normal'  # Sage green
+        if pc['status'] == 'Occupied':
+            return "#FFA726", "👤 In Use", 'disabled'  # Orange
+        if pc['status'] == 'Offline':
+            return "#e74c3c", "⚠️ Offline", 'disabled'  # Red
+        if pc['status'] == 'Maintenance':
+            return "#9C27B0", "🔧 Maintenance", 'disabled'  # Purple
+        return "#e74c3c", pc['status'], 'disabled'
+    
+    def build_pc_card(self, pc_btn_frame, pc):
+        """Fill an empty PC card frame for one pc_units row; returns its frame_data"""
+        status_color, status_text, btn_state = self.pc_card_status(pc)
+        
+        # Icon - centered
+        icon_frame = tk.Frame(pc_btn_frame, bg=self.secondary_bg)
+        icon_frame.pack(pady=(15, 5))
+        tk.Label(icon_frame, text="     🖥️", font=("Segoe UI", 40),
+                bg=self.secondary_bg).pack()
+        
+        # PC name - centered
+        tk.Label(pc_btn_frame, text=pc['unit_name'], font=("Segoe UI", 14, "bold"),
+                bg=self.secondary_bg, fg=self.text_color).pack()
+        
+        # Status badge - centered
+        status_badge = tk.Label(pc_btn_frame, text=status_text,
+                            font=("Segoe UI", 9, "bold"),
+                            bg=status_color, fg="#FFFFFF",
+                            padx=10, pady=3)
+        status_badge.pack(pady=(5, 0))
+        
+        frame_data = {
+            'frame': pc_btn_frame,
+            'status_badge': status_badge,
+            'pc_data': pc,
+            'clickable': False
+        }
+        self.set_pc_card_clickable(frame_data, btn_state == 'normal')
+        return frame_data
+    
+    def set_pc_card_clickable(self, frame_data, clickable):
+        """Make a card select its PC on click only if not locked and available"""
+        pc_btn_frame = frame_data['frame']
+        pc_name = frame_data['pc_data']['unit_name']
+        for widget in [pc_btn_frame] + pc_btn_frame.winfo_children():
+            if clickable:
+                widget.bind("<Button-1>", lambda e: self.select_pc(pc_name))
+            else:
+                widget.unbind("<Button-1>")
+            widget.config(cursor="hand2" if clickable else "")
+        frame_data['clickable'] = clickable
+    
+    def patch_pc_card(self, frame_data, pc):
+        """Bring one card's badge and click binding up to date with a fresh row"""
+        old_status = self.pc_card_status(frame_data['pc_data'])
+        frame_data['pc_data'] = pc
+        status_color, status_text, btn_state = self.pc_card_status(pc)
+        if (status_color, status_text, btn_state) == old_status:
+            return
+        frame_data['status_badge'].config(text=status_text, bg=status_color)
+        if (btn_state == 'normal') != frame_data['clickable']:
+            self.set_pc_card_clickable(frame_data, btn_state == 'normal')
+    
+    def refresh_pc_data(self):
+        """Poll for PCs changed since the last poll and patch only their cards"""
+        self.pc_refresh_id = None
+        grid = self.pc_grid
+        if grid is None or not grid.winfo_exists():
+            return
+        self.db_executor.submit(
+            changes.since, 'pc_units', self.pc_version, PC_CARD_COLUMNS,
+            on_success=lambda result: self.apply_pc_changes(grid, *result),
+            on_error=lambda e: self.on_pc_refresh_error(grid, e)
+        )
+    
+    def apply_pc_changes(self, grid, changed, version):
+        # The picker was left (or rebuilt) while the poll was in flight
+        if grid is not self.pc_grid or not grid.winfo_exists():
+            return
+        if changed:
+            self.pc_version = version
+            pc_units = {pc['unit_name']: pc for pc in grid.all_items}
+            for row in changed:
+                pc_units[row['unit_name']] = dict(pc_units.get(row['unit_name'], {}), **row)
+            # Cards scrolling into view are built from the merged rows; visible changed ones are patched
+            grid.set_items(sorted(pc_units.values(), key=lambda pc: pc['unit_name']))
+            for row in changed:
+                frame_data = self.pc_frames_data.get(row['unit_name'])
+                if frame_data is not None:
+                    self.patch_pc_card(frame_data, pc_units[row['unit_name']])
+        self.pc_refresh_id = self.root.after(PC_REFRESH_INTERVAL * 1000, self.refresh_pc_data)
+    
+    def on_pc_refresh_error(self, grid, e):
+        print(f"Error refreshing PC data: {e}")
+        self.apply_pc_changes(grid, [], self.pc_version)
     
     def refresh_pc_selection_with_kiosk_check(self):
         """Refresh PC selection screen and check for kiosk mode changes"""
@@ -1206,10 +1040,7 @@ class CafeSystemApp:
     def select_pc(self, pc_name):
         """Select PC and check if locked before proceeding"""
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM pc_units WHERE unit_name = %s", (pc_name,))
-            pc = cursor.fetchone()
-            cursor.close()
+            pc = db.fetchone("SELECT * FROM pc_units WHERE unit_name = %s", (pc_name,))
             
             if pc:
                 # Check if PC is locked by admin
@@ -1336,18 +1167,15 @@ class CafeSystemApp:
             return
             
         try:
-            cursor = self.db_connection.cursor(dictionary=True)
             hashed_pw = self.hash_password(password)
             
             # Check user credentials
-            cursor.execute(
+            user = db.fetchone(
                 "SELECT * FROM users WHERE username = %s AND password = %s",
                 (username.strip(), hashed_pw)
             )
-            user = cursor.fetchone()
             
             if not user:
-                cursor.close()
                 messagebox.showerror("Authentication Failed", 
                                    "Invalid username or password.\n\n"
                                    "Please check your credentials and try again.")
@@ -1355,32 +1183,28 @@ class CafeSystemApp:
             
             # Check if account is approved
             if not user['is_approved']:
-                cursor.close()
                 messagebox.showwarning("Account Pending Approval",
                                      "Your account is waiting for administrator approval.\n\n"
                                      "Please contact an administrator to activate your account.")
                 return
             
             # Check if user has sufficient balance
+            user['account_balance'] = ledger.live_balance(user['user_id'])
             if user['account_balance'] <= 0:
-                cursor.close()
                 messagebox.showwarning("Insufficient Balance",
                                      f"Your account balance is ₱{user['account_balance']:.2f}.\n\n"
                                      "Please add funds to your account before using the system.")
                 return
             
             # Double-check PC availability and lock status before assignment
-            cursor.execute("SELECT * FROM pc_units WHERE unit_name = %s", (self.selected_pc,))
-            pc_check = cursor.fetchone()
+            pc_check = db.fetchone("SELECT * FROM pc_units WHERE unit_name = %s", (self.selected_pc,))
             
             if not pc_check:
-                cursor.close()
                 messagebox.showerror("PC Error", "Selected PC not found in system")
                 self.show_pc_selection()
                 return
                 
             if pc_check.get('is_locked', False):
-                cursor.close()
                 messagebox.showwarning("PC Locked", 
                                      f"{self.selected_pc} has been locked by administrator.\n\n"
                                      "Please select another PC.")
@@ -1388,31 +1212,29 @@ class CafeSystemApp:
                 return
                 
             if pc_check['status'] != 'Available':
-                cursor.close()
                 messagebox.showwarning("PC Unavailable", 
                                      f"{self.selected_pc} is no longer available.\n\n"
                                      "Please select another PC.")
                 self.show_pc_selection()
                 return
             
-            # Assign PC to user
-            cursor.execute("""
-                UPDATE pc_units
-                SET status = 'Occupied', current_user_id = %s, session_start = NOW()
-                WHERE unit_name = %s AND status = 'Available' AND (is_locked = FALSE OR is_locked IS NULL)
-            """, (user['user_id'], self.selected_pc))
+            # Assign PC to user and open its session record
+            with db.transaction() as tx:
+                assigned = tx.execute("""
+                    UPDATE pc_units
+                    SET status = 'Occupied', current_user_id = %s, session_start = NOW(), last_charged_at = NOW()
+                    WHERE unit_name = %s AND status = 'Available' AND (is_locked = FALSE OR is_locked IS NULL)
+                """, (user['user_id'], self.selected_pc))
+                if assigned:
+                    sessions.open_session(tx, user['user_id'], self.selected_pc)
             
-            if cursor.rowcount == 0:
-                cursor.close()
+            if assigned == 0:
                 messagebox.showerror("Assignment Failed", 
                                    f"Could not assign {self.selected_pc}.\n\n"
                                    "The PC may have been locked or occupied by another user.")
                 self.show_pc_selection()
                 return
             
-            self.db_connection.commit()
-            cursor.close()
-            
             # Successful login
             self.current_user = user
             
@@ -1444,17 +1266,14 @@ class CafeSystemApp:
                 
         except Error as e:
             messagebox.showerror("Database Error", f"Login failed due to database error:\n{e}")
-            try:
-                self.db_connection.rollback()
-            except:
-                pass
     
     def show_main_interface(self):
         """Display main interface with enhanced security"""
         # Final authentication check before showing interface
-        if not self.check_authentication():
-            return
-            
+        self.check_authentication(self.build_main_interface)
+    
+    def build_main_interface(self):
+        """Build the logged-in layout once the session has been verified"""
         self.clear_window()
         
         # Top bar with security indicator
@@ -1544,8 +1363,12 @@ class CafeSystemApp:
         # NEW: Start billing system
         self.start_billing_system()
     
-    def check_authentication(self):
-        """Check if user is properly authenticated and PC is assigned"""
+    def check_authentication(self, on_valid):
+        """Check if user is properly authenticated and PC is assigned
+        
+        The PC lookup runs on the database worker; on_valid is called on the
+        Tk thread once the session is confirmed.
+        """
         if not self.current_user:
             messagebox.showerror("Authentication Required", 
                                "You must be logged in to access this feature.\n\n"
@@ -1561,47 +1384,62 @@ class CafeSystemApp:
             return False
             
         # Verify PC is still assigned to this user
-        try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT status, current_user_id, is_locked 
-                FROM pc_units 
-                WHERE unit_name = %s
-            """, (self.selected_pc,))
-            pc_status = cursor.fetchone()
-            cursor.close()
-            
-            if not pc_status:
-                messagebox.showerror("PC Error", "Your assigned PC is no longer available.")
-                self.logout()
-                return False
-                
-            if pc_status.get('is_locked', False):
-                messagebox.showwarning("PC Locked", 
-                                     f"Your PC ({self.selected_pc}) has been locked by administrator.\n\n"
-                                     "Your session will be ended.")
-                self.logout()
-                return False
-                
-            if pc_status['current_user_id'] != self.current_user['user_id']:
-                messagebox.showerror("Session Invalid", 
-                                   "Your PC session is no longer valid.\n\n"
-                                   "You will be logged out.")
-                self.logout()
-                return False
-                
-        except Error as e:
-            messagebox.showerror("Database Error", f"Error verifying session: {e}")
-            return False
-            
+        user_id = self.current_user['user_id']
+        cached = self.pc_status if self.pc_status and self.pc_status['unit_name'] == self.selected_pc else None
+        self.db_executor.submit(
+            self.fetch_pc_status, self.selected_pc, cached,
+            on_success=lambda pc_status: self.on_authentication_checked(pc_status, user_id, on_valid),
+            on_error=lambda e: messagebox.showerror("Database Error", f"Error verifying session: {e}")
+        )
         return True
     
+    def fetch_pc_status(self, pc_name, cached):
+        """Worker half of check_authentication: the PC's row, read again only if it changed
+        
+        An unchanged row costs one index lookup that returns nothing (see changes.py).
+        """
+        pc_status = prepared.fetchone("""
+            SELECT unit_name, status, current_user_id, is_locked, row_version
+            FROM pc_units
+            WHERE unit_name = %s AND row_version > %s
+        """, (pc_name, cached['row_version'] if cached else -1))
+        return pc_status or cached
+    
+    def on_authentication_checked(self, pc_status, user_id, on_valid):
+        """Finish check_authentication on the Tk thread"""
+        self.pc_status = pc_status
+        # The user logged out while the lookup was in flight
+        if not self.current_user or self.current_user['user_id'] != user_id:
+            return
+        
+        if not pc_status:
+            messagebox.showerror("PC Error", "Your assigned PC is no longer available.")
+            self.logout()
+            return
+            
+        if pc_status.get('is_locked', False):
+            messagebox.showwarning("PC Locked", 
+                                 f"Your PC ({self.selected_pc}) has been locked by administrator.\n\n"
+                                 "Your session will be ended.")
+            self.logout()
+            return
+            
+        if pc_status['current_user_id'] != self.current_user['user_id']:
+            messagebox.showerror("Session Invalid", 
+                               "Your PC session is no longer valid.\n\n"
+                               "You will be logged out.")
+            self.logout()
+            return
+        
+        on_valid()
+    
     def show_frame(self, frame_class):
         """Display selected frame with authentication check"""
         # Check authentication before showing any frame
-        if not self.check_authentication():
-            return
-            
+        self.check_authentication(lambda: self.build_frame(frame_class))
+    
+    def build_frame(self, frame_class):
+        """Swap the content area to frame_class"""
         for widget in self.content_frame.winfo_children():
             widget.destroy()
         
@@ -1610,209 +1448,235 @@ class CafeSystemApp:
     
     def start_billing_system(self):
         """NEW: Time-based billing"""
+        self.cancel_billing()
         if self.current_user and self.selected_pc:
-            self.root.after(60000, self.process_billing)
+            self.next_billing_at = time.monotonic()
+            self.schedule_next_billing()
+    
+    def schedule_next_billing(self):
+        """Queue the next billing tick on a fixed monotonic schedule
+        
+        Deadlines advance by a whole interval from the previous deadline, so
+        query time and blocking dialogs do not push later ticks back. What a
+        tick charges comes from the session's watermark, not from the timer.
+        """
+        self.next_billing_at += billing_service.BILLING_INTERVAL
+        delay = max(0, self.next_billing_at - time.monotonic())
+        if delay == 0:
+            # Fell behind (e.g. a dialog was open); one tick catches up, so restart the schedule
+            self.next_billing_at = time.monotonic()
+        # One pending tick at most, however many chains asked for one
+        self.cancel_billing()
+        self.billing_after_id = self.root.after(int(delay * 1000), self.process_billing)
+    
+    def cancel_billing(self):
+        """Drop the pending billing tick, if any"""
+        if self.billing_after_id is not None:
+            self.root.after_cancel(self.billing_after_id)
+            self.billing_after_id = None
     
     def process_billing(self):
         """Process per-minute billing with enhanced security checks"""
+        self.billing_after_id = None
         if not self.current_user or not self.selected_pc:
             return
         
-        try:
-            cursor = self.db_connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT pc.session_start, pc.is_locked, pc.status, pc.current_user_id,
-                       u.hourly_rate, u.account_balance, u.session_time_limit
-                FROM pc_units pc
-                JOIN users u ON pc.current_user_id = u.user_id
-                WHERE pc.unit_name = %s AND pc.current_user_id = %s
-            """, (self.selected_pc, self.current_user['user_id']))
-            
-            session_data = cursor.fetchone()
-            
-            if not session_data:
-                print("⚠️ Session data not found - logging out user")
-                cursor.close()
-                self.logout()
-                return
-            
-            # Check if PC has been locked by admin
-            if session_data.get('is_locked', False):
-                cursor.close()
-                messagebox.showwarning("PC Locked by Administrator", 
-                                     f"Your PC ({self.selected_pc}) has been locked by an administrator.\n\n"
-                                     "Your session will be ended immediately.")
-                self.logout()
-                return
-            
-            # Check if PC status changed
-            if session_data['status'] != 'Occupied':
-                cursor.close()
-                messagebox.showwarning("Session Interrupted", 
-                                     f"Your PC session has been interrupted.\n\n"
-                                     "You will be logged out.")
-                self.logout()
-                return
-            
-            # Check if session is still valid
-            if session_data['current_user_id'] != self.current_user['user_id']:
-                cursor.close()
-                messagebox.showerror("Session Conflict", 
-                                   "Your session has been taken over by another process.\n\n"
-                                   "You will be logged out for security reasons.")
-                self.logout()
-                return
-            
-            if session_data and session_data['session_start']:
-                from datetime import datetime
-                
-                duration = datetime.now() - session_data['session_start']
-                elapsed_minutes = int(duration.total_seconds() / 60)
-                
-                cost_per_minute = float(session_data['hourly_rate']) / 60
-                current_balance = float(session_data['account_balance'])
-                
-                # Check for insufficient balance
-                if current_balance <= 0:
-                    cursor.close()
-                    messagebox.showwarning("Session Ended - Insufficient Balance", 
-                                         "Your account balance has reached zero.\n\n"
-                                         "Please add funds to continue using the system.")
-                    self.logout()
-                    return
-                
-                # Deduct usage cost
-                new_balance = max(0, current_balance - cost_per_minute)
-                
-                cursor.execute(
-                    "UPDATE users SET account_balance = %s WHERE user_id = %s",
-                    (new_balance, self.current_user['user_id'])
-                )
-                
-                self.current_user['account_balance'] = new_balance
-                self.db_connection.commit()
-                
-                # Check time limit
-                if elapsed_minutes >= session_data['session_time_limit']:
-                    cursor.close()
-                    messagebox.showinfo("Session Time Expired", 
-                                      f"Your {session_data['session_time_limit']}-minute session has expired.\n\n"
-                                      "Thank you for using Starbroke!")
-                    self.logout()
-                    return
-                
-                # Warn user when balance is low
-                if new_balance <= 50 and new_balance > 0:  # Warn when balance is ₱50 or less
-                    remaining_minutes = int(new_balance / cost_per_minute)
-                    if remaining_minutes <= 10:  # Only show warning if less than 10 minutes left
-                        messagebox.showwarning("Low Balance Warning", 
-                                             f"Your balance is running low: ₱{new_balance:.2f}\n\n"
-                                             f"Approximately {remaining_minutes} minutes remaining.\n"
-                                             "Please add funds to avoid session interruption.")
-            
-            cursor.close()
-            # Schedule next billing cycle
-            self.root.after(60000, self.process_billing)
-            
-        except Error as e:
-            print(f"Billing error: {e}")
-            # Continue billing cycle even if there's an error
-            self.root.after(60000, self.process_billing)
+        pc_name = self.selected_pc
+        user_id = self.current_user['user_id']
+        # One call validates the session, charges it and returns what is left;
+        # the journal charges locally between flushes and while the server is unreachable
+        self.db_executor.submit(
+            self.charge_journal.tick, pc_name, user_id,
+            on_success=lambda session_data: self.on_billing_processed(session_data, pc_name, user_id),
+            on_error=self.on_billing_error
+        )
     
-    def logout(self):
-        """Secure logout with session cleanup and PC release"""
-        session_summary_shown = False
+    def on_billing_processed(self, session_data, pc_name, user_id):
+        """Apply a billing result on the Tk thread"""
+        # The user logged out while the tick was in flight
+        if (not self.current_user or self.current_user['user_id'] != user_id
+                or self.selected_pc != pc_name):
+            return
         
-        if self.current_user and self.selected_pc:
-            try:
-                cursor = self.db_connection.cursor(dictionary=True)
-                cursor.execute("""
-                    SELECT pc.session_start, u.hourly_rate, u.account_balance
-                    FROM pc_units pc
-                    JOIN users u ON pc.current_user_id = u.user_id
-                    WHERE pc.unit_name = %s AND pc.current_user_id = %s
-                """, (self.selected_pc, self.current_user['user_id']))
-                
-                session_data = cursor.fetchone()
-                
-                if session_data and session_data['session_start']:
-                    from datetime import datetime
-                    duration = datetime.now() - session_data['session_start']
-                    elapsed_minutes = int(duration.total_seconds() / 60)
-                    hourly_rate = float(session_data['hourly_rate'])
-                    total_cost = elapsed_minutes * (hourly_rate / 60)
-                    
-                    hours, minutes = divmod(elapsed_minutes, 60)
-                    
-                    # Show session summary
-                    summary_msg = f"Session Summary for {self.current_user['full_name']}\n"
-                    summary_msg += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-                    summary_msg += f"PC Used: {self.selected_pc}\n"
-                    summary_msg += f"Session Time: {hours}h {minutes}m\n"
-                    summary_msg += f"Hourly Rate: ₱{hourly_rate:.2f}/hour\n"
-                    summary_msg += f"Session Cost: ₱{total_cost:.2f}\n"
-                    summary_msg += f"Final Balance: ₱{session_data['account_balance']:.2f}\n\n"
-                    summary_msg += f"Thank you for using Starbroke!"
-                    
-                    messagebox.showinfo("Session Complete", summary_msg)
-                    session_summary_shown = True
-                
-                # Release PC and clear session
-                cursor.execute("""
-                    UPDATE pc_units
-                    SET status = 'Available', current_user_id = NULL, session_start = NULL
-                    WHERE unit_name = %s
-                """, (self.selected_pc,))
-                
-                self.db_connection.commit()
-                cursor.close()
-                
-                print(f"✓ User {self.current_user['username']} logged out from {self.selected_pc}")
-                
-            except Error as e:
-                print(f"Logout error: {e}")
-                try:
-                    # Attempt to release PC even if session data retrieval failed
-                    cursor = self.db_connection.cursor()
-                    cursor.execute("""
-                        UPDATE pc_units
-                        SET status = 'Available', current_user_id = NULL, session_start = NULL
-                        WHERE unit_name = %s
-                    """, (self.selected_pc,))
-                    self.db_connection.commit()
-                    cursor.close()
-                except:
-                    pass
+        if not session_data or session_data['current_user_id'] != user_id:
+            # The billing service releases PCs whose balance ran out
+            if session_data and float(session_data['account_balance']) <= 0:
+                messagebox.showwarning("Session Ended - Insufficient Balance", 
+                                     "Your account balance has reached zero.\n\n"
+                                     "Please add funds to continue using the system.")
+            else:
+                print("⚠️ Session data not found - logging out user")
+            self.logout()
+            return
+        
+        # Check if PC has been locked by admin
+        if session_data.get('is_locked', False):
+            messagebox.showwarning("PC Locked by Administrator", 
+                                 f"Your PC ({self.selected_pc}) has been locked by an administrator.\n\n"
+                                 "Your session will be ended immediately.")
+            self.logout()
+            return
+        
+        # Check if PC status changed
+        if session_data['status'] != 'Occupied':
+            messagebox.showwarning("Session Interrupted", 
+                                 f"Your PC session has been interrupted.\n\n"
+                                 "You will be logged out.")
+            self.logout()
+            return
+        
+        # Check if session is still valid
+        if session_data['current_user_id'] != self.current_user['user_id']:
+            messagebox.showerror("Session Conflict", 
+                               "Your session has been taken over by another process.\n\n"
+                               "You will be logged out for security reasons.")
+            self.logout()
+            return
+        
+        new_balance = float(session_data['account_balance'])
+        self.current_user['account_balance'] = new_balance
+        
+        # Check for insufficient balance
+        if new_balance <= 0:
+            messagebox.showwarning("Session Ended - Insufficient Balance", 
+                                 "Your account balance has reached zero.\n\n"
+                                 "Please add funds to continue using the system.")
+            self.logout()
+            return
+        
+        # Check time limit
+        if session_data['elapsed_minutes'] is not None and \
+                session_data['elapsed_minutes'] >= session_data['session_time_limit']:
+            messagebox.showinfo("Session Time Expired", 
+                              f"Your {session_data['session_time_limit']}-minute session has expired.\n\n"
+                              "Thank you for using Starbroke!")
+            self.logout()
+            return
+        
+        # Warn user when balance is low
+        remaining_minutes = session_data['remaining_minutes']
+        if new_balance <= 50 and remaining_minutes is not None and remaining_minutes <= 10:
+            messagebox.showwarning("Low Balance Warning", 
+                                 f"Your balance is running low: ₱{new_balance:.2f}\n\n"
+                                 f"Approximately {remaining_minutes} minutes remaining.\n"
+                                 "Please add funds to avoid session interruption.")
         
-        # Clear user session data
-        user_name = self.current_user['full_name'] if self.current_user else "User"
-        pc_name = self.selected_pc if self.selected_pc else "PC"
+        # Schedule next billing cycle
+        self.schedule_next_billing()
+    
+    def on_billing_error(self, e):
+        """Keep the billing cycle going through database errors before the first charge"""
+        print(f"Billing error: {e}")
+        self.schedule_next_billing()
+    
+    def logout(self, wait=False):
+        """Secure logout with session cleanup and PC release
+        
+        The database half (end_user_session) runs on the database worker and
+        the summary is shown when it finishes; wait=True runs it inline, for
+        when the app is about to close.
+        """
+        user, pc_name = self.current_user, self.selected_pc
         
+        # Clear user session data; billing and screen refreshes stop here
         self.current_user = None
         self.selected_pc = None
         
-        # Show logout confirmation if session summary wasn't shown
-        if not session_summary_shown:
+        self.cancel_billing()
+        if not (user and pc_name):
+            self.on_logged_out(user, pc_name, None)
+            return
+        
+        self.charge_journal.reset()
+        if wait:
+            self.on_logged_out(user, pc_name, self.end_user_session(pc_name, user['user_id']))
+            return
+        
+        self.clear_window()
+        tk.Label(self.root, text="Logging out...", font=("Segoe UI", 16),
+                bg=self.bg_color, fg=self.text_secondary).pack(expand=True)
+        self.db_executor.submit(
+            self.end_user_session, pc_name, user['user_id'],
+            on_success=lambda session_data: self.on_logged_out(user, pc_name, session_data),
+            on_error=lambda e: self.on_logged_out(user, pc_name, None)
+        )
+    
+    def end_user_session(self, pc_name, user_id):
+        """Worker half of logout: settle and close the session; returns it for the summary, or None"""
+        try:
+            self.charge_journal.flush()
+            session_id = db.run_in_transaction(self.close_session, pc_name, user_id)
+            session_data = sessions.get(session_id) if session_id is not None else None
+            
+            # Fold the session's charges into the user's stored balance
+            ledger.rollup(user_id=user_id)
+            return session_data
+            
+        except Error as e:
+            print(f"Logout error: {e}")
+            try:
+                # Attempt to release PC even if session data retrieval failed
+                with db.transaction() as tx:
+                    sessions.end_session(tx, pc_name, sessions.LOGOUT)
+            except Error:
+                pass
+            return None
+    
+    def on_logged_out(self, user, pc_name, session_data):
+        """Finish logout on the Tk thread: show the session summary and return to PC selection"""
+        if session_data:
+            elapsed = session_data['ended_at'] - session_data['started_at']
+            elapsed_minutes = int(elapsed.total_seconds() / 60)
+            hourly_rate = float(session_data['hourly_rate'])
+            total_cost = float(session_data['amount_charged'])
+            
+            hours, minutes = divmod(elapsed_minutes, 60)
+            
+            # Show session summary
+            summary_msg = f"Session Summary for {user['full_name']}\n"
+            summary_msg += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+            summary_msg += f"PC Used: {pc_name}\n"
+            summary_msg += f"Session Time: {hours}h {minutes}m\n"
+            summary_msg += f"Hourly Rate: ₱{hourly_rate:.2f}/hour\n"
+            summary_msg += f"Session Cost: ₱{total_cost:.2f}\n"
+            summary_msg += f"Final Balance: ₱{float(session_data['final_balance']):.2f}\n\n"
+            summary_msg += f"Thank you for using Starbroke!"
+            
+            messagebox.showinfo("Session Complete", summary_msg)
+        else:
+            # Show logout confirmation if session summary wasn't shown
             messagebox.showinfo("Logged Out", 
                               f"You have been successfully logged out.\n\n"
                               f"Thank you for using Starbroke!")
         
+        if user and pc_name:
+            print(f"✓ User {user['username']} logged out from {pc_name}")
+        
         # Return to PC selection screen and refresh kiosk mode from database
         self.refresh_pc_selection_with_kiosk_check()
     
+    def close_session(self, tx, pc_name, user_id):
+        """Settle the session's last partial interval and release the PC
+        
+        Runs inside logout's transaction. Returns the closed session_id for
+        the summary, or None if the PC was no longer assigned to the user.
+        """
+        return billing_service.end_session(tx, pc_name, sessions.LOGOUT, user_id)
+    
     def clear_window(self):
         """Clear all widgets from main window ONLY (don't touch Toplevel windows)"""
+        # The PC picker's poll dies with its screen
+        if self.pc_refresh_id is not None:
+            self.root.after_cancel(self.pc_refresh_id)
+            self.pc_refresh_id = None
         for widget in self.root.winfo_children():
             # Skip Toplevel windows (like admin panel)
             if not isinstance(widget, tk.Toplevel):
                 widget.destroy()
     
-    def __del__(self):
-        """Close database connection"""
-        if self.db_connection and self.db_connection.is_connected():
-            self.db_connection.close()
-
 if __name__ == "__main__":
     root = tk.Tk()
     app = CafeSystemApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.db_executor.shutdown()
+    db.close_pool()
\ No newline at end of file
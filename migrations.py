@@ -0,0 +1,730 @@
+"""
+Versioned schema migrations for the internet cafe database.
+
+The applied version is kept in a one-row `schema_version` table, so a fully
+migrated database costs a single SELECT at startup. New schema changes are
+appended to MIGRATIONS with the next version number; applied entries must
+never be edited.
+
+Run `python migrations.py` to migrate and print the current version.
+"""
+
+import hashlib
+
+from mysql.connector import Error
+
+import db
+
+MIGRATION_LOCK = 'internet_cafe_schema_migration'
+MIGRATION_LOCK_TIMEOUT = 60  # seconds a kiosk waits while another one migrates
+
+ER_NO_SUCH_TABLE = 1146
+
+DEFAULT_ZONE = 'Main'
+VERSIONED_TABLES = ('pc_units', 'orders', 'system_settings')  # tables with a row_version change feed
+
+
+def _dialect(cursor):
+    # SQLite cursors from storage.py carry their dialect; MySQL ones do not
+    return getattr(cursor, 'dialect', 'mysql')
+
+
+def _column_exists(cursor, table, column):
+    if _dialect(cursor) == 'sqlite':
+        cursor.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in cursor.fetchall())
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def _add_column(cursor, table, column, definition):
+    """Add a column that older installs created before it existed"""
+    if not _column_exists(cursor, table, column):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        print(f"✅ Added {column} column to {table}")
+
+
+def _index_exists(cursor, table, index):
+    if _dialect(cursor) == 'sqlite':
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = %s", (index,))
+        return cursor.fetchone()[0] > 0
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def _add_index(cursor, table, index, columns, unique=False):
+    if not _index_exists(cursor, table, index):
+        cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {index} ON {table} ({columns})")
+        print(f"✅ Added index {index} on {table}")
+
+
+def _create_base_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS admins (
+            admin_id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            full_name VARCHAR(100) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            full_name VARCHAR(100) NOT NULL,
+            phone_number VARCHAR(20),
+            account_balance DECIMAL(10, 2) DEFAULT 0.00,
+            session_time_limit INT DEFAULT 120,
+            hourly_rate DECIMAL(10, 2) DEFAULT 20.00,
+            is_approved BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pc_units (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            unit_name VARCHAR(20) UNIQUE NOT NULL,
+            status ENUM('Available', 'Occupied', 'Offline', 'Maintenance') DEFAULT 'Available',
+            current_user_id INT NULL,
+            session_start TIMESTAMP NULL,
+            is_locked BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (current_user_id) REFERENCES users(user_id) ON DELETE SET NULL
+        )
+    """)
+
+    # Cafe items must exist before orders references it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cafe_items (
+            item_id INT AUTO_INCREMENT PRIMARY KEY,
+            item_name VARCHAR(100) NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            image_path VARCHAR(255) DEFAULT NULL,
+            available BOOLEAN DEFAULT TRUE
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            item_id INT NULL,
+            item_name VARCHAR(100) NOT NULL,
+            quantity INT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            total_price DECIMAL(10, 2) NOT NULL,
+            order_status VARCHAR(20) DEFAULT 'Pending',
+            order_type VARCHAR(50) DEFAULT 'Deliver to PC',
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            FOREIGN KEY (item_id) REFERENCES cafe_items(item_id)
+        )
+    """)
+
+    # Union of the kiosk and admin panel definitions
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            category VARCHAR(50) DEFAULT 'General',
+            quantity INT DEFAULT 0,
+            unit_price DECIMAL(10,2) DEFAULT 0.00,
+            min_stock_level INT DEFAULT 0,
+            description TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS system_settings (
+            setting_name VARCHAR(50) PRIMARY KEY,
+            setting_value VARCHAR(100),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _backfill_legacy_columns(cursor):
+    # Databases created by older builds predate these columns
+    _add_column(cursor, 'orders', 'order_type', "VARCHAR(50) DEFAULT 'Deliver to PC'")
+    _add_column(cursor, 'pc_units', 'is_locked', "BOOLEAN DEFAULT FALSE")
+    _add_column(cursor, 'cafe_items', 'image_path', "VARCHAR(255) DEFAULT NULL")
+    _add_column(cursor, 'inventory_items', 'description', "TEXT NULL")
+    _add_column(cursor, 'inventory_items', 'updated_at',
+                "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+
+
+def _seed_defaults(cursor):
+    # Kiosk mode is enabled by default for security
+    cursor.execute("""
+        INSERT IGNORE INTO system_settings (setting_name, setting_value)
+        VALUES ('kiosk_mode_enabled', 'true')
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM admins")
+    if cursor.fetchone()[0] == 0:
+        default_password = hashlib.sha256("admin123".encode()).hexdigest()
+        cursor.execute(
+            "INSERT INTO admins (username, password, full_name) VALUES (%s, %s, %s)",
+            ('admin', default_password, 'System Administrator')
+        )
+        print("✓ Default admin created - Username: admin, Password: admin123")
+
+    cursor.execute("SELECT COUNT(*) FROM pc_units")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany(
+            "INSERT INTO pc_units (unit_name, status) VALUES (%s, %s)",
+            [(f'PC-{i:02d}', 'Available') for i in range(1, 11)]
+        )
+        print("✓ Default PC units created")
+
+    cursor.execute("SELECT COUNT(*) FROM cafe_items")
+    if cursor.fetchone()[0] == 0:
+        sample_items = [
+            ('Espresso', 'Coffee', 45.00),
+            ('Cappuccino', 'Coffee', 65.00),
+            ('Latte', 'Coffee', 70.00),
+            ('Iced Coffee', 'Coffee', 60.00),
+            ('Americano', 'Coffee', 55.00),
+            ('Mocha', 'Coffee', 75.00),
+            ('Club Sandwich', 'Food', 120.00),
+            ('Burger', 'Food', 150.00),
+            ('Fries', 'Snack', 50.00),
+            ('Pizza Slice', 'Food', 80.00),
+            ('Pasta', 'Food', 130.00),
+            ('Bottled Water', 'Drinks', 20.00),
+            ('Soda', 'Drinks', 35.00),
+            ('Iced Tea', 'Drinks', 40.00),
+            ('Fruit Juice', 'Drinks', 45.00),
+            ('Cookies', 'Snack', 35.00),
+            ('Muffin', 'Snack', 45.00),
+            ('Donut', 'Dessert', 40.00),
+            ('Cake Slice', 'Dessert', 65.00),
+            ('Ice Cream', 'Dessert', 55.00)
+        ]
+        cursor.executemany(
+            "INSERT INTO cafe_items (item_name, category, price) VALUES (%s, %s, %s)",
+            sample_items
+        )
+        print("✓ Sample cafe items added")
+
+
+def _add_report_indexes(cursor):
+    # Order Management / All Orders: filter by status, newest first
+    _add_index(cursor, 'orders', 'idx_orders_status_date', 'order_status, order_date')
+    _add_index(cursor, 'orders', 'idx_orders_date', 'order_date')
+    # My Orders, account history and the 7-day count on the home screen
+    _add_index(cursor, 'orders', 'idx_orders_user_date', 'user_id, order_date')
+    _add_index(cursor, 'orders', 'idx_orders_user_status_date', 'user_id, order_status, order_date')
+    # All Users / Pending Accounts: optional approval filter, newest first
+    _add_index(cursor, 'users', 'idx_users_approved_created', 'is_approved, created_at')
+    _add_index(cursor, 'users', 'idx_users_created', 'created_at')
+    # approve_order looks up stock by item name
+    _add_index(cursor, 'inventory_items', 'idx_inventory_name', 'name')
+    # Kiosk menu: one category of available items, sorted by name
+    _add_index(cursor, 'cafe_items', 'idx_cafe_items_category', 'category, available, item_name')
+
+
+def _create_balance_ledger(cursor):
+    # Every balance change is an appended row; users.account_balance holds the
+    # rolled-up snapshot and rows with rolled_up = FALSE are the live tail
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS balance_ledger (
+            entry_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            entry_type ENUM('topup', 'session_charge', 'cafe_order', 'adjustment') NOT NULL,
+            amount DECIMAL(10, 2) NOT NULL,
+            reference VARCHAR(64),
+            rolled_up BOOLEAN NOT NULL DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+    # Live balance: one user's unrolled tail
+    _add_index(cursor, 'balance_ledger', 'idx_ledger_user_tail', 'user_id, rolled_up, entry_id')
+    # Rollup: all unrolled rows in append order
+    _add_index(cursor, 'balance_ledger', 'idx_ledger_tail', 'rolled_up, entry_id')
+
+
+def _add_charge_watermark(cursor):
+    # Billing charges the interval since last_charged_at, so amounts carry
+    # sub-cent precision instead of rounding every minute
+    _add_column(cursor, 'pc_units', 'last_charged_at', 'TIMESTAMP NULL')
+    # Sessions running during the upgrade were charged up to now
+    cursor.execute("""
+        UPDATE pc_units SET last_charged_at = NOW()
+        WHERE status = 'Occupied' AND last_charged_at IS NULL
+    """)
+    if _dialect(cursor) == 'mysql':
+        cursor.execute("ALTER TABLE balance_ledger MODIFY amount DECIMAL(12, 4) NOT NULL")
+        cursor.execute("ALTER TABLE users MODIFY account_balance DECIMAL(12, 4) DEFAULT 0.00")
+
+
+def _create_charge_procedure(cursor):
+    # One CALL validates a session, charges it from its watermark and returns
+    # its state (see billing_service.charge_session). SQLite has no stored
+    # procedures and runs the same steps from Python instead.
+    if _dialect(cursor) != 'mysql':
+        return
+    cursor.execute("DROP PROCEDURE IF EXISTS charge_session")
+    cursor.execute("""
+        CREATE PROCEDURE charge_session(IN p_unit VARCHAR(20), IN p_user INT,
+                                        IN p_heartbeat VARCHAR(50), IN p_heartbeat_timeout INT)
+        BEGIN
+            DECLARE v_now TIMESTAMP DEFAULT NOW();
+            DECLARE v_billable BOOLEAN DEFAULT FALSE;
+            DECLARE v_due DECIMAL(12, 4) DEFAULT 0;
+            DECLARE v_balance DECIMAL(12, 4) DEFAULT 0;
+            DECLARE v_central INT DEFAULT 0;
+
+            SELECT COUNT(*) INTO v_central FROM system_settings
+            WHERE setting_name = p_heartbeat
+              AND updated_at >= DATE_SUB(v_now, INTERVAL p_heartbeat_timeout SECOND);
+
+            SELECT pc.status = 'Occupied' AND pc.current_user_id = p_user AND NOT pc.is_locked
+                       AND pc.last_charged_at IS NOT NULL,
+                   u.hourly_rate * GREATEST(TIMESTAMPDIFF(SECOND, pc.last_charged_at, v_now), 0) / 3600,
+                   u.account_balance + COALESCE((
+                       SELECT SUM(l.amount) FROM balance_ledger l
+                       WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+                   ), 0)
+              INTO v_billable, v_due, v_balance
+              FROM pc_units pc
+              JOIN users u ON u.user_id = p_user
+             WHERE pc.unit_name = p_unit
+               FOR UPDATE;
+
+            IF v_billable AND v_central = 0 THEN
+                SET v_due = LEAST(v_due, GREATEST(v_balance, 0));
+                IF v_due > 0 THEN
+                    INSERT INTO balance_ledger (user_id, entry_type, amount, reference)
+                    VALUES (p_user, 'session_charge', -v_due, p_unit);
+                END IF;
+                UPDATE pc_units SET last_charged_at = v_now WHERE unit_name = p_unit;
+            ELSE
+                SET v_due = 0;
+            END IF;
+
+            SELECT pc.session_start, pc.is_locked, pc.status, pc.current_user_id,
+                   u.hourly_rate, u.session_time_limit, v_central AS central_billing,
+                   v_balance - v_due AS account_balance, v_due AS charged,
+                   TIMESTAMPDIFF(MINUTE, pc.session_start, v_now) AS elapsed_minutes
+              FROM pc_units pc
+              JOIN users u ON u.user_id = p_user
+             WHERE pc.unit_name = p_unit;
+        END
+    """)
+
+
+def _create_sessions(cursor):
+    # One row per PC session: opened at login, charged by billing and closed
+    # when the PC is released (see sessions.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            unit_name VARCHAR(20) NOT NULL,
+            hourly_rate DECIMAL(10, 2) NOT NULL,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_billed_at TIMESTAMP NULL,
+            ended_at TIMESTAMP NULL,
+            end_reason ENUM('logout', 'force_logout', 'expired', 'no_balance') NULL,
+            amount_charged DECIMAL(12, 4) NOT NULL DEFAULT 0,
+            final_balance DECIMAL(12, 4) NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+    _add_index(cursor, 'sessions', 'idx_sessions_user_started', 'user_id, started_at')
+    _add_index(cursor, 'sessions', 'idx_sessions_started', 'started_at')
+    _add_column(cursor, 'pc_units', 'current_session_id', 'INT NULL')
+    _add_column(cursor, 'balance_ledger', 'session_id', 'INT NULL')
+
+    # Sessions running during the upgrade get an open row from their start
+    cursor.execute("""
+        INSERT INTO sessions (user_id, unit_name, hourly_rate, started_at, last_billed_at)
+        SELECT pc.current_user_id, pc.unit_name, u.hourly_rate, pc.session_start, pc.last_charged_at
+        FROM pc_units pc
+        JOIN users u ON pc.current_user_id = u.user_id
+        WHERE pc.status = 'Occupied' AND pc.session_start IS NOT NULL AND pc.current_session_id IS NULL
+    """)
+    cursor.execute("""
+        UPDATE pc_units SET current_session_id = (
+            SELECT MAX(s.session_id) FROM sessions s
+            WHERE s.unit_name = pc_units.unit_name AND s.ended_at IS NULL
+        )
+        WHERE status = 'Occupied' AND current_session_id IS NULL
+    """)
+
+    if _dialect(cursor) != 'mysql':
+        return
+    # charge_session now also adds each charge to the open session
+    cursor.execute("DROP PROCEDURE IF EXISTS charge_session")
+    cursor.execute("""
+        CREATE PROCEDURE charge_session(IN p_unit VARCHAR(20), IN p_user INT,
+                                        IN p_heartbeat VARCHAR(50), IN p_heartbeat_timeout INT)
+        BEGIN
+            DECLARE v_now TIMESTAMP DEFAULT NOW();
+            DECLARE v_billable BOOLEAN DEFAULT FALSE;
+            DECLARE v_due DECIMAL(12, 4) DEFAULT 0;
+            DECLARE v_balance DECIMAL(12, 4) DEFAULT 0;
+            DECLARE v_central INT DEFAULT 0;
+            DECLARE v_session INT DEFAULT NULL;
+
+            SELECT COUNT(*) INTO v_central FROM system_settings
+            WHERE setting_name = p_heartbeat
+              AND updated_at >= DATE_SUB(v_now, INTERVAL p_heartbeat_timeout SECOND);
+
+            SELECT pc.status = 'Occupied' AND pc.current_user_id = p_user AND NOT pc.is_locked
+                       AND pc.last_charged_at IS NOT NULL,
+                   u.hourly_rate * GREATEST(TIMESTAMPDIFF(SECOND, pc.last_charged_at, v_now), 0) / 3600,
+                   u.account_balance + COALESCE((
+                       SELECT SUM(l.amount) FROM balance_ledger l
+                       WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+                   ), 0),
+                   pc.current_session_id
+              INTO v_billable, v_due, v_balance, v_session
+              FROM pc_units pc
+              JOIN users u ON u.user_id = p_user
+             WHERE pc.unit_name = p_unit
+               FOR UPDATE;
+
+            IF v_billable AND v_central = 0 THEN
+                SET v_due = LEAST(v_due, GREATEST(v_balance, 0));
+                IF v_due > 0 THEN
+                    INSERT INTO balance_ledger (user_id, entry_type, amount, reference, session_id)
+                    VALUES (p_user, 'session_charge', -v_due, p_unit, v_session);
+                END IF;
+                UPDATE pc_units SET last_charged_at = v_now WHERE unit_name = p_unit;
+                UPDATE sessions SET amount_charged = amount_charged + v_due, last_billed_at = v_now
+                 WHERE session_id = v_session;
+            ELSE
+                SET v_due = 0;
+            END IF;
+
+            SELECT pc.session_start, pc.is_locked, pc.status, pc.current_user_id, pc.current_session_id,
+                   u.hourly_rate, u.session_time_limit, v_central AS central_billing,
+                   v_balance - v_due AS account_balance, v_due AS charged,
+                   TIMESTAMPDIFF(MINUTE, pc.session_start, v_now) AS elapsed_minutes
+              FROM pc_units pc
+              JOIN users u ON u.user_id = p_user
+             WHERE pc.unit_name = p_unit;
+        END
+    """)
+
+
+def _create_tariffs(cursor):
+    # Pricing rules compiled by tariff.py. With no periods and only the
+    # zero-surcharge standard tier, sessions cost users.hourly_rate as before.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tariff_periods (
+            period_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(50) NOT NULL,
+            days VARCHAR(7) NOT NULL DEFAULT '1111111',
+            start_minute INT NOT NULL,
+            end_minute INT NOT NULL,
+            rate_multiplier DECIMAL(6, 3) NOT NULL DEFAULT 1.000,
+            package_rate DECIMAL(10, 2) NULL,
+            priority INT NOT NULL DEFAULT 0,
+            is_active BOOLEAN DEFAULT TRUE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pc_tiers (
+            tier VARCHAR(20) PRIMARY KEY,
+            surcharge_per_hour DECIMAL(10, 2) NOT NULL DEFAULT 0.00
+        )
+    """)
+    cursor.execute("INSERT IGNORE INTO pc_tiers (tier, surcharge_per_hour) VALUES ('standard', 0.00)")
+    _add_column(cursor, 'pc_units', 'tier', "VARCHAR(20) NOT NULL DEFAULT 'standard'")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_bundles (
+            bundle_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(50) NOT NULL,
+            seconds_total INT NOT NULL,
+            seconds_used INT NOT NULL DEFAULT 0,
+            window_start INT NULL,
+            window_end INT NULL,
+            expires_at TIMESTAMP NULL,
+            purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+    _add_index(cursor, 'user_bundles', 'idx_bundles_user', 'user_id, expires_at')
+    if _dialect(cursor) == 'mysql':
+        cursor.execute("""
+            ALTER TABLE balance_ledger MODIFY entry_type
+            ENUM('topup', 'session_charge', 'cafe_order', 'adjustment', 'bundle_purchase') NOT NULL
+        """)
+
+
+def _add_idempotency_keys(cursor):
+    # Charges flushed from a kiosk's local journal (journal.py) carry a key,
+    # so a batch replayed after a lost acknowledgement is recognised
+    _add_column(cursor, 'balance_ledger', 'idempotency_key', "VARCHAR(64) NULL")
+    _add_index(cursor, 'balance_ledger', 'idx_ledger_idempotency', 'idempotency_key', unique=True)
+
+
+def _add_session_charge_index(cursor):
+    # Per-session charge totals for the reconciliation job (reconcile.py)
+    _add_index(cursor, 'balance_ledger', 'idx_ledger_session', 'session_id, entry_type, amount')
+
+
+def _add_station_zones(cursor):
+    # Floor zones for filtering the station grids (station_grid.py)
+    _add_column(cursor, 'pc_units', 'zone', f"VARCHAR(30) NOT NULL DEFAULT '{DEFAULT_ZONE}'")
+
+
+def _add_row_versions(cursor):
+    # Every insert or update stamps the row with the next value of its
+    # table's counter, so pollers can ask for rows changed since a version
+    # (see changes.py). The counter row stays locked until the writer
+    # commits, so versions become visible in order.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS row_versions (
+            table_name VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    for table in VERSIONED_TABLES:
+        _add_column(cursor, table, 'row_version', "BIGINT NOT NULL DEFAULT 0")
+        _add_index(cursor, table, f'idx_{table}_row_version', 'row_version')
+        cursor.execute("INSERT IGNORE INTO row_versions (table_name, version) VALUES (%s, 0)", (table,))
+        for event in ('INSERT', 'UPDATE'):
+            _create_row_version_trigger(cursor, table, event)
+
+
+def _create_row_version_trigger(cursor, table, event, unless=None):
+    """(Re)create the trigger stamping `table`'s rows on `event`; `unless` (OLD/NEW SQL) skips the stamp"""
+    trigger = f"{table}_row_version_{event.lower()}"
+    cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    if _dialect(cursor) == 'sqlite':
+        # SQLite cannot assign NEW, so stamp the row after the write
+        when = f"WHEN NOT ({unless.replace('<=>', 'IS')})" if unless else ""
+        cursor.execute(f"""
+            CREATE TRIGGER {trigger} AFTER {event} ON {table} FOR EACH ROW {when}
+            BEGIN
+                UPDATE row_versions SET version = version + 1 WHERE table_name = '{table}';
+                UPDATE {table} SET row_version = (
+                    SELECT version FROM row_versions WHERE table_name = '{table}'
+                ) WHERE rowid = NEW.rowid;
+            END
+        """)
+    else:
+        stamp = f"""
+            UPDATE row_versions SET version = version + 1 WHERE table_name = '{table}';
+            SET NEW.row_version = (SELECT version FROM row_versions WHERE table_name = '{table}');
+        """
+        if unless:
+            stamp = f"IF NOT ({unless}) THEN {stamp} END IF;"
+        cursor.execute(f"""
+            CREATE TRIGGER {trigger} BEFORE {event} ON {table} FOR EACH ROW
+            BEGIN
+                {stamp}
+            END
+        """)
+
+
+# Columns a pc_units poller cares about; an update that changes none of
+# them (billing moving last_charged_at) keeps the row's version
+PC_VERSIONED_COLUMNS = ('unit_name', 'status', 'is_locked', 'tier', 'zone',
+                        'current_user_id', 'current_session_id', 'session_start')
+
+
+def _skip_watermark_versions(cursor):
+    # Billing moves last_charged_at on every occupied PC every tick, which
+    # stamped each of them and queued every tick behind the pc_units
+    # counter row. Only changes to the polled columns take a version now.
+    unchanged = " AND ".join(f"NEW.{column} <=> OLD.{column}" for column in PC_VERSIONED_COLUMNS)
+    _create_row_version_trigger(cursor, 'pc_units', 'UPDATE', unless=unchanged)
+
+
+def _index_pc_current_user(cursor):
+    # Deleting a user sets pc_units.current_user_id to NULL (ON DELETE SET NULL),
+    # which scanned every PC; the session-end and logout lookups filter on it too
+    _add_index(cursor, 'pc_units', 'idx_pc_units_current_user', 'current_user_id')
+
+
+def _defer_tariff_charges(cursor):
+    if _dialect(cursor) != 'mysql':
+        return
+    # Kiosks call charge_session only while their cached tariff says the PC
+    # is flat, so a bundle sold, a tier changed or a period added on another
+    # station was charged at the flat rate until the cache expired. The
+    # procedure now leaves those sessions to billing_service (needs_tariff).
+    cursor.execute("DROP PROCEDURE IF EXISTS charge_session")
+    cursor.execute("""
+        CREATE PROCEDURE charge_session(IN p_unit VARCHAR(20), IN p_user INT,
+                                        IN p_heartbeat VARCHAR(50), IN p_heartbeat_timeout INT)
+        BEGIN
+            DECLARE v_now TIMESTAMP DEFAULT NOW();
+            DECLARE v_billable BOOLEAN DEFAULT FALSE;
+            DECLARE v_due DECIMAL(12, 4) DEFAULT 0;
+            DECLARE v_balance DECIMAL(12, 4) DEFAULT 0;
+            DECLARE v_central INT DEFAULT 0;
+            DECLARE v_session INT DEFAULT NULL;
+            DECLARE v_needs_tariff BOOLEAN DEFAULT FALSE;
+
+            SELECT COUNT(*) INTO v_central FROM system_settings
+            WHERE setting_name = p_heartbeat
+              AND updated_at >= DATE_SUB(v_now, INTERVAL p_heartbeat_timeout SECOND);
+
+            SELECT pc.status = 'Occupied' AND pc.current_user_id = p_user AND NOT pc.is_locked
+                       AND pc.last_charged_at IS NOT NULL,
+                   u.hourly_rate * GREATEST(TIMESTAMPDIFF(SECOND, pc.last_charged_at, v_now), 0) / 3600,
+                   u.account_balance + COALESCE((
+                       SELECT SUM(l.amount) FROM balance_ledger l
+                       WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+                   ), 0),
+                   pc.current_session_id,
+                   EXISTS (SELECT 1 FROM user_bundles b
+                           WHERE b.user_id = p_user AND b.seconds_used < b.seconds_total
+                             AND (b.expires_at IS NULL OR b.expires_at > v_now))
+                   OR EXISTS (SELECT 1 FROM pc_tiers t WHERE t.tier = pc.tier AND t.surcharge_per_hour > 0)
+                   OR EXISTS (SELECT 1 FROM tariff_periods p WHERE p.is_active = TRUE)
+              INTO v_billable, v_due, v_balance, v_session, v_needs_tariff
+              FROM pc_units pc
+              JOIN users u ON u.user_id = p_user
+             WHERE pc.unit_name = p_unit
+               FOR UPDATE;
+
+            IF v_billable AND v_central = 0 AND NOT v_needs_tariff THEN
+                SET v_due = LEAST(v_due, GREATEST(v_balance, 0));
+                IF v_due > 0 THEN
+                    INSERT INTO balance_ledger (user_id, entry_type, amount, reference, session_id)
+                    VALUES (p_user, 'session_charge', -v_due, p_unit, v_session);
+                END IF;
+                UPDATE pc_units SET last_charged_at = v_now WHERE unit_name = p_unit;
+                UPDATE sessions SET amount_charged = amount_charged + v_due, last_billed_at = v_now
+                 WHERE session_id = v_session;
+            ELSE
+                SET v_due = 0;
+            END IF;
+
+            SELECT pc.session_start, pc.is_locked, pc.status, pc.current_user_id, pc.current_session_id,
+                   u.hourly_rate, u.session_time_limit, v_central AS central_billing,
+                   v_balance - v_due AS account_balance, v_due AS charged,
+                   TIMESTAMPDIFF(MINUTE, pc.session_start, v_now) AS elapsed_minutes,
+                   v_billable AND v_central = 0 AND v_needs_tariff AS needs_tariff
+              FROM pc_units pc
+              JOIN users u ON u.user_id = p_user
+             WHERE pc.unit_name = p_unit;
+        END
+    """)
+
+
+# (version, description, step) - append only, never edit an applied entry
+MIGRATIONS = [
+    (1, "Base tables", _create_base_tables),
+    (2, "Backfill columns added after the first release", _backfill_legacy_columns),
+    (3, "Default admin, PC units, menu and kiosk setting", _seed_defaults),
+    (4, "Indexes for order, user, inventory and menu screens", _add_report_indexes),
+    (5, "Balance ledger", _create_balance_ledger),
+    (6, "Billing watermark and sub-cent charge precision", _add_charge_watermark),
+    (7, "charge_session stored procedure", _create_charge_procedure),
+    (8, "Session history", _create_sessions),
+    (9, "Tariff periods, PC tiers and prepaid bundles", _create_tariffs),
+    (10, "Idempotency keys for journaled charges", _add_idempotency_keys),
+    (11, "Index session charges", _add_session_charge_index),
+    (12, "Station zones", _add_station_zones),
+    (13, "Row versions for change polling", _add_row_versions),
+    (14, "No row versions for billing watermark updates", _skip_watermark_versions),
+    (15, "Index PCs by current user", _index_pc_current_user),
+    (16, "charge_session leaves bundle and tariff sessions to Python", _defer_tariff_charges),
+]
+
+
+def latest_version():
+    """Highest version defined in MIGRATIONS"""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(cursor):
+    """Version recorded in schema_version, or None if the table is missing"""
+    try:
+        cursor.execute("SELECT version FROM schema_version")
+    except Error as e:
+        if e.errno == ER_NO_SUCH_TABLE:
+            return None
+        raise
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            id TINYINT PRIMARY KEY DEFAULT 1,
+            version INT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("INSERT IGNORE INTO schema_version (id, version) VALUES (1, 0)")
+
+
+def _apply_pending(conn, cursor):
+    _ensure_version_table(cursor)
+    conn.commit()
+
+    # Another station may have finished while we waited for the lock
+    version = current_version(cursor)
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+        print(f"🔧 Applying migration {number}: {description}")
+        step(cursor)
+        cursor.execute("UPDATE schema_version SET version = %s WHERE id = 1", (number,))
+        conn.commit()
+        version = number
+    return version
+
+
+def migrate(conn=None):
+    """Apply any pending migrations and return the resulting schema version"""
+    if conn is None:
+        with db.connection() as pooled:
+            return migrate(pooled)
+
+    cursor = conn.cursor(buffered=True)
+    try:
+        version = current_version(cursor)
+        if version is not None and version >= latest_version():
+            return version
+
+        # SQLite serializes writers itself and has no named locks
+        if _dialect(cursor) == 'sqlite':
+            return _apply_pending(conn, cursor)
+
+        # Serialize migrations so a floor of kiosks booting together
+        # does not run the same DDL concurrently
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if not cursor.fetchone()[0]:
+            raise Error(msg="Timed out waiting for another station to finish migrating")
+        try:
+            return _apply_pending(conn, cursor)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    try:
+        print(f"✓ Database schema at version {migrate()} (latest {latest_version()})")
+    except Error as e:
+        print(f"❌ Migration failed: {e}")
+    finally:
+        db.close_pool()
@@ -0,0 +1,79 @@
+"""
+PC overview for the admin panel.
+
+One query returns every PC with its current user, the user's live balance
+and the database clock. Elapsed time, remaining time and the projected
+expiry are derived from each row in Python (expiry.expiry_of, so the
+projection follows the tariff and the balance as well as the time limit),
+and the status summary is counted from the same rows, so the overview of a
+floor of any size costs one round trip. Polls after the first load fetch
+only the PCs changed since then.
+"""
+
+from collections import Counter
+import os
+import time
+
+import billing_service
+import db
+import expiry
+
+DEFAULT_PC_COUNT = int(os.environ.get('CAFE_PC_COUNT', 10))  # stations seeded into an empty pc_units
+
+_OVERVIEW_SELECT = """
+    SELECT pc.id, pc.unit_name, pc.status, pc.is_locked, pc.tier, pc.zone, pc.row_version,
+           pc.current_user_id, pc.current_session_id, pc.session_start, pc.last_charged_at,
+           u.username, u.full_name, u.session_time_limit, u.hourly_rate,
+           u.account_balance + COALESCE((
+               SELECT SUM(l.amount) FROM balance_ledger l
+               WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+           ), 0) AS account_balance,
+           NOW() AS db_now
+    FROM pc_units pc
+    LEFT JOIN users u ON pc.current_user_id = u.user_id
+"""
+OVERVIEW_QUERY = _OVERVIEW_SELECT + "ORDER BY pc.unit_name"
+# Polls: only the PCs whose row changed since a version (see changes.py)
+CHANGES_QUERY = _OVERVIEW_SELECT + "WHERE pc.row_version > %s ORDER BY pc.row_version"
+
+
+def default_pc_units(count=None):
+    """(unit_name, status) rows for an empty floor: PC-01.. (zero-padded so they sort in order)"""
+    count = count or DEFAULT_PC_COUNT
+    width = max(2, len(str(count)))
+    return [(f'PC-{i:0{width}d}', 'Available') for i in range(1, count + 1)]
+
+
+def load(since=None):
+    """Every PC with its session and the database time, in unit_name order (see annotate)
+
+    With `since`, only the PCs changed after that row_version, oldest change
+    first. Each row's read_at is the time.monotonic() instant of its db_now.
+    """
+    if since is None:
+        pcs = db.fetchall(OVERVIEW_QUERY)
+    else:
+        pcs = db.fetchall(CHANGES_QUERY, (since,))
+    read_at = time.monotonic()
+    for pc in pcs:
+        pc['db_now'] = billing_service.to_datetime(pc['db_now'])
+        pc['read_at'] = read_at
+        annotate(pc, pc['db_now'])
+    return pcs
+
+
+def annotate(pc, now):
+    """Add elapsed_minutes, remaining_minutes and expires_at to an occupied PC's row (None otherwise)"""
+    pc['elapsed_minutes'] = pc['remaining_minutes'] = pc['expires_at'] = None
+    if pc['status'] != 'Occupied' or pc['username'] is None or pc['session_start'] is None:
+        return pc
+    pc['elapsed_minutes'] = int((now - pc['session_start']).total_seconds() // 60)
+    pc['expires_at'] = expiry.expiry_of(pc)
+    pc['remaining_minutes'] = max(0, int((pc['expires_at'] - now).total_seconds() // 60))
+    return pc
+
+
+def status_counts(pcs):
+    """[{'status', 'count'}] per status, like a GROUP BY status over the same rows"""
+    counts = Counter(pc['status'] for pc in pcs)
+    return [{'status': status, 'count': count} for status, count in sorted(counts.items())]
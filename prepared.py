@@ -0,0 +1,137 @@
+"""
+Server-side prepared statements for the kiosk's per-minute hot queries.
+
+Billing, the session check and the home screen refresh run the same few
+parameterized statements every 30-60 seconds on every station. Going
+through prepared.fetchall/fetchone/execute instead of the db helpers
+parses each statement once per pooled connection (COM_STMT_PREPARE) and
+afterwards only ships the parameters in the binary protocol.
+
+Handles belong to a connection, so each pooled connection carries its own
+cache of prepared cursors, keyed by SQL text. A connection that reconnected
+in place (new server connection id) or reports an unknown statement handle
+drops its cache and prepares again. On SQLite the same calls run through
+ordinary cursors, which sqlite3 already caches per connection.
+
+Callers keep their SQL inline (so query_audit.py still sees it); only pass
+constant statements here, never SQL built per call.
+"""
+
+from collections import OrderedDict
+
+from mysql.connector import Error
+
+import db
+
+MAX_STATEMENTS_PER_CONNECTION = 32  # least recently used handles are closed beyond this
+ER_UNKNOWN_STMT_HANDLER = 1243
+
+
+class StatementCache:
+    """Prepared cursors of one connection, keyed by SQL text"""
+
+    def __init__(self, conn, max_size=MAX_STATEMENTS_PER_CONNECTION):
+        self.conn = conn
+        self.max_size = max_size
+        self.connection_id = getattr(conn, 'connection_id', None)
+        self.prepares = 0
+        self._cursors = OrderedDict()  # sql -> (sql, cursor)
+
+    def cursor(self, sql):
+        """The prepared cursor for sql, plus the exact string object it was prepared with
+
+        mysql.connector only reuses a prepared statement when it is executed
+        again with the identical string object, so callers must pass that one.
+        """
+        entry = self._cursors.get(sql)
+        if entry is not None:
+            self._cursors.move_to_end(sql)
+            return entry
+        entry = (sql, self.conn.cursor(prepared=True))
+        self._cursors[sql] = entry
+        self.prepares += 1
+        while len(self._cursors) > self.max_size:
+            _, (_, old) = self._cursors.popitem(last=False)
+            self._close_quietly(old)
+        return entry
+
+    def is_stale(self):
+        """True when the connection reconnected and its handles are gone"""
+        return getattr(self.conn, 'connection_id', None) != self.connection_id
+
+    def clear(self):
+        for _, cursor in self._cursors.values():
+            self._close_quietly(cursor)
+        self._cursors.clear()
+        self.connection_id = getattr(self.conn, 'connection_id', None)
+
+    def __len__(self):
+        return len(self._cursors)
+
+    @staticmethod
+    def _close_quietly(cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+def statement_cache(conn):
+    """The StatementCache living on a pooled connection, created on first use"""
+    cache = getattr(conn, '_statement_cache', None)
+    if cache is None:
+        cache = StatementCache(conn)
+        conn._statement_cache = cache
+    elif cache.is_stale():
+        cache.clear()
+    return cache
+
+
+def run(conn, sql, params=(), fetch=True):
+    """Execute sql as a prepared statement on conn
+
+    Returns (column_names, rows) when fetch is set, else the affected row count.
+    """
+    cache = statement_cache(conn)
+    for attempt in (1, 2):
+        key, cursor = cache.cursor(sql)
+        try:
+            cursor.execute(key, tuple(params))
+            if fetch:
+                return cursor.column_names, cursor.fetchall()
+            return cursor.rowcount
+        except Error as e:
+            # The cursor's state is unknown after a failure; start clean
+            cache.clear()
+            if e.errno != ER_UNKNOWN_STMT_HANDLER or attempt == 2:
+                raise
+
+
+def fetchall(sql, params=(), dictionary=True):
+    """Prepared counterpart of db.fetchall (joins the thread's transaction)"""
+    tx = db.current_transaction()
+    if tx is not None:
+        columns, rows = run(tx.conn, sql, params)
+    else:
+        with db.connection() as conn:
+            columns, rows = run(conn, sql, params)
+    if dictionary:
+        return [dict(zip(columns, row)) for row in rows]
+    return [tuple(row) for row in rows]
+
+
+def fetchone(sql, params=(), dictionary=True):
+    """Prepared counterpart of db.fetchone"""
+    rows = fetchall(sql, params, dictionary)
+    return rows[0] if rows else None
+
+
+def execute(sql, params=()):
+    """Prepared counterpart of db.execute: commits unless inside db.transaction()"""
+    tx = db.current_transaction()
+    if tx is not None:
+        return run(tx.conn, sql, params, fetch=False)
+    with db.connection() as conn:
+        rowcount = run(conn, sql, params, fetch=False)
+        conn.commit()
+        return rowcount
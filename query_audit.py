@@ -0,0 +1,198 @@
+"""
+Query plan audit: run EXPLAIN on every SQL statement in the codebase and
+flag full table scans, filesorts and temporary tables. Works against either
+storage backend (EXPLAIN on MySQL, EXPLAIN QUERY PLAN on SQLite).
+
+Statements are collected from string literals in every application module
+(each non-test .py file next to this one), so new modules and queries are
+picked up without registering them anywhere. f-strings and + concatenations
+are resolved when their parts are module-level string constants, such as
+expiry.SCHEDULE_COLUMNS or ledger.LIVE_BALANCE; queries built from runtime
+values are skipped. Parameters (%s) are filled with sample values.
+
+Usage:
+    python query_audit.py                 # audit against the configured database
+    python query_audit.py --min-rows 1000 # ignore scans of small tables
+    python query_audit.py --fail          # exit non-zero if anything is flagged
+    CAFE_DB_BACKEND=sqlite CAFE_DB_PATH=:memory: python query_audit.py
+"""
+
+import argparse
+import ast
+import os
+import re
+import sys
+
+from mysql.connector import Error
+
+import db
+import migrations
+
+SQL_START = re.compile(r'^\s*(SELECT\s.*\bFROM\s|UPDATE\s+\w+\s+SET\s|DELETE\s+FROM\s'
+                       r'|INSERT\s+INTO\s.*\bSELECT\s)', re.IGNORECASE | re.DOTALL)
+NUMERIC_PARAM = re.compile(r'\b(LIMIT|OFFSET|INTERVAL)\s+%s', re.IGNORECASE)
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def source_files():
+    """Every application module: the .py files next to this one, tests excluded"""
+    return sorted(name for name in os.listdir(BASE_DIR)
+                  if name.endswith('.py') and not name.startswith('test_'))
+
+
+def _string_value(node, constants, module):
+    """The text of a string expression built from literals and known constants, or None"""
+    if isinstance(node, ast.Constant):
+        return node.value if isinstance(node.value, str) else None
+    if isinstance(node, ast.Name):
+        return constants.get((module, node.id))
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        return constants.get((node.value.id, node.attr))
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left = _string_value(node.left, constants, module)
+        right = _string_value(node.right, constants, module)
+        return left + right if left is not None and right is not None else None
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                if value.format_spec is not None or value.conversion != -1:
+                    return None
+                value = value.value
+            part = _string_value(value, constants, module)
+            if part is None:
+                return None
+            parts.append(part)
+        return "".join(parts)
+    return None
+
+
+def collect_statements(paths=None):
+    """Return (file, line, sql) for every SQL string in the given modules (default: all of them)"""
+    trees = {}
+    for name in paths or source_files():
+        with open(os.path.join(BASE_DIR, name), 'r', encoding='utf-8') as f:
+            trees[name] = ast.parse(f.read(), filename=name)
+
+    # Module-level string constants, (module, name) -> text; a later one may use an earlier one
+    constants = {}
+    for name, tree in trees.items():
+        module = name[:-3]
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                text = _string_value(node.value, constants, module)
+                if text is not None:
+                    constants[(module, node.targets[0].id)] = text
+
+    statements = []
+    for name, tree in trees.items():
+        pending = [tree]
+        while pending:
+            node = pending.pop()
+            sql = _string_value(node, constants, name[:-3]) if isinstance(
+                node, (ast.Constant, ast.BinOp, ast.JoinedStr)) else None
+            if sql is not None and SQL_START.match(sql):
+                statements.append((name, node.lineno, sql))
+                continue   # the pieces of a collected query are not queries of their own
+            if isinstance(node, ast.JoinedStr):
+                continue   # built from runtime values; its fragments are not statements
+            pending.extend(ast.iter_child_nodes(node))
+    return sorted(statements, key=lambda statement: statement[:2])
+
+
+def bind_sample_params(sql):
+    """Replace %s placeholders with literals EXPLAIN can plan against"""
+    sql = NUMERIC_PARAM.sub(lambda m: f"{m.group(1)} 1", sql)
+    # Quoted literals keep index use on both string and numeric columns
+    return sql.replace('%s', "'1'")
+
+
+def explain(cursor, sql):
+    if db.dialect() == 'sqlite':
+        cursor.execute("EXPLAIN QUERY PLAN " + bind_sample_params(sql))
+    else:
+        cursor.execute("EXPLAIN " + bind_sample_params(sql))
+    return cursor.fetchall()
+
+
+def plan_problems(plan, min_rows=0):
+    """Describe the costly steps in an EXPLAIN result"""
+    problems = []
+    for step in plan:
+        if 'detail' in step:
+            # SQLite plans have no row estimates, so min_rows does not apply
+            detail = step['detail']
+            if detail.startswith('SCAN') and 'INDEX' not in detail:
+                problems.append(f"full scan of {detail.split()[1]}")
+            if 'TEMP B-TREE FOR ORDER BY' in detail:
+                problems.append("filesort (temp b-tree for ORDER BY)")
+            elif 'TEMP B-TREE' in detail:
+                problems.append(f"temporary table ({detail.lower()})")
+            continue
+
+        table = step.get('table') or '?'
+        rows = step.get('rows') or 0
+        extra = step.get('Extra') or ''
+        if step.get('type') == 'ALL' and rows >= min_rows:
+            problems.append(f"full scan of {table} (~{rows} rows)")
+        if 'Using filesort' in extra and rows >= min_rows:
+            problems.append(f"filesort on {table}")
+        if 'Using temporary' in extra:
+            problems.append(f"temporary table for {table}")
+    return problems
+
+
+def audit(min_rows=0, paths=None):
+    """EXPLAIN every collected statement; returns (flagged, failed) lists"""
+    flagged, failed = [], []
+    migrations.migrate()
+    with db.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            for name, line, sql in collect_statements(paths):
+                summary = " ".join(sql.split())[:90]
+                try:
+                    problems = plan_problems(explain(cursor, sql), min_rows)
+                except Error as e:
+                    failed.append((name, line, summary, str(e)))
+                    continue
+                if problems:
+                    flagged.append((name, line, summary, problems))
+        finally:
+            cursor.close()
+    return flagged, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN every SQL statement and flag full scans")
+    parser.add_argument('--min-rows', type=int, default=0,
+                        help="only flag scans/filesorts estimated at this many rows or more")
+    parser.add_argument('--fail', action='store_true', help="exit with status 1 if anything is flagged")
+    args = parser.parse_args(argv)
+
+    try:
+        flagged, failed = audit(args.min_rows)
+    except Error as e:
+        print(f"❌ Database error: {e}")
+        return 2
+    finally:
+        db.close_pool()
+
+    total = len(collect_statements())
+    for name, line, summary, problems in flagged:
+        print(f"⚠️ {name}:{line}  {summary}")
+        for problem in problems:
+            print(f"      - {problem}")
+    for name, line, summary, error in failed:
+        print(f"❌ {name}:{line}  could not EXPLAIN: {error}")
+
+    print("=" * 50)
+    print(f"Audited {total} statements: {len(flagged)} flagged, {len(failed)} could not be explained")
+
+    return 1 if args.fail and flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
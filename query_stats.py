@@ -0,0 +1,316 @@
+"""
+Per-statement query latency instrumentation.
+
+Every pooled connection hands out InstrumentedCursor objects, which time
+each statement (execute plus fetch) and record it under a normalized
+statement template together with the rows returned and the application
+function that issued it. Stats are kept as fixed-bucket latency histograms,
+so recording is O(1) and p50/p95/p99 can be read at any time.
+
+Snapshots are appended as JSON lines to a rotating file under logs/ and are
+shown on the admin panel's hidden diagnostics screen (Ctrl+Shift+D).
+Set CAFE_QUERY_STATS=0 to turn instrumentation off.
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+ENABLED = os.environ.get('CAFE_QUERY_STATS', '1') != '0'
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'query_stats.log')
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 5
+DUMP_INTERVAL = 300  # seconds between automatic snapshots to the log file
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+# Frames from these files are plumbing, not the code that issued the query
+_INFRASTRUCTURE = {'db.py', 'prepared.py', 'query_stats.py', 'storage.py'}
+_LIBRARY_DIRS = tuple({sysconfig.get_paths()[key] for key in ('stdlib', 'platstdlib', 'purelib', 'platlib')})
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.I)
+_templates = {}
+
+
+def statement_template(sql):
+    """Collapse a statement to a template so equivalent queries share stats"""
+    template = _templates.get(sql)
+    if template is None:
+        template = " ".join(sql.split())
+        template = _LITERALS.sub('?', template)
+        template = _IN_LIST.sub('IN (...)', template)
+        if len(_templates) < 5000:
+            _templates[sql] = template
+    return template
+
+
+_caller_hint = threading.local()
+
+
+def set_caller_hint(caller):
+    """Name to report for queries on this thread that have no application frame
+
+    The DB executor sets this to the function that submitted the job, since
+    a worker running db.fetchall directly has nothing but plumbing on its stack.
+    """
+    _caller_hint.value = caller
+
+
+def find_caller(skip=2):
+    """Name the application function ('module.function') that issued a query"""
+    frame = sys._getframe(skip)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if os.path.basename(path) not in _INFRASTRUCTURE and not path.startswith(_LIBRARY_DIRS):
+            return f"{os.path.splitext(os.path.basename(path))[0]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return getattr(_caller_hint, 'value', None) or '?'
+
+
+class StatementStats:
+    """Running totals and latency histogram for one statement template"""
+
+    __slots__ = ('template', 'count', 'errors', 'total_ms', 'max_ms', 'rows', 'buckets', 'callers')
+
+    def __init__(self, template):
+        self.template = template
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.callers = Counter()
+
+    def add(self, elapsed_ms, rows, caller, failed):
+        self.count += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.callers[caller] += 1
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def percentile(self, fraction):
+        """Upper bound of the histogram bucket holding the given fraction"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, hits in zip(BUCKETS_MS, self.buckets):
+            seen += hits
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            'statement': self.template,
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+            'avg_rows': round(self.rows / self.count, 2) if self.count else 0.0,
+            'callers': dict(self.callers.most_common(5)),
+        }
+
+
+class QueryStats:
+    """Thread-safe registry of StatementStats keyed by template"""
+
+    def __init__(self, log_file=LOG_FILE, dump_interval=DUMP_INTERVAL):
+        self.log_file = log_file
+        self.dump_interval = dump_interval
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._last_dump = time.monotonic()
+        self._logger = None
+
+    def record(self, sql, elapsed_ms, rows=0, caller='?', failed=False):
+        template = statement_template(sql)
+        with self._lock:
+            stats = self._stats.get(template)
+            if stats is None:
+                stats = self._stats[template] = StatementStats(template)
+            stats.add(elapsed_ms, rows, caller, failed)
+            due = self.dump_interval and time.monotonic() - self._last_dump >= self.dump_interval
+        if due:
+            self.dump()
+
+    def snapshot(self):
+        """Per-template stats, slowest total time first"""
+        with self._lock:
+            rows = [stats.as_dict() for stats in self._stats.values()]
+        return sorted(rows, key=lambda r: r['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._started = time.time()
+
+    def dump(self, extra=None):
+        """Append the current snapshot to the rotating log file"""
+        with self._lock:
+            self._last_dump = time.monotonic()
+        record = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._started)),
+            'statements': self.snapshot(),
+        }
+        if extra:
+            record.update(extra)
+        try:
+            self._get_logger().info(json.dumps(record, default=str))
+        except OSError as e:
+            print(f"⚠️ Could not write query stats: {e}")
+        return self.log_file
+
+    def _get_logger(self):
+        if self._logger is None:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            logger = logging.getLogger(f'cafe.query_stats.{id(self)}')
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(self.log_file, maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUPS, encoding='utf-8')
+            logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+
+stats = QueryStats()
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times each statement from execute through its fetches"""
+
+    def __init__(self, cursor, registry):
+        self._cursor = cursor
+        self._registry = registry
+        self._pending = None  # [sql, caller, elapsed_ms, rows, failed]
+
+    def execute(self, query, params=None, *args, **kwargs):
+        self._finish()
+        caller = find_caller()
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = self._cursor.execute(query, params, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._pending = [query, caller, (time.perf_counter() - start) * 1000, 0, failed]
+
+    def executemany(self, query, seq_params, *args, **kwargs):
+        self._finish()
+        caller = find_caller()
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = self._cursor.executemany(query, seq_params, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            self._pending = [query, caller, (time.perf_counter() - start) * 1000, 0, failed]
+
+    def callproc(self, procname, args=()):
+        self._finish()
+        caller = find_caller()
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = self._cursor.callproc(procname, args)
+            failed = False
+            return result
+        finally:
+            self._pending = [f"CALL {procname}", caller, (time.perf_counter() - start) * 1000, 0, failed]
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._add_fetch(start, 1 if row is not None else 0)
+        return row
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._add_fetch(start, len(rows))
+        return rows
+
+    def fetchmany(self, size=1):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._add_fetch(start, len(rows))
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _add_fetch(self, start, rows):
+        if self._pending is not None:
+            self._pending[2] += (time.perf_counter() - start) * 1000
+            self._pending[3] += rows
+
+    def _finish(self):
+        if self._pending is None:
+            return
+        query, caller, elapsed_ms, rows, failed = self._pending
+        self._pending = None
+        if not rows:
+            # Writes report affected rows instead of fetched ones
+            try:
+                rows = max(self._cursor.rowcount or 0, 0)
+            except Exception:
+                rows = 0
+        self._registry.record(query, elapsed_ms, rows, caller, failed)
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are InstrumentedCursor objects"""
+
+    def __init__(self, conn, registry=None):
+        self._conn = conn
+        self._registry = registry or stats
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._registry)
+
+    @property
+    def raw(self):
+        """The wrapped driver connection"""
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument(conn):
+    """Wrap a driver connection if instrumentation is enabled"""
+    return InstrumentedConnection(conn) if ENABLED else conn
@@ -0,0 +1,189 @@
+"""
+End-of-day billing reconciliation.
+
+Checks what billing charged each session against what the session should
+have cost. The period's sessions are loaded with their ledger charge totals
+in one query. Then every session's expected charge is priced in one
+vectorized pass through the tariff (tariff.price_batch: member rate,
+time-of-day periods and tier surcharges). A session is priced from its
+start to its end, or to its last charge while it is still open. Sessions
+whose charge is off by more than rounding go into a CSV discrepancy report,
+each with a reason:
+
+    ledger_mismatch     sessions.amount_charged disagrees with its ledger rows
+    balance_exhausted   undercharged because the balance ran out
+    bundle              undercharged while the user held prepaid bundle time
+    undercharged        anything else charged too little
+    overcharged         anything else charged too much
+
+Expected prices use the current tariff rules, the PC's current tier and the
+member rate recorded when the session opened. A rate or rule change during
+the period therefore shows up in the report too.
+
+Usage:
+    python reconcile.py                                   # today
+    python reconcile.py --date 2024-05-01 --days 365 --output year.csv
+"""
+
+import argparse
+import csv
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import billing_service
+import db
+import sessions
+import tariff
+
+# ₱, plus CHARGE_PRECISION for every separately rounded charge and a second of
+# billing, since the final charge and ended_at read NOW() in separate statements
+TOLERANCE = 0.01
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+LOAD_COLUMNS = ['session_id', 'user_id', 'unit_name', 'tier', 'hourly_rate', 'started_at', 'ended_at',
+                'last_billed_at', 'end_reason', 'final_balance', 'amount_charged', 'ledger_total', 'charges']
+REPORT_COLUMNS = ['session_id', 'user_id', 'unit_name', 'started_at', 'ended_at', 'end_reason', 'minutes',
+                  'hourly_rate', 'tier', 'expected', 'charged', 'ledger_total', 'difference', 'reason']
+
+
+def load(start, end):
+    """Sessions started in [start, end) with their ledger charges, as a dict of column arrays"""
+    rows = db.report_fetchall("""
+        SELECT s.session_id, s.user_id, s.unit_name, COALESCE(pc.tier, 'standard') AS tier, s.hourly_rate,
+               s.started_at, s.ended_at, s.last_billed_at, s.end_reason, s.final_balance, s.amount_charged,
+               COALESCE(c.ledger_total, 0) AS ledger_total, COALESCE(c.charges, 0) AS charges
+        FROM sessions s
+        LEFT JOIN pc_units pc ON pc.unit_name = s.unit_name
+        LEFT JOIN (
+            SELECT l.session_id, -SUM(l.amount) AS ledger_total, COUNT(*) AS charges
+            FROM balance_ledger l
+            JOIN sessions ls ON ls.session_id = l.session_id
+            WHERE l.entry_type = 'session_charge' AND ls.started_at >= %s AND ls.started_at < %s
+            GROUP BY l.session_id
+        ) c ON c.session_id = s.session_id
+        WHERE s.started_at >= %s AND s.started_at < %s
+        ORDER BY s.session_id
+    """, (start, end, start, end), dictionary=False)
+
+    columns = dict(zip(LOAD_COLUMNS, zip(*rows))) if rows else dict.fromkeys(LOAD_COLUMNS, ())
+    data = dict(columns)
+    for name in ('hourly_rate', 'amount_charged', 'ledger_total'):
+        data[name] = np.fromiter(map(float, columns[name]), float, count=len(rows))
+    data['charges'] = np.fromiter(columns['charges'], np.int64, count=len(rows))
+    data['started_at'] = _datetimes(columns['started_at'])
+    # Open sessions are billed up to their watermark
+    data['until'] = _datetimes([ended_at or last_billed_at or started_at for ended_at, last_billed_at, started_at
+                                in zip(columns['ended_at'], columns['last_billed_at'], columns['started_at'])])
+    return data
+
+
+def _datetimes(values):
+    # Epoch arithmetic is several times faster than numpy's per-object datetime conversion
+    micros = ((billing_service.to_datetime(value) - _EPOCH) // _MICROSECOND for value in values)
+    return np.fromiter(micros, np.int64, count=len(values)).astype('datetime64[us]')
+
+
+def reconcile(start, end, rates=None):
+    """Compare charged and expected amounts for sessions started in [start, end)
+
+    Returns (summary dict, discrepancy rows as dicts in REPORT_COLUMNS order).
+    """
+    data = load(start, end)
+    rates = rates or tariff.current()
+    expected = rates.price_batch(data['hourly_rate'], data['tier'], data['started_at'], data['until'])
+    charged = data['amount_charged']
+    difference = charged - expected
+    tolerance = TOLERANCE + data['charges'] * float(billing_service.CHARGE_PRECISION) + data['hourly_rate'] / 3600
+
+    ledger_mismatch = np.abs(charged - data['ledger_total']) > tolerance
+    flagged = np.flatnonzero(ledger_mismatch | (np.abs(difference) > tolerance))
+
+    bundles = _bundle_windows([data['user_id'][i] for i in flagged]) if len(flagged) else {}
+    minutes = (data['until'] - data['started_at']) / np.timedelta64(60, 's')
+    discrepancies = []
+    for i in flagged:
+        if ledger_mismatch[i]:
+            reason = 'ledger_mismatch'
+        elif difference[i] > 0:
+            reason = 'overcharged'
+        elif data['end_reason'][i] == sessions.NO_BALANCE and float(data['final_balance'][i] or 0) <= TOLERANCE:
+            reason = 'balance_exhausted'
+        elif any(bought < data['until'][i] and (expires is None or expires > data['started_at'][i])
+                 for bought, expires in bundles.get(data['user_id'][i], ())):
+            reason = 'bundle'
+        else:
+            reason = 'undercharged'
+        discrepancies.append({
+            'session_id': data['session_id'][i], 'user_id': data['user_id'][i], 'unit_name': data['unit_name'][i],
+            'started_at': data['started_at'][i].astype(datetime), 'ended_at': data['ended_at'][i],
+            'end_reason': data['end_reason'][i], 'minutes': round(float(minutes[i]), 2),
+            'hourly_rate': data['hourly_rate'][i], 'tier': data['tier'][i],
+            'expected': round(float(expected[i]), 4), 'charged': round(float(charged[i]), 4),
+            'ledger_total': round(float(data['ledger_total'][i]), 4),
+            'difference': round(float(difference[i]), 4), 'reason': reason,
+        })
+
+    summary = {
+        'sessions': len(charged),
+        'charged': float(charged.sum()),
+        'expected': float(expected.sum()),
+        'discrepancies': len(discrepancies),
+    }
+    return summary, discrepancies
+
+
+def _bundle_windows(user_ids):
+    """(purchased_at, expires_at) of every bundle held by the given users, keyed by user_id"""
+    user_ids = sorted(set(user_ids))
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    windows = {}
+    for row in db.report_fetchall(f"""
+        SELECT user_id, purchased_at, expires_at FROM user_bundles WHERE user_id IN ({placeholders})
+    """, user_ids):
+        expires = np.datetime64(row['expires_at'], 'us') if row['expires_at'] else None
+        windows.setdefault(row['user_id'], []).append((np.datetime64(row['purchased_at'], 'us'), expires))
+    return windows
+
+
+def write_report(path, discrepancies):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(discrepancies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--date', type=date.fromisoformat, default=date.today(),
+                        help="last day to reconcile, YYYY-MM-DD (default: today)")
+    parser.add_argument('--days', type=int, default=1, help="number of days ending at --date (default: 1)")
+    parser.add_argument('--output', help="report path (default: reconciliation_<date>.csv)")
+    args = parser.parse_args()
+
+    end = datetime.combine(args.date + timedelta(days=1), datetime.min.time())
+    start = end - timedelta(days=args.days)
+    output = args.output or f"reconciliation_{args.date.isoformat()}.csv"
+    try:
+        began = time.perf_counter()
+        summary, discrepancies = reconcile(start, end)
+        write_report(output, discrepancies)
+        elapsed = time.perf_counter() - began
+    finally:
+        db.close_pool()
+
+    print(f"Reconciled {summary['sessions']} sessions started {start:%Y-%m-%d} to {end - timedelta(days=1):%Y-%m-%d} "
+          f"in {elapsed:.2f}s")
+    print(f"Charged ₱{summary['charged']:.2f}, expected ₱{summary['expected']:.2f}, "
+          f"difference ₱{summary['charged'] - summary['expected']:+.2f}")
+    by_reason = {}
+    for row in discrepancies:
+        by_reason[row['reason']] = by_reason.get(row['reason'], 0) + 1
+    print(f"{summary['discrepancies']} discrepancies written to {output}"
+          + (": " + ", ".join(f"{count} {reason}" for reason, count in sorted(by_reason.items())) if by_reason else ""))
+
+
+if __name__ == "__main__":
+    main()
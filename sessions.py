@@ -0,0 +1,143 @@
+"""
+Session history.
+
+Every PC session has a row in `sessions`: it is opened when a user takes a
+PC, its amount_charged grows as billing charges it, and it is closed when
+the PC is released - by logout, a force logout from the admin panel or
+expiry. A closed row keeps what the session cost and the balance it ended
+with, so the logout summary is one primary-key read and usage reports read
+this table instead of reconstructing sessions from pc_units.
+
+pc_units.current_session_id points at the open session of an occupied PC,
+and session charges in balance_ledger carry their session_id.
+
+Run `python sessions.py` for usage per PC over the last day, or
+`python sessions.py --user USER_ID` for a user's recent sessions.
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+import db
+
+LOGOUT = 'logout'
+FORCE_LOGOUT = 'force_logout'
+EXPIRED = 'expired'
+NO_BALANCE = 'no_balance'
+
+
+def open_session(tx, user_id, pc_name):
+    """Start a session for a PC just assigned to the user; returns its session_id"""
+    session_id = tx.insert("""
+        INSERT INTO sessions (user_id, unit_name, hourly_rate, started_at, last_billed_at)
+        SELECT user_id, %s, hourly_rate, NOW(), NOW() FROM users WHERE user_id = %s
+    """, (pc_name, user_id))
+    tx.execute("UPDATE pc_units SET current_session_id = %s WHERE unit_name = %s",
+               (session_id, pc_name))
+    return session_id
+
+
+def end_session(tx, pc_name, reason, user_id=None):
+    """Close the PC's open session and release the PC
+
+    With user_id, only a PC still assigned to that user is touched. Returns
+    the closed session_id, or None if the PC had no open session.
+    """
+    if user_id is None:
+        pc = tx.fetchone("""
+            SELECT current_session_id FROM pc_units WHERE unit_name = %s FOR UPDATE
+        """, (pc_name,))
+    else:
+        pc = tx.fetchone("""
+            SELECT current_session_id FROM pc_units
+            WHERE unit_name = %s AND current_user_id = %s
+            FOR UPDATE
+        """, (pc_name, user_id))
+        if pc is None:
+            return None
+
+    session_id = pc['current_session_id'] if pc else None
+    if session_id is not None:
+        close_sessions(tx, [(reason, session_id)])
+    tx.execute("""
+        UPDATE pc_units
+        SET status = 'Available', current_user_id = NULL, session_start = NULL, current_session_id = NULL
+        WHERE unit_name = %s
+    """, (pc_name,))
+    return session_id
+
+
+def close_sessions(tx, reasons):
+    """Close (reason, session_id) sessions, recording each user's live balance
+
+    Releasing the PCs is left to the caller.
+    """
+    reasons = list(reasons)
+    if not reasons:
+        return
+    tx.executemany("""
+        UPDATE sessions
+        SET ended_at = NOW(), end_reason = %s,
+            final_balance = (
+                SELECT u.account_balance + COALESCE((
+                           SELECT SUM(l.amount) FROM balance_ledger l
+                           WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+                       ), 0)
+                FROM users u WHERE u.user_id = sessions.user_id
+            )
+        WHERE session_id = %s AND ended_at IS NULL
+    """, reasons)
+
+
+def get(session_id):
+    """One session by primary key"""
+    return db.fetchone("""
+        SELECT session_id, user_id, unit_name, hourly_rate, started_at, last_billed_at, ended_at,
+               end_reason, amount_charged, final_balance
+        FROM sessions
+        WHERE session_id = %s
+    """, (session_id,))
+
+
+def user_sessions(user_id, limit=20):
+    """A user's most recent sessions, newest first"""
+    return db.report_fetchall("""
+        SELECT session_id, unit_name, started_at, ended_at, end_reason, amount_charged
+        FROM sessions
+        WHERE user_id = %s
+        ORDER BY started_at DESC
+        LIMIT %s
+    """, (user_id, limit))
+
+
+def usage_by_pc(since):
+    """Sessions, minutes used and revenue per PC for sessions started since `since`"""
+    return db.report_fetchall("""
+        SELECT unit_name, COUNT(*) AS sessions,
+               SUM(CASE WHEN ended_at IS NULL THEN TIMESTAMPDIFF(MINUTE, started_at, NOW())
+                        ELSE TIMESTAMPDIFF(MINUTE, started_at, ended_at) END) AS minutes,
+               SUM(amount_charged) AS revenue
+        FROM sessions
+        WHERE started_at >= %s
+        GROUP BY unit_name
+        ORDER BY unit_name
+    """, (since,))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PC session history and usage")
+    parser.add_argument('--user', type=int, metavar='USER_ID', help="print a user's recent sessions")
+    parser.add_argument('--days', type=int, default=1, help="usage report period (default: 1 day)")
+    args = parser.parse_args()
+    try:
+        if args.user is not None:
+            for s in user_sessions(args.user):
+                print(f"{s['started_at']}  {s['unit_name']:<8} {s['end_reason'] or 'active':<13} "
+                      f"₱{float(s['amount_charged']):.2f}")
+        else:
+            since = datetime.now() - timedelta(days=args.days)
+            for row in usage_by_pc(since):
+                print(f"{row['unit_name']:<8} {row['sessions']:>4} sessions  {row['minutes'] or 0:>6} min  "
+                      f"₱{float(row['revenue'] or 0):.2f}")
+    finally:
+        db.close_pool()
@@ -0,0 +1,335 @@
+"""
+Billing simulator: N virtual stations on a compressed clock.
+
+Each simulated minute every station does what a kiosk does in a minute of
+real use - its billing tick (billing_service.charge_session) and two home
+screen refreshes - and at random logs in, logs out, orders from the cafe,
+gets topped up by an admin or is force-logged-out. With --service the
+central billing service ticks once per simulated minute as well and the
+kiosks only read.
+
+The clock is compressed by moving every open session's session_start and
+last_charged_at (and sessions.started_at) back 60 seconds per simulated
+minute instead of waiting, so the billing code charges real watermark
+intervals. At the end every station logs out and the report shows:
+
+    statements (DB round trips, excluding COMMIT) per simulated minute
+    kiosk and service tick latency percentiles
+    billing error: charged vs. the tariff price of each session's length
+    expiry lag: how long sessions ran past their time limit
+
+Usage:
+    python simulate.py --stations 100 --minutes 30
+    python simulate.py --stations 1000 --minutes 10 --service
+    CAFE_DB_BACKEND=sqlite CAFE_DB_PATH=:memory: python simulate.py
+
+Run it against a scratch database: it creates sim-NNNN users and SIM-NNNN
+PCs and removes them afterwards.
+"""
+
+import argparse
+import hashlib
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import billing_service
+import db
+import ledger
+import migrations
+import prepared
+import query_stats
+import sessions
+import tariff
+from main import CafeSystemApp
+
+PASSWORD = 'simulate'
+START_BALANCE = 1000
+SESSION_TIME_LIMIT = 120    # minutes
+
+# Per station, per simulated minute
+LOGIN_CHANCE = 0.5          # a free station gets a customer
+LOGOUT_CHANCE = 0.01
+FORCE_LOGOUT_CHANCE = 0.002
+ORDER_CHANCE = 0.03
+TOPUP_CHANCE = 0.02
+
+
+class Station:
+    def __init__(self, pc_name, user_id):
+        self.pc_name = pc_name
+        self.user_id = user_id      # the station's regular customer
+        self.occupied = False
+
+
+class Simulation:
+    def __init__(self, station_count, service=False, seed=1):
+        self.service = service
+        self.random = random.Random(seed)
+        self.stations = []
+        self.station_count = station_count
+        self.kiosk_ticks_ms = []
+        self.service_ticks_ms = []
+        self.events = dict.fromkeys(('logins', 'logouts', 'expired', 'force_logouts', 'orders', 'topups'), 0)
+        self.own_statements = 0     # issued by the simulator itself, not the application
+
+    # -- setup ----------------------------------------------------------
+
+    def setup(self):
+        password = hashlib.sha256(PASSWORD.encode()).hexdigest()
+        names = [(f'sim-{i:04d}', f'SIM-{i:04d}') for i in range(1, self.station_count + 1)]
+        with db.transaction() as tx:
+            tx.executemany("""
+                INSERT INTO users (username, password, full_name, account_balance, session_time_limit, is_approved)
+                VALUES (%s, %s, %s, %s, %s, TRUE)
+            """, [(username, password, username, START_BALANCE, SESSION_TIME_LIMIT) for username, _ in names])
+            tx.executemany("INSERT INTO pc_units (unit_name, status) VALUES (%s, 'Available')",
+                           [(pc_name,) for _, pc_name in names])
+            users = {row['username']: row['user_id']
+                     for row in tx.fetchall("SELECT user_id, username FROM users WHERE username LIKE 'sim-%'")}
+        self.stations = [Station(pc_name, users[username]) for username, pc_name in names]
+        tariff.invalidate()
+
+    def teardown(self):
+        with db.transaction() as tx:
+            tx.execute("DELETE FROM pc_units WHERE unit_name LIKE 'SIM-%'")
+            tx.execute("DELETE FROM orders WHERE user_id IN (SELECT user_id FROM users WHERE username LIKE 'sim-%')")
+            tx.execute("DELETE FROM users WHERE username LIKE 'sim-%'")
+            if self.service:
+                tx.execute("DELETE FROM system_settings WHERE setting_name = %s",
+                           (billing_service.HEARTBEAT_SETTING,))
+
+    # -- clock ----------------------------------------------------------
+
+    def advance_clock(self, seconds=60):
+        """Age every open simulated session by `seconds`"""
+        if db.dialect() == 'mysql':
+            shift = f"DATE_SUB({{0}}, INTERVAL {seconds} SECOND)"
+        else:
+            shift = f"datetime({{0}}, '-{seconds} seconds')"
+        with db.transaction() as tx:
+            tx.execute(f"""
+                UPDATE pc_units
+                SET session_start = {shift.format('session_start')},
+                    last_charged_at = {shift.format('last_charged_at')}
+                WHERE unit_name LIKE 'SIM-%' AND status = 'Occupied'
+            """)
+            tx.execute(f"""
+                UPDATE sessions SET started_at = {shift.format('started_at')}
+                WHERE unit_name LIKE 'SIM-%' AND ended_at IS NULL
+            """)
+        self.own_statements += 2
+
+    # -- station behaviour ----------------------------------------------
+
+    def login(self, station):
+        """The statements CafeSystemApp.login issues"""
+        password = hashlib.sha256(PASSWORD.encode()).hexdigest()
+        user = db.fetchone("SELECT * FROM users WHERE username = %s AND password = %s",
+                           (f'sim-{station.pc_name[4:]}', password))
+        if ledger.live_balance(user['user_id']) <= 0:
+            return
+        pc = db.fetchone("SELECT * FROM pc_units WHERE unit_name = %s", (station.pc_name,))
+        if pc['status'] != 'Available' or pc['is_locked']:
+            return
+        with db.transaction() as tx:
+            assigned = tx.execute("""
+                UPDATE pc_units
+                SET status = 'Occupied', current_user_id = %s, session_start = NOW(), last_charged_at = NOW()
+                WHERE unit_name = %s AND status = 'Available' AND (is_locked = FALSE OR is_locked IS NULL)
+            """, (user['user_id'], station.pc_name))
+            if assigned:
+                sessions.open_session(tx, user['user_id'], station.pc_name)
+        station.occupied = bool(assigned)
+        self.events['logins'] += station.occupied
+
+    def logout(self, station):
+        """The statements CafeSystemApp.logout issues"""
+        session_id = db.run_in_transaction(
+            lambda tx: CafeSystemApp.close_session(None, tx, station.pc_name, station.user_id))
+        if session_id is not None:
+            sessions.get(session_id)
+        ledger.rollup(user_id=station.user_id)
+        station.occupied = False
+
+    def billing_tick(self, station):
+        """process_billing plus what on_billing_processed decides"""
+        start = time.perf_counter()
+        session = billing_service.charge_session(station.pc_name, station.user_id)
+        self.kiosk_ticks_ms.append((time.perf_counter() - start) * 1000)
+
+        if not session or session['current_user_id'] != station.user_id or session['status'] != 'Occupied':
+            station.occupied = False  # released by an admin or the billing service
+            return
+        expired = (session['elapsed_minutes'] is not None
+                   and session['elapsed_minutes'] >= session['session_time_limit'])
+        if float(session['account_balance']) <= 0 or expired:
+            self.events['expired'] += 1
+            self.logout(station)
+
+    def home_refresh(self, station):
+        """HomeFrame.refresh_session_info"""
+        prepared.fetchone("""
+            SELECT u.account_balance + COALESCE((
+                       SELECT SUM(l.amount) FROM balance_ledger l
+                       WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+                   ), 0) AS account_balance
+            FROM users u
+            WHERE u.user_id = %s
+        """, (station.user_id,))
+        prepared.fetchone("""
+            SELECT pc.session_start, u.session_time_limit
+            FROM pc_units pc
+            JOIN users u ON pc.current_user_id = u.user_id
+            WHERE pc.unit_name = %s AND pc.current_user_id = %s
+        """, (station.pc_name, station.user_id))
+
+    def order(self, station):
+        """CafeFrame.confirm_order with a one-item cart"""
+        with db.transaction() as tx:
+            tx.executemany("""
+                INSERT INTO orders (user_id, item_name, quantity, price, total_price, order_status, order_type)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, [(station.user_id, 'Iced Coffee', 1, 45, 45, 'Pending', 'Deliver to PC')])
+        self.events['orders'] += 1
+
+    def topup(self, station):
+        """AdminApp.add_user_balance"""
+        ledger.record(station.user_id, ledger.TOPUP, 50, reference='admin')
+        ledger.rollup(user_id=station.user_id)
+        self.events['topups'] += 1
+
+    def force_logout(self, station):
+        """AdminApp.end_pc_session; the kiosk notices on its next billing tick"""
+        with db.transaction() as tx:
+            billing_service.end_session(tx, station.pc_name, sessions.FORCE_LOGOUT)
+        self.events['force_logouts'] += 1
+
+    def station_minute(self, station):
+        if not station.occupied:
+            if self.random.random() < LOGIN_CHANCE:
+                self.login(station)
+            return
+
+        self.billing_tick(station)
+        if not station.occupied:
+            return
+        for _ in range(2):  # HomeFrame refreshes every 30 seconds
+            self.home_refresh(station)
+
+        roll = self.random.random()
+        if roll < ORDER_CHANCE:
+            self.order(station)
+        elif roll < ORDER_CHANCE + TOPUP_CHANCE:
+            self.topup(station)
+        elif roll < ORDER_CHANCE + TOPUP_CHANCE + FORCE_LOGOUT_CHANCE:
+            self.force_logout(station)
+        elif roll < ORDER_CHANCE + TOPUP_CHANCE + FORCE_LOGOUT_CHANCE + LOGOUT_CHANCE:
+            self.events['logouts'] += 1
+            self.logout(station)
+
+    def minute(self):
+        self.advance_clock()
+        if self.service:
+            start = time.perf_counter()
+            db.run_in_transaction(billing_service.tick)
+            self.service_ticks_ms.append((time.perf_counter() - start) * 1000)
+        for station in self.stations:
+            self.station_minute(station)
+
+    # -- run and report -------------------------------------------------
+
+    def run(self, minutes):
+        before = statement_count()
+        start = time.perf_counter()
+        for _ in range(minutes):
+            self.minute()
+        wall = time.perf_counter() - start
+        statements = statement_count()
+        if statements is not None:
+            statements -= before + self.own_statements
+
+        for station in self.stations:
+            if station.occupied:
+                self.logout(station)
+        return wall, statements
+
+    def billing_error(self):
+        """(charged, ideal, sessions, worst overrun past the time limit) for the simulated sessions"""
+        rates = tariff.current()
+        rows = db.fetchall("""
+            SELECT s.unit_name, s.started_at, s.ended_at, s.amount_charged, u.hourly_rate, u.session_time_limit,
+                   pc.tier
+            FROM sessions s
+            JOIN users u ON s.user_id = u.user_id
+            JOIN pc_units pc ON pc.unit_name = s.unit_name
+            WHERE s.unit_name LIKE 'SIM-%' AND s.ended_at IS NOT NULL
+        """)
+        if not rows:
+            return Decimal(0), Decimal(0), 0, timedelta(0)
+        ideal = rates.price_batch([row['hourly_rate'] for row in rows], [row['tier'] for row in rows],
+                                  [row['started_at'] for row in rows], [row['ended_at'] for row in rows])
+        charged = sum(Decimal(str(row['amount_charged'])) for row in rows)
+        overrun = max(row['ended_at'] - row['started_at'] - timedelta(minutes=row['session_time_limit'])
+                      for row in rows)
+        return charged, Decimal(str(round(float(ideal.sum()), 4))), len(rows), max(overrun, timedelta(0))
+
+
+def statement_count():
+    """Statements recorded by query_stats so far, or None if instrumentation is off"""
+    if not query_stats.ENABLED:
+        return None
+    return sum(row['count'] for row in query_stats.stats.snapshot())
+
+
+def percentiles(samples):
+    if not samples:
+        return "n/a"
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return (f"p50 {pick(0.50):.2f} ms  p95 {pick(0.95):.2f} ms  p99 {pick(0.99):.2f} ms  "
+            f"max {ordered[-1]:.2f} ms  ({len(ordered)} ticks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=100)
+    parser.add_argument('--minutes', type=int, default=30, help="simulated minutes")
+    parser.add_argument('--service', action='store_true', help="run the central billing service too")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    migrations.migrate()
+    mode = "central service" if args.service else "kiosk billing"
+    print(f"Backend: {db.get_backend()}  |  {args.stations} stations x {args.minutes} minutes  |  {mode}")
+
+    simulation = Simulation(args.stations, service=args.service, seed=args.seed)
+    simulation.setup()
+    try:
+        wall, statements = simulation.run(args.minutes)
+        charged, ideal, session_count, overrun = simulation.billing_error()
+
+        print(f"\nSimulated {args.minutes} minutes in {wall:.2f}s "
+              f"({wall / args.minutes * 1000:.0f} ms per simulated minute)")
+        print("Events: " + ", ".join(f"{count} {name}" for name, count in simulation.events.items()))
+        if statements is not None:
+            print(f"Statements: {statements} ({statements / args.minutes:.0f} per minute, "
+                  f"{statements / args.minutes / args.stations:.1f} per station-minute)")
+        else:
+            print("Statements: n/a (CAFE_QUERY_STATS=0)")
+        print(f"Kiosk ticks:   {percentiles(simulation.kiosk_ticks_ms)}")
+        if args.service:
+            print(f"Service ticks: {percentiles(simulation.service_ticks_ms)}")
+        error = charged - ideal
+        relative = f" ({error / ideal * 100:+.4f}%)" if ideal else ""
+        print(f"Billing: ₱{charged:.2f} charged vs ₱{ideal:.2f} ideal over {session_count} sessions, "
+              f"error ₱{error:+.4f}{relative}")
+        print(f"Expiry lag: sessions ran at most {overrun.total_seconds():.0f}s past their time limit")
+    finally:
+        simulation.teardown()
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
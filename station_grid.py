@@ -0,0 +1,186 @@
+"""
+Virtualized station grid.
+
+A scrollable grid of fixed-size cards on a Canvas that only materializes
+the cards in view, plus a row either side. Cards scrolled out of view are
+emptied and their frames reused for the ones scrolling in, so a floor of
+500+ stations costs the same to draw and scroll as one screenful. A filter
+bar above the grid narrows it by status and zone. Used by the kiosk's PC
+picker and the admin panel's PC overview.
+
+The caller passes build_card(frame, item), which fills an empty card frame
+for one item (a pc_units row) and returns its card data: a dict with at
+least 'frame', kept in `cards` under the item's unit_name while the card is
+in view. Callers patch cards in `cards` in place; a card leaving the view is
+dropped from `cards`, and is built from the current item when it returns.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+ALL = "All"
+BUFFER_ROWS = 1  # rows built above and below the visible ones, so scrolling shows no gaps
+
+
+class StationGrid(tk.Frame):
+    """Scrollable, filterable grid of station cards; only visible cards exist"""
+
+    def __init__(self, master, build_card, card_width, card_height, gap=10, bg=None, fg=None,
+                 card_options=None):
+        super().__init__(master, bg=bg)
+        self.build_card = build_card
+        self.card_width = card_width
+        self.card_height = card_height
+        self.gap = gap
+        self.card_options = card_options or {}
+
+        self.all_items = []
+        self.items = []          # all_items that pass the filters, in order
+        self.cards = {}          # unit_name -> card data, for cards in view
+        self._by_name = {}
+        self._slots = {}         # unit_name -> (frame, canvas window) in view
+        self._spare = []         # emptied (frame, canvas window) pairs for reuse
+        self._columns = 1
+        self._visible = None     # (first, last) item indexes currently materialized
+
+        # Filter bar
+        filter_bar = tk.Frame(self, bg=bg)
+        filter_bar.pack(fill='x', pady=(0, 10))
+        self.status_filter = tk.StringVar(value=ALL)
+        self.zone_filter = tk.StringVar(value=ALL)
+        self._filter_boxes = {}
+        for label, variable in (("Status", self.status_filter), ("Zone", self.zone_filter)):
+            tk.Label(filter_bar, text=f"{label}:", font=("Segoe UI", 11), bg=bg, fg=fg).pack(side='left', padx=(0, 5))
+            box = ttk.Combobox(filter_bar, textvariable=variable, values=[ALL], state='readonly', width=14)
+            box.pack(side='left', padx=(0, 15))
+            box.bind('<<ComboboxSelected>>', lambda e: self._apply_filters())
+            self._filter_boxes[label] = box
+        self.count_label = tk.Label(filter_bar, font=("Segoe UI", 10), bg=bg, fg=fg)
+        self.count_label.pack(side='right')
+
+        # Grid
+        self.canvas = tk.Canvas(self, bg=bg, highlightthickness=0,
+                                yscrollincrement=max(1, (card_height + gap) // 4))
+        scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.canvas.yview)
+        self._scrollbar_set = scrollbar.set
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+        scrollbar.pack(side='right', fill='y')
+        self.canvas.pack(side='left', fill='both', expand=True)
+        self._empty_text = self.canvas.create_text(20, 20, anchor='nw', text="", fill=fg or 'black',
+                                                   font=("Segoe UI", 12))
+
+        self.canvas.bind('<Configure>', lambda e: self._layout())
+        self.bind('<Enter>', lambda e: self._bind_wheel(True))
+        self.bind('<Leave>', self._on_leave)
+        self.bind('<Destroy>', lambda e: self._bind_wheel(False) if e.widget is self else None)
+
+    # -- items and filters ----------------------------------------------
+
+    def set_items(self, items):
+        """Show `items` (filtered); cards still in view keep their frames and card data"""
+        self.all_items = list(items)
+        self._by_name = {item['unit_name']: item for item in self.all_items}
+        for label, key in (("Status", 'status'), ("Zone", 'zone')):
+            values = sorted({item.get(key) or '' for item in self.all_items} - {''})
+            self._filter_boxes[label].configure(values=[ALL] + values)
+        self._apply_filters()
+
+    def item(self, unit_name):
+        """The current item for a station, or None"""
+        return self._by_name.get(unit_name)
+
+    def matches(self, item):
+        return (self.status_filter.get() in (ALL, item['status'])
+                and self.zone_filter.get() in (ALL, item.get('zone')))
+
+    def _apply_filters(self):
+        items = [item for item in self.all_items if self.matches(item)]
+        changed = [item['unit_name'] for item in items] != [item['unit_name'] for item in self.items]
+        self.items = items
+        self.count_label.configure(text=f"{len(items)} of {len(self.all_items)} stations")
+        self.canvas.itemconfigure(self._empty_text, text="" if items else "No stations match the filters")
+        if changed:
+            self._layout()
+
+    # -- layout and virtualization --------------------------------------
+
+    def _layout(self):
+        width = max(self.canvas.winfo_width(), self.card_width + 2 * self.gap)
+        pitch_x = self.card_width + self.gap
+        self._columns = max(1, (width - self.gap) // pitch_x)
+        rows = -(-len(self.items) // self._columns)
+        self.canvas.configure(scrollregion=(0, 0, width, rows * (self.card_height + self.gap) + self.gap))
+        self._visible = None
+        self._refresh_visible(reposition=True)
+
+    def _position(self, index):
+        row, col = divmod(index, self._columns)
+        width = max(self.canvas.winfo_width(), self.card_width + 2 * self.gap)
+        left = (width - self._columns * (self.card_width + self.gap) + self.gap) // 2
+        return left + col * (self.card_width + self.gap), self.gap + row * (self.card_height + self.gap)
+
+    def _on_scroll(self, first, last):
+        self._scrollbar_set(first, last)
+        self._refresh_visible()
+
+    def _refresh_visible(self, reposition=False):
+        pitch_y = self.card_height + self.gap
+        top = self.canvas.canvasy(0)
+        bottom = top + max(self.canvas.winfo_height(), pitch_y)
+        first = max(0, int(top // pitch_y) - BUFFER_ROWS) * self._columns
+        last = min(len(self.items), (int(bottom // pitch_y) + 1 + BUFFER_ROWS) * self._columns)
+        if (first, last) == self._visible and not reposition:
+            return
+        self._visible = (first, last)
+
+        wanted = {self.items[i]['unit_name']: i for i in range(first, last)}
+        for name in [name for name in self._slots if name not in wanted]:
+            self._release(name)
+        for name, index in wanted.items():
+            if name in self._slots:
+                if reposition:
+                    self.canvas.coords(self._slots[name][1], *self._position(index))
+            else:
+                self._place(name, index)
+
+    def _place(self, name, index):
+        if self._spare:
+            frame, window = self._spare.pop()
+        else:
+            frame = tk.Frame(self.canvas, width=self.card_width, height=self.card_height, **self.card_options)
+            frame.pack_propagate(False)
+            window = self.canvas.create_window(0, 0, window=frame, anchor='nw',
+                                               width=self.card_width, height=self.card_height)
+        self.canvas.coords(window, *self._position(index))
+        self.canvas.itemconfigure(window, state='normal')
+        self._slots[name] = (frame, window)
+        self.cards[name] = self.build_card(frame, self.items[index])
+
+    def _release(self, name):
+        frame, window = self._slots.pop(name)
+        self.cards.pop(name, None)
+        self.canvas.itemconfigure(window, state='hidden')
+        for child in frame.winfo_children():
+            child.destroy()
+        frame.unbind('<Button-1>')
+        frame.configure(cursor='', **self.card_options)
+        self._spare.append((frame, window))
+
+    # -- mouse wheel ----------------------------------------------------
+
+    def _bind_wheel(self, active):
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            if active:
+                self.bind_all(sequence, self._on_wheel)
+            else:
+                self.unbind_all(sequence)
+
+    def _on_leave(self, event):
+        # Moving onto a card also "leaves" the grid frame
+        widget = self.winfo_containing(*self.winfo_pointerxy())
+        if widget is None or not str(widget).startswith(str(self)):
+            self._bind_wheel(False)
+
+    def _on_wheel(self, event):
+        step = -1 if event.num == 4 or event.delta > 0 else 1
+        self.canvas.yview_scroll(step * 2, 'units')
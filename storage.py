@@ -0,0 +1,291 @@
+"""
+Storage backends for the shared connection pool.
+
+The application speaks MySQL SQL through the mysql.connector API. The MySQL
+backend connects to a real server; the SQLite backend wraps the standard
+library sqlite3 module in the same API and translates the small MySQL
+dialect the app uses, so the kiosk, admin and billing flows (and the test
+suite) can run with no outside services.
+
+Select a backend with CAFE_DB_BACKEND=mysql|sqlite and, for SQLite,
+CAFE_DB_PATH (a file path or ":memory:"). On MySQL, CAFE_DB_REPLICA_HOST
+(and optionally CAFE_DB_REPLICA_PORT) names a read replica for reports.
+"""
+
+import os
+import re
+import sqlite3
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import mysql.connector
+from mysql.connector import errors
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'internet_cafe.db')
+SQLITE_BUSY_TIMEOUT = 10  # seconds a writer waits for the database lock
+
+# MySQL error numbers the application and migrations look for
+ER_DUP_ENTRY = 1062
+ER_NO_REFERENCED_ROW = 1452
+ER_NO_SUCH_TABLE = 1146
+ER_LOCK_WAIT_TIMEOUT = 1205
+
+
+class MySQLBackend:
+    """Connections to a MySQL server via mysql.connector"""
+
+    dialect = 'mysql'
+
+    def __init__(self, config):
+        self.config = dict(config)
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def __repr__(self):
+        return f"MySQLBackend({self.config.get('host')}:{self.config.get('port')}/{self.config.get('database')})"
+
+
+class SQLiteBackend:
+    """Embedded SQLite database exposed through the mysql.connector API
+
+    ":memory:" gives a private in-memory database shared by every pooled
+    connection of this backend, which is what tests and benchmarks want.
+    """
+
+    dialect = 'sqlite'
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._anchor = None
+        if path == ':memory:':
+            # Shared-cache URI so all pooled connections see one database;
+            # the anchor keeps it alive while the pool churns connections
+            self._uri = f"file:cafe-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            self._anchor = self._open()
+        else:
+            self._uri = None
+
+    def connect(self):
+        return SQLiteConnection(self._open())
+
+    def close(self):
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+
+    def _open(self):
+        if self._uri:
+            raw = sqlite3.connect(self._uri, uri=True, timeout=SQLITE_BUSY_TIMEOUT,
+                                  detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        else:
+            raw = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT,
+                                  detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("PRAGMA foreign_keys=ON")
+        return raw
+
+    def __repr__(self):
+        return f"SQLiteBackend({self.path})"
+
+
+def backend_from_env(mysql_config):
+    """Build the backend selected by CAFE_DB_BACKEND (MySQL by default)"""
+    name = os.environ.get('CAFE_DB_BACKEND', 'mysql').lower()
+    if name == 'sqlite':
+        return SQLiteBackend(os.environ.get('CAFE_DB_PATH', DEFAULT_SQLITE_PATH))
+    if name == 'mysql':
+        return MySQLBackend(mysql_config)
+    raise ValueError(f"Unknown CAFE_DB_BACKEND '{name}' (expected 'mysql' or 'sqlite')")
+
+
+def replica_backend_from_env(mysql_config):
+    """Backend for the read replica named by CAFE_DB_REPLICA_HOST, or None
+
+    The replica shares the primary's credentials and database name. SQLite
+    has no replicas; reports then read from the primary.
+    """
+    host = os.environ.get('CAFE_DB_REPLICA_HOST')
+    if not host or os.environ.get('CAFE_DB_BACKEND', 'mysql').lower() != 'mysql':
+        return None
+    config = dict(mysql_config, host=host)
+    if os.environ.get('CAFE_DB_REPLICA_PORT'):
+        config['port'] = int(os.environ['CAFE_DB_REPLICA_PORT'])
+    return MySQLBackend(config)
+
+
+# ----------------------------------------------------------------------------
+# MySQL -> SQLite translation
+# ----------------------------------------------------------------------------
+
+LOCAL_NOW = "datetime('now', 'localtime')"
+
+_VALUES_REF = re.compile(r'\bVALUES\s*\(\s*(\w+)\s*\)', re.I)
+
+_TRANSLATIONS = [
+    # DDL
+    (re.compile(r'\b(\w+)\s+INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY', re.I),
+     r'\1 INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP', re.I), ''),
+    (re.compile(r'\bENUM\s*\([^)]*\)', re.I), 'TEXT'),
+    (re.compile(r'\bDEFAULT\s+CURRENT_TIMESTAMP\b', re.I), f'DEFAULT ({LOCAL_NOW})'),
+    # DML
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b(.*)$', re.I | re.S),
+     lambda m: 'ON CONFLICT DO UPDATE SET' + _VALUES_REF.sub(r'excluded.\1', m.group(1))),
+    (re.compile(r'\bDATE_SUB\s*\(\s*NOW\(\)\s*,\s*INTERVAL\s+(\d+)\s+(DAY|HOUR|MINUTE|SECOND)\s*\)', re.I),
+     lambda m: f"datetime('now', 'localtime', '-{m.group(1)} {m.group(2).lower()}s')"),
+    (re.compile(r'\bDATE_SUB\s*\(\s*NOW\(\)\s*,\s*INTERVAL\s+%s\s+(DAY|HOUR|MINUTE|SECOND)\s*\)', re.I),
+     lambda m: f"datetime('now', 'localtime', '-' || %s || ' {m.group(1).lower()}s')"),
+    (re.compile(r'\bDATE_ADD\s*\(\s*NOW\(\)\s*,\s*INTERVAL\s+(\d+)\s+(DAY|HOUR|MINUTE|SECOND)\s*\)', re.I),
+     lambda m: f"datetime('now', 'localtime', '+{m.group(1)} {m.group(2).lower()}s')"),
+    (re.compile(r'\bDATE_ADD\s*\(\s*NOW\(\)\s*,\s*INTERVAL\s+%s\s+(DAY|HOUR|MINUTE|SECOND)\s*\)', re.I),
+     lambda m: f"datetime('now', 'localtime', '+' || %s || ' {m.group(1).lower()}s')"),
+    (re.compile(r'\bTIMESTAMPDIFF\s*\(\s*(SECOND|MINUTE)\s*,\s*([\w.]+|NOW\(\)|%s)\s*,\s*([\w.]+|NOW\(\)|%s)\s*\)', re.I),
+     lambda m: (f"(CAST(ROUND((julianday({m.group(3)}) - julianday({m.group(2)})) * 86400) AS INTEGER)"
+                f"{'' if m.group(1).upper() == 'SECOND' else ' / 60'})")),
+    (re.compile(r'\b(NOW\(\)|CURRENT_TIMESTAMP(\(\))?)', re.I), f'({LOCAL_NOW})'),
+    (re.compile(r'\s+FOR\s+UPDATE\b', re.I), ''),
+    # SQLite's multi-argument MAX/MIN are the scalar GREATEST/LEAST
+    (re.compile(r'\bGREATEST\s*\(', re.I), 'MAX('),
+    (re.compile(r'\bLEAST\s*\(', re.I), 'MIN('),
+    (re.compile(r'%s'), '?'),
+]
+
+_translation_cache = {}
+
+
+def translate_sql(query):
+    """Rewrite the MySQL constructs used by the app into SQLite syntax"""
+    translated = _translation_cache.get(query)
+    if translated is None:
+        translated = query
+        for pattern, replacement in _TRANSLATIONS:
+            translated = pattern.sub(replacement, translated)
+        _translation_cache[query] = translated
+    return translated
+
+
+def _to_mysql_error(e):
+    """Map sqlite3 exceptions onto the mysql.connector hierarchy the app catches"""
+    message = str(e)
+    if isinstance(e, sqlite3.IntegrityError):
+        errno = ER_NO_REFERENCED_ROW if 'FOREIGN KEY' in message else ER_DUP_ENTRY
+        return errors.IntegrityError(msg=message, errno=errno)
+    if 'no such table' in message:
+        return errors.ProgrammingError(msg=message, errno=ER_NO_SUCH_TABLE)
+    if 'locked' in message or 'busy' in message:
+        return errors.OperationalError(msg=message, errno=ER_LOCK_WAIT_TIMEOUT)
+    if isinstance(e, sqlite3.OperationalError):
+        return errors.ProgrammingError(msg=message)
+    return errors.DatabaseError(msg=message)
+
+
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+for _type in ('TIMESTAMP', 'DATETIME'):
+    sqlite3.register_converter(_type, lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteCursor:
+    """mysql.connector-style cursor over a sqlite3 cursor"""
+
+    dialect = 'sqlite'
+
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection._raw.cursor()
+        self._dictionary = dictionary
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, params=None):
+        try:
+            self._cursor.execute(translate_sql(query), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _to_mysql_error(e) from e
+
+    def executemany(self, query, seq_params):
+        try:
+            self._cursor.executemany(translate_sql(query), [tuple(p) for p in seq_params])
+        except sqlite3.Error as e:
+            raise _to_mysql_error(e) from e
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._shape(row) if row is not None else None
+
+    def fetchall(self):
+        return [self._shape(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=1):
+        return [self._shape(row) for row in self._cursor.fetchmany(size)]
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _shape(self, row):
+        if self._dictionary:
+            return dict(zip(self.column_names, row))
+        return tuple(row)
+
+
+class SQLiteConnection:
+    """mysql.connector-style connection over a sqlite3 connection"""
+
+    dialect = 'sqlite'
+    unread_result = False
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def cursor(self, dictionary=False, buffered=None, prepared=None, **kwargs):
+        return SQLiteCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        try:
+            self._raw.commit()
+        except sqlite3.Error as e:
+            raise _to_mysql_error(e) from e
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def consume_results(self):
+        pass
+
+    def is_connected(self):
+        try:
+            self._raw.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self.is_connected():
+            raise errors.InterfaceError(msg="SQLite connection is closed")
+
+    def close(self):
+        self._raw.close()
@@ -0,0 +1,309 @@
+"""
+Tariff engine.
+
+A session's price per hour at any minute is the member's users.hourly_rate
+scaled by the time-of-day period in force (peak, off-peak), or the flat
+rate of a package period such as a night package, plus the surcharge of
+the PC's tier (gaming rows vs. office rows). Prepaid bundles cover session
+time before any money is charged.
+
+load() compiles the active rules into per-minute tables for one week
+(Monday 00:00 first) and their prefix sums, so pricing a range costs a few
+array lookups however long it is, and price_batch() prices many sessions
+at once with NumPy. With no periods and no surcharges the tariff is flat
+and prices exactly hourly_rate * seconds / 3600, as billing always did.
+
+Run `python tariff.py` to print the active rules, or
+`python tariff.py --quote RATE TIER MINUTES` to price a session from now.
+"""
+
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from mysql.connector import Error
+
+import db
+import ledger
+
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+TARIFF_CACHE_TTL = 60  # seconds a process keeps a compiled tariff before reloading the rules
+DEFAULT_TIER = 'standard'
+
+_WEEK_START = np.datetime64('1970-01-05T00:00:00')  # a Monday
+_ONE_MINUTE = np.timedelta64(60, 's')
+
+
+def _prefix(per_minute):
+    # Prefix sums over two weeks, so a range starting late in the week never wraps
+    return np.concatenate(([0.0], np.cumsum(np.tile(per_minute, 2))))
+
+
+def _window_mask(start_minute, end_minute, days='1111111'):
+    """Per-minute mask of a daily window; end <= start wraps past midnight"""
+    mask = np.zeros(WEEK_MINUTES, dtype=bool)
+    for day, flag in enumerate(days):
+        if flag != '1':
+            continue
+        start = day * DAY_MINUTES + start_minute
+        length = (end_minute - start_minute) % DAY_MINUTES or DAY_MINUTES
+        index = np.arange(start, start + length) % WEEK_MINUTES
+        mask[index] = True
+    return mask
+
+
+def week_positions(moments):
+    """Minutes since Monday 00:00 for each datetime, as floats"""
+    moments = np.asarray(moments, dtype='datetime64[us]')
+    return ((moments - _WEEK_START) / _ONE_MINUTE) % WEEK_MINUTES
+
+
+class Tariff:
+    """Compiled pricing rules; build with load() or current()"""
+
+    def __init__(self, periods=(), surcharges=None, pc_tiers=None):
+        self.periods = sorted(periods, key=lambda p: p['priority'])
+        self.surcharges = {tier: float(amount) for tier, amount in (surcharges or {}).items()}
+        self.pc_tiers = dict(pc_tiers or {})
+
+        # Later (higher priority) periods overwrite earlier ones minute by minute
+        multiplier = np.ones(WEEK_MINUTES)
+        fixed = np.zeros(WEEK_MINUTES)
+        for period in self.periods:
+            mask = _window_mask(period['start_minute'], period['end_minute'], period['days'])
+            if period['package_rate'] is not None:
+                multiplier[mask], fixed[mask] = 0.0, float(period['package_rate'])
+            else:
+                multiplier[mask], fixed[mask] = float(period['rate_multiplier']), 0.0
+        self.multiplier = multiplier
+        self.fixed = fixed
+        self._cum_multiplier = _prefix(multiplier)
+        self._cum_fixed = _prefix(fixed)
+        self._windows = {}
+        self._budgets = {}
+
+    @property
+    def is_flat(self):
+        return not self.periods and not any(self.surcharges.values())
+
+    def is_flat_for(self, pc_name):
+        """True when a PC is priced at the plain member rate (bundles are checked per user when charging)"""
+        return not self.periods and not self.surcharges.get(self.tier_of(pc_name), 0.0)
+
+    def tier_of(self, pc_name):
+        return self.pc_tiers.get(pc_name, DEFAULT_TIER)
+
+    def hourly_rate_at(self, hourly_rate, tier, moment):
+        """Price per hour at one instant"""
+        minute = int(week_positions([moment])[0])
+        return (float(hourly_rate) * self.multiplier[minute] + self.fixed[minute]
+                + self.surcharges.get(tier, 0.0))
+
+    def price_batch(self, hourly_rates, tiers, starts, ends):
+        """Price many [start, end) ranges at once; returns a float array of amounts"""
+        rates = np.asarray(hourly_rates, dtype=float)
+        surcharge = np.array([self.surcharges.get(tier, 0.0) for tier in tiers], dtype=float)
+        start = week_positions(starts)
+        minutes = np.maximum(
+            (np.asarray(ends, dtype='datetime64[us]') - np.asarray(starts, dtype='datetime64[us]'))
+            / _ONE_MINUTE, 0.0)
+        weeks, rest = np.divmod(minutes, WEEK_MINUTES)
+        end = start + rest
+
+        multiplier = self._integral(self._cum_multiplier, start, end) + weeks * self.multiplier.sum()
+        fixed = self._integral(self._cum_fixed, start, end) + weeks * self.fixed.sum()
+        return (rates * multiplier + fixed + surcharge * minutes) / 60
+
+    def price(self, hourly_rate, tier, start, end):
+        """Price one [start, end) range"""
+        return Decimal(str(round(float(self.price_batch([hourly_rate], [tier], [start], [end])[0]), 6)))
+
+    def price_with_bundles(self, hourly_rate, tier, start, end, bundles):
+        """Price a range after prepaid bundle time; returns (amount, (bundle_id, seconds) or None)
+
+        One bundle covers each range, the first one in `bundles` (ordered by
+        expiry) with usable time in it; the next takes over on the next
+        charge. A bundle covers the earliest seconds of the range that fall
+        in its window.
+        """
+        amount = self.price(hourly_rate, tier, start, end)
+        for bundle in bundles:
+            remaining = bundle['seconds_total'] - bundle['seconds_used']
+            until = min(end, bundle['expires_at']) if bundle['expires_at'] else end
+            if remaining <= 0 or until <= start:
+                continue
+            covered, discount = self._cover(hourly_rate, tier, start, until, remaining / 60,
+                                            bundle['window_start'], bundle['window_end'])
+            if covered > 0:
+                seconds = min(remaining, int(round(covered * 60)))
+                return max(amount - discount, Decimal(0)), (bundle['bundle_id'], seconds)
+        return amount, None
+
+    def affordable_until(self, hourly_rate, tier, start, budget):
+        """When `budget` runs out for a session charged from `start`; None if it never does"""
+        surcharge = self.surcharges.get(tier, 0.0)
+        key = (float(hourly_rate), surcharge)
+        cumulative = self._budgets.get(key)
+        if cumulative is None:
+            cumulative = (key[0] * self._cum_multiplier + self._cum_fixed
+                          + surcharge * np.arange(2 * WEEK_MINUTES + 1)) / 60
+            self._budgets[key] = cumulative
+        week_cost = cumulative[WEEK_MINUTES]
+        if week_cost <= 0:
+            return None
+
+        weeks, rest = divmod(max(float(budget), 0.0), week_cost)
+        position = float(week_positions([start])[0])
+        target = self._at(cumulative, position) + rest
+        minute = min(int(np.searchsorted(cumulative, target, side='right')) - 1, 2 * WEEK_MINUTES - 1)
+        step = cumulative[minute + 1] - cumulative[minute]
+        reached = minute + ((target - cumulative[minute]) / step if step > 0 else 0.0)
+        return start + timedelta(weeks=weeks, minutes=reached - position)
+
+    def _cover(self, hourly_rate, tier, start, end, minutes_left, window_start, window_end):
+        # Minutes of [start, end) a bundle covers, and their price
+        if window_start is None:
+            window = np.ones(WEEK_MINUTES, dtype=bool)
+        else:
+            window = _window_mask(window_start, window_end)
+        key = (window_start, window_end)
+        if key not in self._windows:
+            self._windows[key] = (_prefix(window.astype(float)),
+                                  _prefix(self.multiplier * window), _prefix(self.fixed * window))
+        cum_window, cum_multiplier, cum_fixed = self._windows[key]
+
+        a = float(week_positions([start])[0])
+        b = a + min((end - start).total_seconds() / 60, WEEK_MINUTES)
+        eligible = self._at(cum_window, b) - self._at(cum_window, a)
+        covered = min(minutes_left, eligible)
+        if covered <= 0:
+            return 0.0, Decimal(0)
+
+        # Position where the window has supplied `covered` minutes since a
+        target = self._at(cum_window, a) + covered
+        minute = min(int(np.searchsorted(cum_window, target, side='left')) - 1, 2 * WEEK_MINUTES - 1)
+        step = cum_window[minute + 1] - cum_window[minute]
+        stop = minute + ((target - cum_window[minute]) / step if step > 0 else 0.0)
+
+        discount = (float(hourly_rate) * (self._at(cum_multiplier, stop) - self._at(cum_multiplier, a))
+                    + self._at(cum_fixed, stop) - self._at(cum_fixed, a)
+                    + self.surcharges.get(tier, 0.0) * covered) / 60
+        return covered, Decimal(str(round(discount, 6)))
+
+    @staticmethod
+    def _at(cumulative, position):
+        minute = min(int(position), len(cumulative) - 2)
+        return cumulative[minute] + (position - minute) * (cumulative[minute + 1] - cumulative[minute])
+
+    @staticmethod
+    def _integral(cumulative, start, end):
+        # Vectorized _at(cumulative, end) - _at(cumulative, start)
+        values = []
+        for position in (start, end):
+            minute = np.minimum(position.astype(int), 2 * WEEK_MINUTES - 1)
+            values.append(cumulative[minute] + (position - minute) * (cumulative[minute + 1] - cumulative[minute]))
+        return values[1] - values[0]
+
+
+def load():
+    """Read the active rules and compile them"""
+    periods = db.fetchall("""
+        SELECT period_id, name, days, start_minute, end_minute, rate_multiplier, package_rate, priority
+        FROM tariff_periods
+        WHERE is_active = TRUE
+    """)
+    surcharges = {row['tier']: row['surcharge_per_hour']
+                  for row in db.fetchall("SELECT tier, surcharge_per_hour FROM pc_tiers")}
+    pc_tiers = {row['unit_name']: row['tier'] for row in db.fetchall("SELECT unit_name, tier FROM pc_units")}
+    return Tariff(periods, surcharges, pc_tiers)
+
+
+_cache = {'tariff': None, 'loaded_at': 0.0}
+_cache_lock = threading.Lock()
+
+
+def current():
+    """The compiled tariff, reloaded at most every TARIFF_CACHE_TTL seconds"""
+    with _cache_lock:
+        if _cache['tariff'] is None or time.monotonic() - _cache['loaded_at'] > TARIFF_CACHE_TTL:
+            try:
+                _cache['tariff'] = load()
+            except Error:
+                if _cache['tariff'] is None:
+                    raise
+                # Server unreachable: keep pricing with the rules we have (see journal.py)
+            _cache['loaded_at'] = time.monotonic()
+        return _cache['tariff']
+
+
+def invalidate():
+    """Drop the compiled tariff so the next current() reloads the rules"""
+    with _cache_lock:
+        _cache['tariff'] = None
+
+
+def active_bundles(tx, user_ids, now):
+    """Usable bundles of the given users, soonest expiry first, keyed by user_id"""
+    bundles = {}
+    user_ids = list(user_ids)
+    if not user_ids:
+        return bundles
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    rows = tx.fetchall(f"""
+        SELECT bundle_id, user_id, seconds_total, seconds_used, window_start, window_end, expires_at
+        FROM user_bundles
+        WHERE user_id IN ({placeholders}) AND seconds_used < seconds_total
+          AND (expires_at IS NULL OR expires_at > %s)
+        ORDER BY expires_at IS NULL, expires_at, bundle_id
+    """, (*user_ids, now))
+    for row in rows:
+        bundles.setdefault(row['user_id'], []).append(row)
+    return bundles
+
+
+def buy_bundle(user_id, name, minutes, price, window=None, valid_hours=None):
+    """Sell a prepaid bundle of `minutes`, optionally limited to a daily (start, end) minute window"""
+    window_start, window_end = window if window else (None, None)
+    with db.transaction() as tx:
+        bundle_id = tx.insert("""
+            INSERT INTO user_bundles (user_id, name, seconds_total, window_start, window_end, expires_at)
+            VALUES (%s, %s, %s, %s, %s, DATE_ADD(NOW(), INTERVAL %s HOUR))
+        """, (user_id, name, int(minutes * 60), window_start, window_end, valid_hours or None))
+        if price:
+            tx.execute("""
+                INSERT INTO balance_ledger (user_id, entry_type, amount, reference)
+                VALUES (%s, %s, %s, %s)
+            """, (user_id, ledger.BUNDLE_PURCHASE, -Decimal(str(price)), f"bundle {bundle_id}"))
+    return bundle_id
+
+
+def _clock(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tariff rules and quotes")
+    parser.add_argument('--quote', nargs=3, metavar=('RATE', 'TIER', 'MINUTES'),
+                        help="price a session starting now")
+    args = parser.parse_args()
+    try:
+        tariff = load()
+        if args.quote:
+            rate, tier, minutes = float(args.quote[0]), args.quote[1], float(args.quote[2])
+            start = datetime.now()
+            amount = tariff.price(rate, tier, start, start + timedelta(minutes=minutes))
+            print(f"₱{amount:.2f} for {minutes:g} minutes on a {tier} PC at ₱{rate:.2f}/hour")
+        else:
+            for period in tariff.periods:
+                price = (f"₱{float(period['package_rate']):.2f}/hour flat" if period['package_rate'] is not None
+                         else f"×{float(period['rate_multiplier']):g}")
+                print(f"{period['name']:<20} {_clock(period['start_minute'])}-{_clock(period['end_minute'])} "
+                      f"{period['days']}  {price}")
+            for tier, surcharge in sorted(tariff.surcharges.items()):
+                print(f"Tier {tier:<15} +₱{surcharge:.2f}/hour")
+    finally:
+        db.close_pool()
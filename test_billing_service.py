@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the central billing service on the SQLite backend
+"""
+
+from datetime import datetime
+
+import billing_service
+import db
+import ledger
+from main import CafeSystemApp
+from test_storage import use_sqlite, log_in, close_to, balance_of
+
+
+def test_tick_charges_every_occupied_pc():
+    """One pass charges a minute to each unlocked session and skips locked PCs"""
+    use_sqlite()
+    alice, _ = log_in('alice', 'PC-01', minutes_ago=1)
+    bob, _ = log_in('bob', 'PC-02', minutes_ago=1)
+    carol, _ = log_in('carol', 'PC-03', minutes_ago=1)
+    db.execute("UPDATE pc_units SET is_locked = TRUE WHERE unit_name = 'PC-03'")
+
+    charged, expired = billing_service.run_tick()
+
+    assert charged == 2 and expired == []
+    assert close_to(balance_of(alice), 99) and close_to(balance_of(bob), 99)
+    assert balance_of(carol) == 100.0
+    print("✅ All occupied PCs charged in one pass")
+
+
+def test_tick_ends_exhausted_sessions():
+    """Sessions out of balance or past their time limit are released"""
+    use_sqlite()
+    broke, _ = log_in('broke', 'PC-01', balance=0.5, minutes_ago=1)
+    late, _ = log_in('late', 'PC-02', minutes_ago=121)
+    fine, _ = log_in('fine', 'PC-03', minutes_ago=30)
+
+    _, expired = billing_service.run_tick()
+
+    assert sorted(pc['unit_name'] for pc in expired) == ['PC-01', 'PC-02']
+    assert balance_of(broke) == 0.0
+    released = db.fetchall("SELECT unit_name FROM pc_units WHERE current_user_id IN (%s, %s)", (broke, late))
+    assert released == []
+    assert db.fetchone("SELECT current_user_id FROM pc_units WHERE unit_name = 'PC-03'")['current_user_id'] == fine
+    print("✅ Exhausted sessions ended by the service")
+
+
+def test_kiosks_only_read_while_service_runs():
+    """A fresh heartbeat stops kiosks from charging their own sessions"""
+    use_sqlite()
+    user_id, _ = log_in('alice', 'PC-01', minutes_ago=1)
+
+    def kiosk_tick():
+        return billing_service.charge_session('PC-01', user_id)
+
+    assert close_to(kiosk_tick()['account_balance'], 99)  # no service: the kiosk charges itself
+
+    billing_service.run_tick()  # nothing left to charge since the kiosk's watermark
+    session = kiosk_tick()
+    assert session['central_billing'] == 1
+    assert close_to(session['account_balance'], 99) and session['charged'] == 0
+    assert close_to(balance_of(user_id), 99)
+    assert len(ledger.history(user_id)) == 1
+    print("✅ Kiosks defer to the running billing service")
+
+
+def test_kiosk_charge_session_reports_state():
+    """charge_session returns the balance, minutes left and lock state after charging"""
+    use_sqlite()
+    user_id, _ = log_in('alice', 'PC-01', balance=10, minutes_ago=100, charged_minutes_ago=2)
+
+    session = billing_service.charge_session('PC-01', user_id)
+    assert close_to(session['charged'], 2) and close_to(session['account_balance'], 8)
+    assert session['elapsed_minutes'] == 100
+    assert session['remaining_minutes'] == int(session['account_balance'])  # ₱1/minute
+    assert not session['is_locked']
+
+    db.execute("UPDATE pc_units SET is_locked = TRUE WHERE unit_name = 'PC-01'")
+    locked = billing_service.charge_session('PC-01', user_id)
+    assert locked['is_locked'] and locked['charged'] == 0
+    assert billing_service.charge_session('PC-99', user_id) is None
+    print("✅ Kiosk charge returns the session state")
+
+
+def test_missed_ticks_are_caught_up():
+    """A session last charged 5 minutes ago is charged for all 5 in one entry"""
+    use_sqlite()
+    user_id, _ = log_in('alice', 'PC-01', minutes_ago=30, charged_minutes_ago=5)
+
+    billing_service.run_tick()
+    billing_service.run_tick()  # an immediate second tick owes (almost) nothing
+
+    charges = [float(e['amount']) for e in ledger.history(user_id)]
+    assert close_to(charges[-1], -5)
+    assert close_to(sum(charges), -5)
+    watermark = db.fetchone("SELECT last_charged_at FROM pc_units WHERE unit_name = 'PC-01'")['last_charged_at']
+    assert abs((datetime.now() - watermark).total_seconds()) < 2
+    print("✅ Missed ticks caught up from the watermark")
+
+
+class FakeRoot:
+    """Tracks pending after() callbacks"""
+    def __init__(self):
+        self.pending = {}
+
+    def after(self, ms, callback):
+        after_id = f"after#{len(self.pending) + 1}"
+        self.pending[after_id] = callback
+        return after_id
+
+    def after_cancel(self, after_id):
+        del self.pending[after_id]
+
+
+def test_one_billing_chain_per_kiosk():
+    """Starting billing again replaces the pending tick instead of adding a chain"""
+    app = CafeSystemApp.__new__(CafeSystemApp)
+    app.root, app.billing_after_id = FakeRoot(), None
+    app.current_user, app.selected_pc = {'user_id': 1}, 'PC-01'
+
+    app.start_billing_system()
+    app.start_billing_system()  # e.g. unlocking the kiosk rebuilds the main interface
+    assert list(app.root.pending) == [app.billing_after_id]
+
+    app.cancel_billing()
+    assert app.root.pending == {} and app.billing_after_id is None
+    print("✅ One billing chain per kiosk")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Billing Service...")
+    print("=" * 50)
+
+    test_tick_charges_every_occupied_pc()
+    test_tick_ends_exhausted_sessions()
+    test_kiosks_only_read_while_service_runs()
+    test_kiosk_charge_session_reports_state()
+    test_missed_ticks_are_caught_up()
+    test_one_billing_chain_per_kiosk()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
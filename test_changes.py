@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the row_version change feed on the SQLite backend
+"""
+
+import billing_service
+import changes
+import db
+import pc_overview
+import query_stats
+import sessions
+from main import CafeSystemApp, PC_CARD_COLUMNS
+from test_pc_overview import FakeLabel
+from test_station_grid import make_grid
+from test_storage import use_sqlite, log_in
+
+
+def test_polls_return_only_changed_rows():
+    """Writes stamp increasing versions; an unchanged table polls empty in one statement"""
+    use_sqlite()
+    version = changes.current('pc_units')
+    rows, version = changes.since('pc_units', version)
+    assert rows == []
+
+    db.execute("UPDATE pc_units SET status = 'Maintenance' WHERE unit_name = 'PC-03'")
+    log_in('alice', 'PC-01')
+    rows, version = changes.since('pc_units', version, 'unit_name, status, row_version')
+    assert [row['unit_name'] for row in rows] == ['PC-03', 'PC-01']
+    assert version == changes.current('pc_units') == rows[-1]['row_version']
+
+    query_stats.stats.reset()
+    assert changes.since('pc_units', version) == ([], version)
+    assert sum(row['count'] for row in query_stats.stats.snapshot()) == 1
+
+    with db.transaction() as tx:
+        order_id = tx.insert("""
+            INSERT INTO orders (user_id, item_name, quantity, price, total_price) VALUES (NULL, 'Latte', 1, 70, 70)
+        """)
+    rows, _ = changes.since('orders', 0, 'order_id, row_version')
+    assert [row['order_id'] for row in rows] == [order_id]
+    print("✅ Change feed returned only changed rows")
+
+
+def test_billing_keeps_versions():
+    """Charging moves only the watermark, so occupied PCs stay out of the feed until their state changes"""
+    use_sqlite()
+    alice, _ = log_in('alice', 'PC-01', charged_minutes_ago=2)
+    bob, _ = log_in('bob', 'PC-02', charged_minutes_ago=3)
+    version = changes.current('pc_units')
+
+    billing_service.run_tick()
+    billing_service.charge_session('PC-01', alice)
+    assert changes.since('pc_units', version) == ([], version)
+
+    with db.transaction() as tx:
+        billing_service.end_session(tx, 'PC-02', sessions.FORCE_LOGOUT)
+    rows, _ = changes.since('pc_units', version, 'unit_name, status, row_version')
+    assert [(row['unit_name'], row['status']) for row in rows] == [('PC-02', 'Available')]
+    print("✅ Billing ticks left row versions alone")
+
+
+def test_overview_polls_deltas():
+    """The admin overview's poll carries only the PCs changed since its last load"""
+    use_sqlite()
+    pcs = pc_overview.load()
+    version = changes.latest(pcs, 0)
+    assert pc_overview.load(version) == []
+
+    log_in('bob', 'PC-02')
+    changed = pc_overview.load(version)
+    assert [pc['unit_name'] for pc in changed] == ['PC-02'] and changed[0]['username'] == 'bob'
+    print("✅ Overview polled only changed PCs")
+
+
+class FakeCard(FakeLabel):
+    """A card frame that records its click binding"""
+    def __init__(self):
+        super().__init__()
+        self.bound = False
+
+    def winfo_children(self):
+        return []
+
+    def bind(self, sequence, handler):
+        self.bound = True
+
+    def unbind(self, sequence):
+        self.bound = False
+
+
+class FakeRoot:
+    def after(self, ms, callback):
+        return 'after#1'
+
+
+def test_picker_patches_changed_cards():
+    """The PC picker's poll re-badges only the cards whose PC changed"""
+    use_sqlite()
+    app = CafeSystemApp.__new__(CafeSystemApp)
+    app.root, app.accent_color = FakeRoot(), 'green'
+    grid = make_grid()
+    grid.winfo_exists = lambda: True
+    grid.build_card = lambda frame, pc: {'frame': FakeCard(), 'status_badge': FakeLabel(), 'pc_data': pc,
+                                         'clickable': True}
+    grid.set_items(db.fetchall("SELECT * FROM pc_units ORDER BY unit_name"))
+    app.pc_grid, app.pc_frames_data = grid, grid.cards
+    app.pc_version = changes.latest(grid.all_items, 0)
+
+    log_in('alice', 'PC-02')
+    db.execute("UPDATE pc_units SET is_locked = TRUE WHERE unit_name = 'PC-03'")
+    app.apply_pc_changes(grid, *changes.since('pc_units', app.pc_version, PC_CARD_COLUMNS))
+
+    badges = {name: card['status_badge'].options.get('text') for name, card in grid.cards.items()}
+    assert badges['PC-02'] == "👤 In Use" and badges['PC-03'] == "🔒 Admin Locked" and badges['PC-01'] is None
+    assert not grid.cards['PC-02']['clickable'] and not grid.cards['PC-02']['frame'].bound
+    assert app.pc_refresh_id == 'after#1' and app.pc_version == changes.current('pc_units')
+    print("✅ PC picker patched only changed cards")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Change Feed...")
+    print("=" * 50)
+
+    test_polls_return_only_changed_rows()
+    test_billing_keeps_versions()
+    test_overview_polls_deltas()
+    test_picker_patches_changed_cards()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
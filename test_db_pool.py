@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared connection pool and background executor
+without a MySQL server
+"""
+
+import threading
+import time
+
+from mysql.connector import Error
+from mysql.connector import errors as mysql_errors
+
+import db
+import migrations
+import storage
+from db import ConnectionPool, DatabaseExecutor, PoolTimeoutError
+
+
+class FakeConnection:
+    """Stand-in for a mysql.connector connection"""
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.in_transaction = False
+        self.unread_result = False
+        self.rollbacks = 0
+
+    def is_connected(self):
+        return self.alive
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise Error(msg="MySQL server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def consume_results(self):
+        self.unread_result = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    return ConnectionPool(connect=connect, **kwargs), created
+
+
+def test_pool_reuses_connections():
+    """A released connection is handed out again instead of opening a new one"""
+    pool, created = make_pool(max_size=2)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert len(created) == 1
+    print("✅ Pool reuses idle connections")
+
+
+def test_pool_rolls_back_on_release():
+    """Open transactions are rolled back so the next borrower sees fresh data"""
+    pool, _ = make_pool()
+
+    with pool.connection() as conn:
+        conn.in_transaction = True
+
+    assert conn.rollbacks == 1
+    assert not conn.in_transaction
+    print("✅ Pool rolls back abandoned transactions")
+
+
+def test_pool_replaces_dead_connections():
+    """Pre-ping discards connections the server has dropped"""
+    pool, created = make_pool(ping_interval=0)
+
+    with pool.connection() as conn:
+        conn.alive = False
+    with pool.connection() as replacement:
+        pass
+
+    assert replacement is not conn
+    assert conn.closed
+    assert len(created) == 2
+    assert pool.stats()['reconnects'] == 1
+    print("✅ Pool replaces dead connections")
+
+
+def test_recently_used_connections_skip_ping():
+    """Connections returned within ping_interval are reused without a round trip"""
+    pool, _ = make_pool(ping_interval=60)
+    pings = []
+
+    with pool.connection() as conn:
+        conn.is_connected = lambda: pings.append(1) or True
+    with pool.connection():
+        pass
+
+    assert pings == []
+    print("✅ Recently used connections skip the pre-ping")
+
+
+def test_ping_reconnects_with_backoff():
+    """ping(reconnect=True) retries failed connects and counts the reconnect"""
+    attempts = []
+
+    def flaky_connect():
+        attempts.append(1)
+        if len(attempts) in (2, 3):
+            raise Error(msg="Can't connect to MySQL server")
+        return FakeConnection()
+
+    pool = ConnectionPool(connect=flaky_connect, reconnect_attempts=3, reconnect_delay=0.001)
+    with pool.connection() as conn:
+        conn.alive = False
+
+    assert pool.ping(reconnect=True)
+    assert len(attempts) == 4
+    assert pool.stats()['reconnects'] == 1
+    assert pool.stats()['in_use'] == 0
+    assert pool.ping(reconnect=False)
+    print("✅ ping() reconnects with backoff")
+
+
+def test_pool_is_bounded():
+    """Checkout blocks at max_size and times out instead of opening more"""
+    pool, created = make_pool(max_size=1, acquire_timeout=0.05)
+
+    conn = pool.acquire()
+    try:
+        pool.acquire()
+        assert False, "second checkout should have timed out"
+    except PoolTimeoutError:
+        pass
+
+    # A waiting thread gets the connection as soon as it is returned
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(pool.acquire()))
+    pool.acquire_timeout = 2
+    waiter.start()
+    pool.release(conn)
+    waiter.join()
+
+    assert result == [conn]
+    assert len(created) == 1
+    print("✅ Pool never exceeds max_size")
+
+
+def test_ping_never_raises():
+    """An exhausted pool or an unreachable server reports False"""
+    pool, _ = make_pool(max_size=1, acquire_timeout=0.05)
+    conn = pool.acquire()
+    assert pool.ping() is False
+    pool.release(conn)
+
+    def unreachable():
+        raise Error(msg="Can't connect to MySQL server")
+    down = ConnectionPool(connect=unreachable, reconnect_attempts=1, reconnect_delay=0)
+    assert down.ping() is False
+    assert pool.ping() is True
+    print("✅ Ping reports an exhausted or unreachable pool as False")
+
+
+def test_pool_reaps_idle_connections():
+    """Connections idle past idle_timeout are closed"""
+    pool, _ = make_pool(idle_timeout=0)
+
+    with pool.connection() as conn:
+        pass
+    pool.reap_idle()
+
+    assert conn.closed
+    assert pool.size == 0
+    print("✅ Pool reaps idle connections")
+
+
+class FakeRoot:
+    """Minimal stand-in for a Tk root that runs after() callbacks on demand"""
+
+    def __init__(self):
+        self.scheduled = []
+        self.thread = threading.current_thread()
+
+    def after(self, delay, callback):
+        assert threading.current_thread() is self.thread, "after() called off the Tk thread"
+        self.scheduled.append(callback)
+        return len(self.scheduled)
+
+    def after_cancel(self, after_id):
+        pass
+
+    def pump(self, timeout=2):
+        """Run scheduled callbacks until nothing is left, like mainloop would"""
+        deadline = time.monotonic() + timeout
+        while self.scheduled and time.monotonic() < deadline:
+            callback = self.scheduled.pop(0)
+            callback()
+            time.sleep(0.001)
+
+
+def test_executor_delivers_results_on_tk_thread():
+    """Results and errors come back through root.after on the calling thread"""
+    root = FakeRoot()
+    executor = DatabaseExecutor(root)
+    delivered = []
+
+    def fail():
+        raise ValueError("boom")
+
+    executor.submit(lambda: threading.current_thread().name,
+                    on_success=lambda name: delivered.append((name, threading.current_thread())))
+    executor.submit(fail, on_error=lambda e: delivered.append(("error", str(e))))
+    root.pump()
+    executor.shutdown()
+
+    worker_name, callback_thread = next(d for d in delivered if d[0] != "error")
+    assert worker_name.startswith("db-worker")
+    assert callback_thread is root.thread
+    assert ("error", "boom") in delivered
+    assert not root.scheduled, "polling should stop once nothing is pending"
+    print("✅ Executor marshals results back to the Tk thread")
+
+
+class UnreachableBackend:
+    """Replica backend whose server is down"""
+
+    dialect = 'mysql'
+
+    def __init__(self):
+        self.attempts = 0
+
+    def connect(self):
+        self.attempts += 1
+        raise mysql_errors.InterfaceError(msg="Can't connect to MySQL server on 'replica'")
+
+
+def test_reports_read_from_replica():
+    """Report reads go to the replica while regular reads stay on the primary"""
+    primary, replica = storage.SQLiteBackend(':memory:'), storage.SQLiteBackend(':memory:')
+    db.configure(replica)
+    migrations.migrate()
+    db.execute("UPDATE pc_units SET status = 'Maintenance'")  # mark the replica's copy
+    db.configure(primary, replica=replica)
+    migrations.migrate()
+
+    report = db.report_fetchall("SELECT status, COUNT(*) AS count FROM pc_units GROUP BY status")
+    live = db.fetchall("SELECT status, COUNT(*) AS count FROM pc_units GROUP BY status")
+
+    assert report == [{'status': 'Maintenance', 'count': 10}]
+    assert live == [{'status': 'Available', 'count': 10}]
+    print("✅ Report queries routed to the replica")
+
+
+def test_reports_fall_back_to_primary():
+    """A dead replica costs one attempt, then reports use the primary for a while"""
+    replica = UnreachableBackend()
+    db.configure(storage.SQLiteBackend(':memory:'), replica=replica)
+    migrations.migrate()
+
+    for _ in range(3):
+        assert db.report_fetchone("SELECT COUNT(*) AS total FROM pc_units")['total'] == 10
+
+    assert replica.attempts == 1
+    assert db.replica_down()
+    print("✅ Reports fall back to the primary when the replica is down")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Shared Connection Pool...")
+    print("=" * 50)
+
+    test_pool_reuses_connections()
+    test_pool_rolls_back_on_release()
+    test_pool_replaces_dead_connections()
+    test_recently_used_connections_skip_ping()
+    test_ping_reconnects_with_backoff()
+    test_pool_is_bounded()
+    test_ping_never_raises()
+    test_pool_reaps_idle_connections()
+    test_executor_delivers_results_on_tk_thread()
+    test_reports_read_from_replica()
+    test_reports_fall_back_to_primary()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
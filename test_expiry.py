@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the session expiry scheduler
+"""
+
+from datetime import datetime, timedelta
+
+import billing_service
+import db
+import expiry
+import ledger
+import sessions
+import tariff
+from test_storage import use_sqlite, log_in, ago
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def test_heap_orders_and_skips_stale_entries():
+    """Rescheduled PCs fire at their latest instant only"""
+    scheduler = expiry.ExpiryScheduler()
+    scheduler.schedule('PC-01', 1, T0 + timedelta(minutes=5))
+    scheduler.schedule('PC-02', 2, T0 + timedelta(minutes=2))
+    scheduler.schedule('PC-02', 2, T0 + timedelta(minutes=9))  # topped up
+    assert not scheduler.schedule('PC-01', 1, T0 + timedelta(minutes=5))
+
+    assert scheduler.next_expiry() == T0 + timedelta(minutes=5)
+    assert scheduler.pop_due(T0 + timedelta(minutes=6)) == [('PC-01', 1)]
+    assert scheduler.pop_due(T0 + timedelta(minutes=8)) == []
+    assert scheduler.pop_due(T0 + timedelta(minutes=9)) == [('PC-02', 2)]
+    assert len(scheduler) == 0 and scheduler.next_expiry() is None
+    print("✅ Heap fires the earliest live entry")
+
+
+def test_expiry_is_earliest_of_time_and_balance():
+    """Balance burn and the time limit both bound a session"""
+    flat = tariff.Tariff()
+    session = {'session_start': T0, 'last_charged_at': T0 + timedelta(minutes=10), 'tier': 'standard',
+               'session_time_limit': 120, 'hourly_rate': 60, 'account_balance': 30}
+    assert expiry.expiry_of(session, flat) == T0 + timedelta(minutes=40)
+    session['account_balance'] = 500
+    assert expiry.expiry_of(session, flat) == T0 + timedelta(minutes=120)
+    print("✅ Expiry from time limit and burn rate")
+
+
+def test_refresh_reschedules_topped_up_users():
+    """Only PCs with a new session or a top-up are re-read"""
+    use_sqlite()
+    alice, _ = log_in('alice', 'PC-01', balance=5, charged_minutes_ago=0)
+    scheduler = expiry.ExpiryScheduler()
+    db.run_in_transaction(scheduler.sync)
+    before = scheduler.next_expiry()
+
+    assert db.run_in_transaction(scheduler.refresh) == 0
+    ledger.record(alice, ledger.TOPUP, 10, reference='admin')
+    log_in('bob', 'PC-02', balance=100)
+
+    assert db.run_in_transaction(scheduler.refresh) == 2
+    assert len(scheduler) == 2
+    assert scheduler._scheduled['PC-01'][0] - before == timedelta(minutes=10)
+    print("✅ Incremental refresh on top-ups and logins")
+
+
+def test_due_sessions_end_or_reschedule():
+    """A due entry ends an exhausted session and reschedules a topped-up one"""
+    use_sqlite()
+    _, late_session = log_in('late', 'PC-01', minutes_ago=121)
+    topped, _ = log_in('topped', 'PC-02', balance=1, charged_minutes_ago=0)
+    scheduler = expiry.ExpiryScheduler()
+    db.run_in_transaction(scheduler.sync)
+    ledger.record(topped, ledger.TOPUP, 100)  # not yet seen by the scheduler
+
+    scheduler.schedule('PC-02', topped, ago(1))  # force it due
+    assert billing_service.end_due_sessions(scheduler) == 1
+
+    assert sessions.get(late_session)['end_reason'] == sessions.EXPIRED
+    assert 'PC-02' in scheduler._scheduled
+    pc = db.fetchone("SELECT current_user_id FROM pc_units WHERE unit_name = 'PC-02'")
+    assert pc['current_user_id'] == topped
+    print("✅ Due sessions re-checked before ending")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Expiry Scheduler...")
+    print("=" * 50)
+
+    test_heap_orders_and_skips_stale_entries()
+    test_expiry_is_earliest_of_time_and_balance()
+    test_refresh_reschedules_topped_up_users()
+    test_due_sessions_end_or_reschedule()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the kiosk charge journal on the SQLite backend
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from mysql.connector import Error
+
+import db
+import journal
+import ledger
+import prepared
+from test_storage import use_sqlite, log_in, ago, close_to
+
+
+@contextmanager
+def offline():
+    """Make every query the journal issues fail as if the server were unreachable"""
+    def unreachable(*args, **kwargs):
+        raise Error(msg="Can't connect to MySQL server")
+    saved = db.run_in_transaction, prepared.fetchone
+    db.run_in_transaction = prepared.fetchone = unreachable
+    try:
+        yield
+    finally:
+        db.run_in_transaction, prepared.fetchone = saved
+
+
+def minute_passes(charges, pc_name):
+    """Age the server's watermark and the journal's by a minute"""
+    watermark = db.fetchone("SELECT last_charged_at FROM pc_units WHERE unit_name = %s", (pc_name,))
+    db.execute("UPDATE pc_units SET last_charged_at = %s WHERE unit_name = %s",
+               (watermark['last_charged_at'] - timedelta(minutes=1), pc_name))
+    charges._charged_to -= timedelta(minutes=1)
+
+
+def test_replay_keeps_unacknowledged_records():
+    """Reopening the file restores pending records and drops a torn tail"""
+    path = os.path.join(tempfile.mkdtemp(), 'journal.log')
+    charges = journal.ChargeJournal(path)
+    charges.record_charge(1, 'PC-01', 7, ago(2), 1)
+    charges.record_charge(1, 'PC-01', 7, ago(1), 1)
+    charges._append({'ack': 1})
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 3, "session_')  # crashed mid-write
+
+    reopened = journal.ChargeJournal(path)
+
+    assert [record['seq'] for record in reopened.pending] == [2]
+    assert reopened.record_charge(1, 'PC-01', 7, ago(0), 1)['seq'] == 3
+    assert len(journal.ChargeJournal(path).pending) == 2
+    print("✅ Journal replayed after a crash")
+
+
+def test_flush_charges_once():
+    """A batch becomes one ledger row, and replaying it charges nothing"""
+    use_sqlite()
+    alice, session_id = log_in('alice', 'PC-01', charged_minutes_ago=10)
+    path = os.path.join(tempfile.mkdtemp(), 'journal.log')
+    charges = journal.ChargeJournal(path)
+    charges.record_charge(session_id, 'PC-01', alice, ago(6), 4)
+    charges.record_charge(session_id, 'PC-01', alice, ago(4), 2)
+    shutil.copy(path, path + '.lost-ack')
+
+    assert close_to(charges.flush(), 6) and not charges.pending
+    assert journal.ChargeJournal(path + '.lost-ack').flush() == 0
+
+    rows = db.fetchall("SELECT amount, idempotency_key FROM balance_ledger WHERE session_id = %s", (session_id,))
+    assert len(rows) == 1 and rows[0]['idempotency_key'].endswith(':1-2')
+    assert close_to(ledger.live_balance(alice), 94)
+    print("✅ Journaled charges applied exactly once")
+
+
+def test_ticks_defer_and_survive_an_outage():
+    """Ticks charge locally between flushes and while the server is down"""
+    use_sqlite()
+    alice, _ = log_in('alice', 'PC-01', charged_minutes_ago=1)
+    charges = journal.ChargeJournal(os.path.join(tempfile.mkdtemp(), 'journal.log'))
+
+    assert close_to(charges.tick('PC-01', alice)['account_balance'], 99)  # first tick goes to the server
+    minute_passes(charges, 'PC-01')
+    assert close_to(charges.tick('PC-01', alice)['account_balance'], 98)
+    assert len(charges.pending) == 1 and close_to(ledger.live_balance(alice), 99)
+
+    minute_passes(charges, 'PC-01')
+    with offline():
+        assert close_to(charges.tick('PC-01', alice)['account_balance'], 97)
+    assert len(charges.pending) == 2
+
+    session = charges.tick('PC-01', alice)  # back online: flush, then charge
+    assert not charges.pending
+    assert close_to(session['account_balance'], 97) and close_to(ledger.live_balance(alice), 97)
+    print("✅ Billing continued through an outage")
+
+
+def test_resync_failure_and_reset_never_block():
+    """A server drop while re-syncing falls back to the journal, and reset() ignores a held lock"""
+    use_sqlite()
+    alice, _ = log_in('alice', 'PC-01', charged_minutes_ago=1)
+    charges = journal.ChargeJournal(os.path.join(tempfile.mkdtemp(), 'journal.log'))
+    charges.tick('PC-01', alice)
+
+    minute_passes(charges, 'PC-01')
+    db.execute("UPDATE pc_units SET is_locked = TRUE WHERE unit_name = 'PC-01'")  # forces a re-sync
+    saved = db.run_in_transaction
+
+    def dropped(*args, **kwargs):
+        raise Error(msg="Lost connection to MySQL server during query")
+    db.run_in_transaction = dropped
+    try:
+        assert close_to(charges.tick('PC-01', alice)['account_balance'], 98)
+    finally:
+        db.run_in_transaction = saved
+
+    held, release = threading.Event(), threading.Event()
+
+    def stuck_tick():
+        with charges._lock:
+            held.set()
+            release.wait()
+
+    holder = threading.Thread(target=stuck_tick)
+    holder.start()
+    held.wait()
+    charges.reset()   # a tick stuck on the server holds the lock
+    release.set()
+    holder.join()
+    assert charges._billing is None
+    print("✅ Re-sync failures and logout never stall")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Charge Journal...")
+    print("=" * 50)
+
+    test_replay_keeps_unacknowledged_records()
+    test_flush_charges_once()
+    test_ticks_defer_and_survive_an_outage()
+    test_resync_failure_and_reset_never_block()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
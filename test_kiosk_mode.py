@@ -3,23 +3,22 @@
 Test script to verify kiosk mode real-time updates functionality
 """
 
-import mysql.connector
+import os
+
 from mysql.connector import Error
 
+import db
+from test_storage import use_sqlite
+
 def test_kiosk_mode_database():
     """Test kiosk mode database operations"""
+    # Run against an embedded SQLite database unless a backend is chosen explicitly,
+    # e.g. CAFE_DB_BACKEND=mysql to test the real server
+    if 'CAFE_DB_BACKEND' not in os.environ:
+        use_sqlite()
     try:
         # Connect to database
-        connection = mysql.connector.connect(
-            host='localhost',
-            port=3306,
-            user='root',
-            password='',
-            database='internet_cafe',
-            use_pure=True
-        )
-        
-        if connection.is_connected():
+        with db.connection() as connection:
             cursor = connection.cursor(dictionary=True)
             
             # Create system_settings table if it doesn't exist
@@ -78,7 +77,6 @@ def test_kiosk_mode_database():
             connection.commit()
             
             cursor.close()
-            connection.close()
             
             print("✅ All kiosk mode database tests passed!")
             return True
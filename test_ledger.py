@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the append-only balance ledger and its rollup
+"""
+
+from decimal import Decimal
+
+import db
+import ledger
+from admin_panel import AdminApp
+from test_storage import use_sqlite, add_user
+
+
+def stored_balance(user_id):
+    return Decimal(str(db.fetchone("SELECT account_balance FROM users WHERE user_id = %s",
+                                   (user_id,))['account_balance']))
+
+
+def test_live_balance_is_snapshot_plus_tail():
+    """Entries change the live balance without touching the users row"""
+    use_sqlite()
+    user_id = add_user()
+
+    ledger.record(user_id, ledger.TOPUP, 50, reference='admin')
+    ledger.record_many([(user_id, ledger.SESSION_CHARGE, -0.33, 'PC-01')] * 3)
+
+    assert ledger.live_balance(user_id) == Decimal('149.01')
+    assert stored_balance(user_id) == 100
+    assert [e['entry_type'] for e in ledger.history(user_id)][-1] == ledger.TOPUP
+    print("✅ Live balance computed from snapshot and tail")
+
+
+def test_rollup_folds_tail_into_users():
+    """Rollup materializes balances and leaves live balances unchanged"""
+    use_sqlite()
+    alice, bob = add_user('alice'), add_user('bob', balance=20)
+    ledger.record(alice, ledger.SESSION_CHARGE, -1.5, 'PC-01')
+    ledger.record(bob, ledger.TOPUP, 30)
+    ledger.record(bob, ledger.CAFE_ORDER, -12.25, 'order 7')
+
+    assert ledger.rollup(batch_size=2) == 3  # two batches
+
+    assert stored_balance(alice) == Decimal('98.5')
+    assert stored_balance(bob) == Decimal('37.75')
+    assert ledger.live_balance(bob) == Decimal('37.75')
+    assert ledger.rollup() == 0
+    print("✅ Ledger tail rolled up into users")
+
+
+def test_rollup_of_one_user():
+    """A per-user rollup leaves everyone else's tail alone"""
+    use_sqlite()
+    alice, bob = add_user('alice'), add_user('bob')
+    ledger.record(alice, ledger.TOPUP, 10)
+    ledger.record(bob, ledger.TOPUP, 10)
+
+    assert ledger.rollup(user_id=alice) == 1
+    assert stored_balance(alice) == 110 and stored_balance(bob) == 100
+    assert ledger.live_balance(bob) == 110
+    print("✅ Single-user rollup")
+
+
+class FakeTree:
+    """A Treeview holding inserted rows"""
+    def __init__(self):
+        self.rows = []
+
+    def get_children(self):
+        return []
+
+    def insert(self, parent, index, values):
+        self.rows.append(values)
+
+
+def test_user_lists_show_live_balance():
+    """The admin's user lists include the unrolled tail, like the PC overview"""
+    use_sqlite()
+    user_id = add_user('alice')
+    db.execute("UPDATE users SET is_approved = FALSE WHERE user_id = %s", (user_id,))
+    ledger.record(user_id, ledger.TOPUP, 50, reference='admin')
+    ledger.record(user_id, ledger.SESSION_CHARGE, -2.5, 'PC-01')
+
+    panel = AdminApp.__new__(AdminApp)
+    panel.users_tree, panel.pending_tree = FakeTree(), FakeTree()
+    panel.load_all_users("All", primary=True)
+    panel.load_pending_accounts()
+
+    assert [row[4] for row in panel.users_tree.rows + panel.pending_tree.rows] == ["₱147.50"] * 2
+    assert stored_balance(user_id) == 100
+    print("✅ User lists show live balances")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Balance Ledger...")
+    print("=" * 50)
+
+    test_live_balance_is_snapshot_plus_tail()
+    test_rollup_folds_tail_into_users()
+    test_rollup_of_one_user()
+    test_user_lists_show_live_balance()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
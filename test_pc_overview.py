@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the single-query PC overview
+"""
+
+import time
+
+import db
+import ledger
+import pc_overview
+import query_stats
+import tariff
+from admin_panel import AdminApp
+from test_station_grid import make_grid
+from test_storage import use_sqlite, log_in
+
+
+def test_overview_is_one_query():
+    """PCs, users, time left and the summary come from one statement"""
+    use_sqlite()
+    log_in('alice', 'PC-01', balance=30, minutes_ago=10, charged_minutes_ago=0)
+    log_in('bob', 'PC-02', balance=500, minutes_ago=100, charged_minutes_ago=0)
+    db.execute("UPDATE pc_units SET status = 'Maintenance' WHERE unit_name = 'PC-03'")
+    tariff.current()  # compiled rules are cached across refreshes
+
+    query_stats.stats.reset()
+    data = AdminApp.load_pc_overview_data(None)
+    statements = sum(row['count'] for row in query_stats.stats.snapshot())
+
+    pcs = {pc['unit_name']: pc for pc in data['pc_units']}
+    assert statements == 1
+    assert pcs['PC-01']['username'] == 'alice' and pcs['PC-01']['elapsed_minutes'] == 10
+    assert pcs['PC-01']['remaining_minutes'] in (29, 30)   # balance runs out before the time limit
+    assert pcs['PC-02']['remaining_minutes'] in (19, 20)   # time limit first
+    assert pcs['PC-04']['username'] is None and pcs['PC-04']['remaining_minutes'] is None
+    counts = {row['status']: row['count'] for row in data['status_counts']}
+    assert counts == {'Available': len(pcs) - 3, 'Maintenance': 1, 'Occupied': 2}
+    print("✅ Overview loaded in one round trip")
+
+
+class FakeLabel:
+    """Records what a card patch does to a label"""
+    def __init__(self):
+        self.options = {}
+        self.updates = 0
+
+    def config(self, **options):
+        self.options.update(options)
+        self.updates += 1
+
+
+def test_cards_patch_in_place():
+    """A poll patches changed labels; countdowns advance on the local clock"""
+    use_sqlite()
+    alice, _ = log_in('alice', 'PC-01', balance=30, minutes_ago=10, charged_minutes_ago=0)
+    panel = AdminApp.__new__(AdminApp)
+    panel.danger_color, panel.warning_color, panel.text_secondary = 'red', 'orange', 'grey'
+    pc = next(pc for pc in pc_overview.load() if pc['unit_name'] == 'PC-01')
+    card = {'frame': None, 'pc_data': pc, 'read_at': time.monotonic(),
+            'user_label': FakeLabel(), 'time_label': FakeLabel(), 'remaining_label': FakeLabel()}
+    panel.update_admin_pc_countdown(card)
+    assert card['time_label'].options['text'] == "Used: 00:10"
+
+    ledger.record(alice, ledger.TOPUP, 30, reference='admin')
+    fresh = next(pc for pc in pc_overview.load() if pc['unit_name'] == 'PC-01')
+    assert panel.patch_admin_pc_card(card, fresh, None) is card
+    assert card['user_label'].options['text'] == "User: alice · ₱60.00"
+    assert card['time_label'].updates == 1 and card['remaining_label'].updates == 2
+
+    card['read_at'] -= 60
+    panel.update_admin_pc_countdown(card)
+    assert card['time_label'].options['text'] == "Used: 00:11"
+    print("✅ Cards patched in place between polls")
+
+
+class FakeExecutor:
+    """Holds submitted polls until the test completes them"""
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args, on_success=None, on_error=None):
+        self.submitted.append(lambda: on_success(fn(*args)))
+
+
+class FakeRoot:
+    def after(self, ms, callback):
+        return 'after#1'
+
+
+def test_stale_polls_are_dropped():
+    """A poll from a replaced grid is ignored, and a write never starts a second poll"""
+    use_sqlite()
+    panel = AdminApp.__new__(AdminApp)
+    panel.root, panel.db_executor = FakeRoot(), FakeExecutor()
+    panel.admin_pc_frames_data, panel.admin_pc_rows, panel.admin_pc_version = {}, {}, 0
+    panel.admin_pc_tick_id, panel.admin_pc_summary_label = 'after#1', None
+    panel.admin_pc_poll_pending, panel.admin_pc_poll_requested = False, False
+    panel.admin_pc_next_poll = panel.admin_pc_next_resync = time.monotonic() + 60
+    old_grid, new_grid = make_grid(), make_grid()
+    old_grid.winfo_exists = new_grid.winfo_exists = lambda: True
+
+    panel.admin_pc_grid = old_grid
+    panel.request_admin_pc_poll()
+    panel.tick_admin_pc_cards(old_grid, None)
+    panel.request_admin_pc_poll()   # e.g. a force logout while the first poll is in flight
+    panel.tick_admin_pc_cards(old_grid, None)
+    assert len(panel.db_executor.submitted) == 1 and panel.admin_pc_poll_requested
+
+    panel.admin_pc_grid = new_grid   # the overview was rebuilt meanwhile
+    panel.db_executor.submitted.pop()()
+    assert not panel.admin_pc_poll_pending and panel.admin_pc_version == 0 and new_grid.all_items == []
+
+    log_in('alice', 'PC-02')
+    panel.tick_admin_pc_cards(new_grid, None)   # the requested poll runs once the stale one is back
+    panel.db_executor.submitted.pop()()
+    assert [pc['unit_name'] for pc in new_grid.all_items] == ['PC-02'] and panel.admin_pc_version > 0
+    print("✅ Stale and overlapping polls avoided")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing PC Overview...")
+    print("=" * 50)
+
+    test_overview_is_one_query()
+    test_cards_patch_in_place()
+    test_stale_polls_are_dropped()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the per-connection prepared statement cache
+"""
+
+from mysql.connector import errors
+
+import db
+import prepared
+from test_storage import use_sqlite
+
+
+class FakePreparedCursor:
+    """Stand-in for MySQLCursorPrepared that records what it was asked to run"""
+
+    column_names = ('status',)
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.executed = None
+        self.rowcount = 1
+
+    def execute(self, sql, params):
+        if self.conn.fail_next:
+            self.conn.fail_next = False
+            raise errors.DatabaseError(msg="Unknown prepared statement handler",
+                                       errno=prepared.ER_UNKNOWN_STMT_HANDLER)
+        if sql is not self.executed:
+            self.conn.prepares += 1  # mysql.connector re-prepares on a new string object
+            self.executed = sql
+
+    def fetchall(self):
+        return [('Available',)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connection_id = 1
+        self.prepares = 0
+        self.fail_next = False
+
+    def cursor(self, prepared=False):
+        return FakePreparedCursor(self)
+
+
+def test_statements_prepared_once_per_connection():
+    """Equal SQL text from different call sites reuses one handle"""
+    conn = FakeConnection()
+    sql = "SELECT status FROM pc_units WHERE unit_name = %s"
+
+    for i in range(5):
+        columns, rows = prepared.run(conn, "".join(sql), (f'PC-{i:02d}',))
+
+    assert rows == [('Available',)]
+    assert conn.prepares == 1
+    assert len(prepared.statement_cache(conn)) == 1
+    print("✅ Statements prepared once per connection")
+
+
+def test_reprepared_after_reconnect():
+    """A new server connection id or a lost handle drops the cache"""
+    conn = FakeConnection()
+    sql = "SELECT status FROM pc_units WHERE unit_name = %s"
+    prepared.run(conn, sql, ('PC-01',))
+
+    conn.connection_id = 2  # reconnected in place
+    prepared.run(conn, sql, ('PC-01',))
+    assert conn.prepares == 2
+
+    conn.fail_next = True
+    prepared.run(conn, sql, ('PC-01',))
+    assert conn.prepares == 3
+    print("✅ Statements re-prepared after reconnect")
+
+
+def test_prepared_helpers_on_sqlite():
+    """fetchone/execute behave like the db helpers and join transactions"""
+    use_sqlite()
+
+    pc = prepared.fetchone("SELECT status, is_locked FROM pc_units WHERE unit_name = %s", ('PC-01',))
+    assert pc['status'] == 'Available'
+
+    try:
+        with db.transaction():
+            prepared.execute("UPDATE pc_units SET status = 'Maintenance' WHERE unit_name = %s", ('PC-01',))
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    assert prepared.fetchone("SELECT status FROM pc_units WHERE unit_name = %s",
+                             ('PC-01',), dictionary=False) == ('Available',)
+    print("✅ Prepared helpers work on SQLite")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Prepared Statements...")
+    print("=" * 50)
+
+    test_statements_prepared_once_per_connection()
+    test_reprepared_after_reconnect()
+    test_prepared_helpers_on_sqlite()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the end-of-day billing reconciliation
+"""
+
+import csv
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import billing_service
+import db
+import reconcile
+from main import CafeSystemApp
+from test_storage import use_sqlite, log_in
+
+
+def log_out(pc_name, user_id):
+    db.run_in_transaction(lambda tx: CafeSystemApp.close_session(None, tx, pc_name, user_id))
+
+
+def test_discrepancies_classified():
+    """Correct sessions pass; short, capped and inconsistent ones are reported"""
+    use_sqlite()
+    exact, _ = log_in('exact', 'PC-01', charged_minutes_ago=10)
+    short, short_session = log_in('short', 'PC-02', charged_minutes_ago=1)  # 9 minutes never charged
+    broke, broke_session = log_in('broke', 'PC-03', balance=2, charged_minutes_ago=10)
+    edited, edited_session = log_in('edited', 'PC-04', charged_minutes_ago=10)
+    log_out('PC-01', exact)
+    log_out('PC-02', short)
+    db.run_in_transaction(billing_service.expire_session, 'PC-03', broke)
+    log_out('PC-04', edited)
+    db.execute("UPDATE sessions SET amount_charged = amount_charged + 5 WHERE session_id = %s", (edited_session,))
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    summary, discrepancies = reconcile.reconcile(today - timedelta(days=1), today + timedelta(days=1))
+
+    reasons = {row['session_id']: row['reason'] for row in discrepancies}
+    assert summary['sessions'] == 4
+    assert reasons == {short_session: 'undercharged', broke_session: 'balance_exhausted',
+                       edited_session: 'ledger_mismatch'}
+    print("✅ Discrepancies found and classified")
+
+    path = os.path.join(tempfile.mkdtemp(), 'report.csv')
+    reconcile.write_report(path, discrepancies)
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 3 and list(rows[0]) == reconcile.REPORT_COLUMNS
+    print("✅ Discrepancy report written")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Billing Reconciliation...")
+    print("=" * 50)
+
+    test_discrepancies_classified()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
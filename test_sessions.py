@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the session history table on the SQLite backend
+"""
+
+import billing_service
+import db
+import sessions
+from main import CafeSystemApp
+from test_storage import use_sqlite, log_in, ago, close_to, balance_of
+
+
+def test_billing_updates_open_session():
+    """Kiosk and service charges both accumulate on the session row"""
+    use_sqlite()
+    alice, alice_session = log_in('alice', 'PC-01', charged_minutes_ago=2)
+    bob, bob_session = log_in('bob', 'PC-02', charged_minutes_ago=3)
+
+    billing_service.charge_session('PC-01', alice)
+    billing_service.run_tick()
+
+    assert close_to(sessions.get(alice_session)['amount_charged'], 2)
+    assert close_to(sessions.get(bob_session)['amount_charged'], 3)
+    assert sessions.get(bob_session)['ended_at'] is None
+    print("✅ Billing charges recorded on the open session")
+
+
+def test_logout_closes_session():
+    """Logout settles the last interval and leaves a closed row for the summary"""
+    use_sqlite()
+    user_id, session_id = log_in('alice', 'PC-01', charged_minutes_ago=1)
+
+    closed = db.run_in_transaction(lambda tx: CafeSystemApp.close_session(None, tx, 'PC-01', user_id))
+
+    session = sessions.get(closed)
+    assert closed == session_id and session['end_reason'] == sessions.LOGOUT
+    assert close_to(session['amount_charged'], 1) and close_to(session['final_balance'], 99)
+    assert int((session['ended_at'] - session['started_at']).total_seconds() / 60) == 10
+    pc = db.fetchone("SELECT status, current_session_id FROM pc_units WHERE unit_name = 'PC-01'")
+    assert pc['status'] == 'Available' and pc['current_session_id'] is None
+    print("✅ Logout closes the session record")
+
+
+def test_expiry_and_force_logout_reasons():
+    """Sessions ended by the service or an admin record why"""
+    use_sqlite()
+    _, broke_session = log_in('broke', 'PC-01', balance=0.5)
+    _, kicked_session = log_in('kicked', 'PC-02')
+
+    billing_service.run_tick()
+    with db.transaction() as tx:
+        billing_service.end_session(tx, 'PC-02', sessions.FORCE_LOGOUT)
+
+    assert sessions.get(broke_session)['end_reason'] == sessions.NO_BALANCE
+    assert sessions.get(kicked_session)['end_reason'] == sessions.FORCE_LOGOUT
+
+    usage = {row['unit_name']: row for row in sessions.usage_by_pc(ago(60))}
+    assert usage['PC-02']['sessions'] == 1 and usage['PC-02']['minutes'] == 10
+    print("✅ End reasons recorded and reported")
+
+
+def test_force_logout_settles_interval():
+    """A forced logout bills the minutes since the last charge before closing the session"""
+    use_sqlite()
+    user_id, session_id = log_in('kicked', 'PC-03', charged_minutes_ago=4)
+
+    with db.transaction() as tx:
+        closed = billing_service.end_session(tx, 'PC-03', sessions.FORCE_LOGOUT)
+
+    session = sessions.get(closed)
+    assert closed == session_id and session['end_reason'] == sessions.FORCE_LOGOUT
+    assert close_to(session['amount_charged'], 4) and close_to(balance_of(user_id), 96)
+    assert close_to(session['final_balance'], 96)
+    print("✅ Forced logout settled the last interval")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Session History...")
+    print("=" * 50)
+
+    test_billing_updates_open_session()
+    test_logout_closes_session()
+    test_expiry_and_force_logout_reasons()
+    test_force_logout_settles_interval()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the billing simulator
+"""
+
+import db
+import simulate
+from test_storage import use_sqlite, close_to
+
+
+def test_simulation_bills_close_to_ideal():
+    """A short run logs stations in, bills them and cleans up"""
+    use_sqlite()
+    simulation = simulate.Simulation(5, seed=3)
+    simulation.setup()
+    try:
+        wall, statements = simulation.run(5)
+        charged, ideal, session_count, overrun = simulation.billing_error()
+
+        assert simulation.events['logins'] == session_count > 0
+        assert len(simulation.kiosk_ticks_ms) > 0 and statements > 0
+        assert close_to(charged, ideal, 0.05)
+        assert all(not station.occupied for station in simulation.stations)
+    finally:
+        simulation.teardown()
+    assert db.fetchone("SELECT COUNT(*) AS n FROM pc_units WHERE unit_name LIKE 'SIM-%'")['n'] == 0
+    print("✅ Simulated sessions billed and torn down")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Billing Simulator...")
+    print("=" * 50)
+
+    test_simulation_bills_close_to_ideal()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
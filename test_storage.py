@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the SQLite storage backend runs the app's MySQL SQL
+"""
+
+from datetime import datetime, timedelta
+
+from mysql.connector import Error
+
+import db
+import ledger
+import migrations
+import sessions
+import storage
+
+
+def use_sqlite():
+    """Point the shared pool at a fresh, fully migrated in-memory database"""
+    db.configure(storage.SQLiteBackend(':memory:'))
+    migrations.migrate()
+
+
+def ago(minutes):
+    return (datetime.now() - timedelta(minutes=minutes)).replace(microsecond=0)
+
+
+def close_to(a, b, tolerance=0.02):
+    return abs(float(a) - float(b)) <= tolerance  # a second either way at ₱60/hour
+
+
+def add_user(username='alice', balance=100, rate=60, time_limit=120):
+    """An approved user; returns the user_id"""
+    db.execute("""
+        INSERT INTO users (username, password, full_name, account_balance, hourly_rate,
+                           session_time_limit, is_approved)
+        VALUES (%s, 'x', %s, %s, %s, %s, TRUE)
+    """, (username, username, balance, rate, time_limit))
+    return db.fetchone("SELECT user_id FROM users WHERE username = %s", (username,))['user_id']
+
+
+def balance_of(user_id):
+    return float(ledger.live_balance(user_id))
+
+
+def log_in(username, pc_name, balance=100, minutes_ago=10, charged_minutes_ago=1, rate=60, time_limit=120):
+    """Assign a PC the way login does, then backdate the session; returns (user_id, session_id)"""
+    user_id = add_user(username, balance, rate, time_limit)
+    with db.transaction() as tx:
+        tx.execute("""
+            UPDATE pc_units SET status = 'Occupied', current_user_id = %s, session_start = %s, last_charged_at = %s
+            WHERE unit_name = %s
+        """, (user_id, ago(minutes_ago), ago(min(charged_minutes_ago, minutes_ago)), pc_name))
+        session_id = sessions.open_session(tx, user_id, pc_name)
+        tx.execute("UPDATE sessions SET started_at = %s WHERE session_id = %s", (ago(minutes_ago), session_id))
+    return user_id, session_id
+
+
+def test_translate_mysql_dialect():
+    """The MySQL constructs used in the app become valid SQLite"""
+    translate = storage.translate_sql
+
+    assert translate("SELECT * FROM users WHERE user_id = %s") == "SELECT * FROM users WHERE user_id = ?"
+    assert translate("INSERT IGNORE INTO t (a) VALUES (%s)") == "INSERT OR IGNORE INTO t (a) VALUES (?)"
+    assert "ON CONFLICT DO UPDATE SET v = excluded.v" in translate(
+        "INSERT INTO t (k, v) VALUES (%s, %s) ON DUPLICATE KEY UPDATE v = VALUES(v)")
+    assert "INTEGER PRIMARY KEY AUTOINCREMENT" in translate("CREATE TABLE t (id INT AUTO_INCREMENT PRIMARY KEY)")
+    assert "'-7 days'" in translate("SELECT 1 FROM t WHERE d >= DATE_SUB(NOW(), INTERVAL 7 DAY)")
+    print("✅ MySQL dialect translated")
+
+
+def test_migrations_run_on_sqlite():
+    """The full schema and seed data are created, and re-running is a no-op"""
+    use_sqlite()
+
+    assert migrations.migrate() == migrations.latest_version()
+    assert len(db.fetchall("SELECT * FROM pc_units")) == 10
+    assert db.fetchone("SELECT COUNT(*) FROM admins", dictionary=False)[0] == 1
+    print("✅ Migrations run on SQLite")
+
+
+def test_login_billing_logout_flow():
+    """The kiosk's occupy / charge / release statements behave like on MySQL"""
+    use_sqlite()
+    db.execute("""
+        INSERT INTO users (username, password, full_name, account_balance, is_approved)
+        VALUES (%s, %s, %s, %s, TRUE)
+    """, ('alice', 'x', 'Alice', 100))
+    user = db.fetchone("SELECT * FROM users WHERE username = %s", ('alice',))
+
+    assigned = db.execute("""
+        UPDATE pc_units SET status = 'Occupied', current_user_id = %s, session_start = NOW()
+        WHERE unit_name = %s AND status = 'Available'
+    """, (user['user_id'], 'PC-01'))
+    session = db.fetchone("""
+        SELECT pc.session_start, u.hourly_rate, u.account_balance
+        FROM pc_units pc JOIN users u ON pc.current_user_id = u.user_id
+        WHERE pc.unit_name = %s AND pc.current_user_id = %s
+    """, ('PC-01', user['user_id']))
+
+    assert assigned == 1
+    assert session['session_start'].year >= 2024  # timestamps come back as datetimes
+    assert float(session['account_balance']) == 100.0
+
+    db.execute("UPDATE users SET account_balance = account_balance - %s WHERE user_id = %s",
+               (float(session['hourly_rate']) / 60, user['user_id']))
+    db.execute("""
+        UPDATE pc_units SET status = 'Available', current_user_id = NULL, session_start = NULL
+        WHERE unit_name = %s
+    """, ('PC-01',))
+
+    balance = db.fetchone("SELECT account_balance FROM users WHERE user_id = %s", (user['user_id'],))
+    assert abs(float(balance['account_balance']) - (100 - 20 / 60)) < 1e-6
+    print("✅ Login, billing and logout work on SQLite")
+
+
+def test_errors_use_mysql_connector_types():
+    """Existing `except Error` handlers keep working on SQLite"""
+    use_sqlite()
+    try:
+        db.execute("INSERT INTO pc_units (unit_name) VALUES (%s)", ('PC-01',))
+        assert False, "duplicate unit_name should fail"
+    except Error as e:
+        assert e.errno == storage.ER_DUP_ENTRY
+    print("✅ SQLite errors raised as mysql.connector errors")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Storage Backends...")
+    print("=" * 50)
+
+    test_translate_mysql_dialect()
+    test_migrations_run_on_sqlite()
+    test_login_billing_logout_flow()
+    test_errors_use_mysql_connector_types()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the tariff engine and tariff-priced billing
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import billing_service
+import db
+import ledger
+import tariff
+from test_storage import use_sqlite, log_in, close_to
+
+MONDAY_9PM = datetime(2024, 1, 1, 21, 0, 0)
+PEAK = {'period_id': 1, 'name': 'Peak', 'days': '1111100', 'start_minute': 17 * 60, 'end_minute': 22 * 60,
+        'rate_multiplier': 1.5, 'package_rate': None, 'priority': 1}
+NIGHT = {'period_id': 2, 'name': 'Night package', 'days': '1111111', 'start_minute': 22 * 60,
+         'end_minute': 6 * 60, 'rate_multiplier': 1, 'package_rate': 30, 'priority': 0}
+
+
+def test_flat_tariff_prices_like_hourly_rate():
+    """Without rules a range costs hourly_rate * seconds / 3600"""
+    flat = tariff.Tariff()
+    start = datetime(2024, 1, 7, 23, 59, 30)  # crosses the week boundary
+    assert flat.is_flat
+    assert flat.price(60, 'standard', start, start + timedelta(seconds=90)) == Decimal('1.5')
+    assert close_to(flat.price(45, 'standard', start, start + timedelta(weeks=2, minutes=20)), 45 * (336 + 1 / 3))
+    assert flat.affordable_until(60, 'standard', start, 10) == start + timedelta(minutes=10)
+    print("✅ Flat tariff matches the hourly rate")
+
+
+def test_periods_and_tiers():
+    """Peak multipliers, night packages and tier surcharges segment a range"""
+    rates = tariff.Tariff([PEAK, NIGHT], {'standard': 0, 'gaming': 12}, {'PC-01': 'gaming'})
+    end = MONDAY_9PM + timedelta(hours=2)
+
+    assert rates.price(60, 'standard', MONDAY_9PM, end) == 120    # 1h peak ₱90 + 1h night ₱30
+    assert rates.price(60, rates.tier_of('PC-01'), MONDAY_9PM, end) == 144
+    assert rates.hourly_rate_at(60, 'standard', MONDAY_9PM + timedelta(hours=3)) == 30
+    assert rates.affordable_until(60, 'standard', MONDAY_9PM, 120) == end
+    assert not rates.is_flat_for('PC-02')
+    print("✅ Periods and tiers priced")
+
+
+def test_batch_matches_single_prices():
+    """price_batch agrees with price for every range"""
+    rates = tariff.Tariff([PEAK, NIGHT], {'gaming': 12})
+    starts = [MONDAY_9PM + timedelta(minutes=37 * i, seconds=11 * i) for i in range(50)]
+    ends = [start + timedelta(minutes=7 * i, seconds=5) for i, start in enumerate(starts)]
+    tiers = ['gaming' if i % 3 else 'standard' for i in range(50)]
+    batch = rates.price_batch([40 + i for i in range(50)], tiers, starts, ends)
+
+    for i in range(50):
+        assert close_to(batch[i], rates.price(40 + i, tiers[i], starts[i], ends[i]), 1e-6)
+    print("✅ Batch pricing matches single ranges")
+
+
+def test_bundle_covers_window_first():
+    """A night bundle covers only its window, earliest seconds first"""
+    rates = tariff.Tariff([PEAK, NIGHT])
+    bundle = {'bundle_id': 7, 'seconds_total': 3600, 'seconds_used': 1800, 'expires_at': None,
+              'window_start': 22 * 60, 'window_end': 6 * 60}
+
+    amount, used = rates.price_with_bundles(60, 'standard', MONDAY_9PM, MONDAY_9PM + timedelta(hours=2), [bundle])
+
+    assert amount == 105 and used == (7, 1800)  # ₱90 peak + ₱15 for the uncovered half hour of night
+    print("✅ Bundle time applied before money")
+
+
+def test_service_charges_by_tariff():
+    """The billing tick prices sessions with tiers and consumes bundles"""
+    use_sqlite()
+    try:
+        db.execute("INSERT INTO pc_tiers (tier, surcharge_per_hour) VALUES ('gaming', 30)")
+        db.execute("UPDATE pc_units SET tier = 'gaming' WHERE unit_name = 'PC-01'")
+        tariff.invalidate()
+        gamer, _ = log_in('gamer', 'PC-01', minutes_ago=10, charged_minutes_ago=2)
+        bundled, _ = log_in('bundled', 'PC-02', minutes_ago=10, charged_minutes_ago=2)
+        tariff.buy_bundle(bundled, '1 hour', 60, price=50)
+
+        billing_service.run_tick()
+
+        assert close_to(ledger.live_balance(gamer), 97)     # 2 minutes at ₱60 + ₱30
+        assert close_to(ledger.live_balance(bundled), 50)   # only the bundle price
+        used = db.fetchone("SELECT seconds_used FROM user_bundles WHERE user_id = %s", (bundled,))
+        assert abs(used['seconds_used'] - 120) <= 1
+        print("✅ Service charges follow the tariff")
+    finally:
+        tariff.invalidate()
+
+
+def test_kiosk_charge_sees_new_bundle_and_tier():
+    """A bundle sold or a tier changed on another station is charged before this kiosk's tariff reloads"""
+    use_sqlite()
+    try:
+        bundled, _ = log_in('bundled', 'PC-01', minutes_ago=10, charged_minutes_ago=2)
+        gamer, _ = log_in('gamer', 'PC-02', minutes_ago=10, charged_minutes_ago=2)
+        db.execute("INSERT INTO pc_tiers (tier, surcharge_per_hour) VALUES ('gaming', 30)")
+        tariff.invalidate()
+        tariff.current()  # cached before the other station's changes
+        db.execute("INSERT INTO user_bundles (user_id, name, seconds_total) VALUES (%s, '1 hour', 3600)",
+                   (bundled,))
+        db.execute("UPDATE pc_units SET tier = 'gaming' WHERE unit_name = 'PC-02'")
+
+        billing_service.charge_session('PC-01', bundled)
+        billing_service.charge_session('PC-02', gamer)
+
+        assert close_to(ledger.live_balance(bundled), 100)  # covered by the bundle
+        assert close_to(ledger.live_balance(gamer), 97)     # 2 minutes at ₱60 + ₱30
+        used = db.fetchone("SELECT seconds_used FROM user_bundles WHERE user_id = %s", (bundled,))
+        assert abs(used['seconds_used'] - 120) <= 1
+
+        bundle_id = tariff.buy_bundle(gamer, 'Day pass', 60, price=0, valid_hours=2)
+        bundle = db.fetchone("SELECT expires_at, NOW() AS db_now FROM user_bundles WHERE bundle_id = %s",
+                             (bundle_id,))
+        expires_in = billing_service.to_datetime(bundle['expires_at']) - billing_service.to_datetime(bundle['db_now'])
+        assert abs(expires_in.total_seconds() - 2 * 3600) <= 2  # on the database clock
+        print("✅ Kiosk charges read bundles and tiers at charge time")
+    finally:
+        tariff.invalidate()
+
+if __name__ == "__main__":
+    print("🔧 Testing Tariff Engine...")
+    print("=" * 50)
+
+    test_flat_tariff_prices_like_hourly_rate()
+    test_periods_and_tiers()
+    test_batch_matches_single_prices()
+    test_bundle_covers_window_first()
+    test_service_charges_by_tariff()
+    test_kiosk_charge_sees_new_bundle_and_tier()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
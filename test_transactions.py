@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script to verify unit-of-work transactions, savepoints and deadlock retry
+"""
+
+from mysql.connector import errors
+
+import db
+from test_storage import use_sqlite, add_user, balance_of
+
+
+def test_commit_and_rollback():
+    """Statements commit together, and an exception undoes all of them"""
+    use_sqlite()
+    user_id = add_user()
+
+    with db.transaction() as tx:
+        tx.execute("UPDATE users SET account_balance = account_balance - 10 WHERE user_id = %s", (user_id,))
+        db.execute("UPDATE users SET account_balance = account_balance - 5 WHERE user_id = %s", (user_id,))
+    assert balance_of(user_id) == 85.0
+
+    try:
+        with db.transaction() as tx:
+            tx.execute("UPDATE users SET account_balance = 0 WHERE user_id = %s", (user_id,))
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    assert balance_of(user_id) == 85.0
+    print("✅ Transactions commit once and roll back on error")
+
+
+def test_nested_transaction_is_a_savepoint():
+    """A failing inner block is undone without losing the outer work"""
+    use_sqlite()
+    user_id = add_user()
+
+    with db.transaction() as tx:
+        tx.execute("UPDATE users SET account_balance = 50 WHERE user_id = %s", (user_id,))
+        try:
+            with db.transaction():
+                db.execute("UPDATE users SET account_balance = 0 WHERE user_id = %s", (user_id,))
+                raise RuntimeError("inner abort")
+        except RuntimeError:
+            pass
+        assert tx.fetchone("SELECT account_balance FROM users WHERE user_id = %s",
+                           (user_id,))['account_balance'] == 50
+
+    assert balance_of(user_id) == 50.0
+    print("✅ Nested transactions roll back to their savepoint")
+
+
+def test_deadlock_is_retried():
+    """The whole unit of work re-runs after a deadlock, other errors propagate"""
+    use_sqlite()
+    user_id = add_user()
+    attempts = []
+
+    def charge(tx):
+        attempts.append(1)
+        tx.execute("UPDATE users SET account_balance = account_balance - 1 WHERE user_id = %s", (user_id,))
+        if len(attempts) < 3:
+            raise errors.InternalError(msg="Deadlock found", errno=db.ER_LOCK_DEADLOCK)
+        return 'charged'
+
+    assert db.run_in_transaction(charge) == 'charged'
+    assert len(attempts) == 3
+    assert balance_of(user_id) == 99.0  # the two failed attempts left no trace
+
+    try:
+        db.run_in_transaction(lambda tx: tx.execute("INSERT INTO pc_units (unit_name) VALUES ('PC-01')"))
+        assert False, "duplicate unit_name should fail"
+    except errors.IntegrityError:
+        pass
+    print("✅ Deadlocked units of work retried")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Transactions...")
+    print("=" * 50)
+
+    test_commit_and_rollback()
+    test_nested_transaction_is_a_savepoint()
+    test_deadlock_is_retried()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the home screen reads off the Tk thread on the SQLite backend
+"""
+
+from test_pc_overview import FakeExecutor, FakeLabel
+from test_storage import use_sqlite, log_in
+from user_home import HomeFrame
+
+
+class FakeApp:
+    text_secondary, accent_color = 'grey', 'green'
+
+    def __init__(self, user_id, pc_name):
+        self.db_executor = FakeExecutor()
+        self.current_user = {'user_id': user_id}
+        self.selected_pc = pc_name
+
+
+def make_home(app):
+    home = HomeFrame.__new__(HomeFrame)
+    home.app = app
+    home.winfo_exists = lambda: True
+    home.balance_label, home.rate_label, home.order_count_label = FakeLabel(), FakeLabel(), FakeLabel()
+    home.session_time_label, home.remaining_label = FakeLabel(), FakeLabel()
+    home.session_time_label.cget = lambda option: home.session_time_label.options.get(option, "--:--")
+    return home
+
+
+def test_refresh_runs_on_the_executor():
+    """The 30-second refresh only queues reads; labels change when the results come back"""
+    use_sqlite()
+    user_id, _ = log_in('alice', 'PC-01', minutes_ago=15, charged_minutes_ago=0)
+    home = make_home(FakeApp(user_id, 'PC-01'))
+
+    home.refresh_session_info()
+    assert len(home.app.db_executor.submitted) == 2 and home.session_time_label.updates == 0
+
+    for complete in home.app.db_executor.submitted:
+        complete()
+    assert home.session_time_label.options['text'] == "00:15"
+    assert home.remaining_label.options['text'] == "Left: 01:45"
+    assert home.balance_label.options['text'] == "₱100.00"
+    print("✅ Session refresh ran on the executor")
+
+
+def test_home_data_loads_on_the_executor():
+    """The rate and order count are read by the worker, then shown"""
+    use_sqlite()
+    user_id, _ = log_in('alice', 'PC-01')
+    home = make_home(FakeApp(user_id, 'PC-01'))
+
+    home.on_home_data_loaded(home.load_home_data(user_id))
+    assert home.rate_label.options['text'] == "Rate: ₱60.00/hour"
+    assert home.order_count_label.options['text'] == "0 orders this week"
+    print("✅ Home data loaded on the executor")
+
+
+if __name__ == "__main__":
+    print("🔧 Testing Home Screen...")
+    print("=" * 50)
+
+    test_refresh_runs_on_the_executor()
+    test_home_data_loads_on_the_executor()
+
+    print("\n" + "=" * 50)
+    print("✅ ALL TESTS PASSED!")
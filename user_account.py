@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from mysql.connector import Error
 import hashlib
+import db
 
 class AccountsFrame(tk.Frame):
     def __init__(self, parent, app):
@@ -297,31 +298,24 @@ class AccountsFrame(tk.Frame):
             return
         
         try:
-            cursor = self.app.db_connection.cursor(dictionary=True)
-            
             # Verify current password
             current_pw_hash = hashlib.sha256(current_pw.encode()).hexdigest()
-            cursor.execute(
+            result = db.fetchone(
                 "SELECT password FROM users WHERE user_id = %s",
                 (self.app.current_user['user_id'],)
             )
-            result = cursor.fetchone()
             
             if not result or result['password'] != current_pw_hash:
                 messagebox.showerror("Error", "Current password is incorrect")
-                cursor.close()
                 return
             
             # Update password
             new_pw_hash = hashlib.sha256(new_pw.encode()).hexdigest()
-            cursor.execute(
+            db.execute(
                 "UPDATE users SET password = %s WHERE user_id = %s",
                 (new_pw_hash, self.app.current_user['user_id'])
             )
             
-            self.app.db_connection.commit()
-            cursor.close()
-            
             messagebox.showinfo("Success", "Password changed successfully!")
             
             # Clear entries
@@ -331,13 +325,11 @@ class AccountsFrame(tk.Frame):
             
         except Error as e:
             messagebox.showerror("Database Error", f"Error changing password: {e}")
-            self.app.db_connection.rollback()
     
     def load_order_history(self, parent_frame):
         """Load user's order history"""
         try:
-            cursor = self.app.db_connection.cursor(dictionary=True)
-            cursor.execute(
+            orders = db.fetchall(
                 """SELECT item_name, quantity, total_price, order_date, order_status
                    FROM orders
                    WHERE user_id = %s
@@ -346,9 +338,6 @@ class AccountsFrame(tk.Frame):
                 (self.app.current_user['user_id'],)
             )
             
-            orders = cursor.fetchall()
-            cursor.close()
-            
             if not orders:
                 tk.Label(parent_frame, text="No orders yet\n\nStart ordering from the cafe!",
                         font=("Segoe UI", 11), bg=self.app.secondary_bg,
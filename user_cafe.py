@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from mysql.connector import Error
 import os
+import db
 from PIL import Image, ImageTk
 
 class CafeFrame(tk.Frame):
@@ -202,27 +203,30 @@ class CafeFrame(tk.Frame):
         for widget in self.menu_items_frame.winfo_children():
             widget.destroy()
         
-        try:
-            cursor = self.app.db_connection.cursor(dictionary=True)
-            cursor.execute(
-                "SELECT * FROM cafe_items WHERE category = %s AND available = TRUE ORDER BY item_name",
-                (category,)
-            )
-            items = cursor.fetchall()
-            cursor.close()
-            
-            if not items:
-                tk.Label(self.menu_items_frame, 
-                        text=f"No {category.lower()} items available",
-                        font=("Segoe UI", 12), bg=self.app.bg_color,
-                        fg=self.app.text_secondary).pack(pady=50)
-                return
-            
-            for idx, item in enumerate(items):
-                self.create_menu_item_card(item, idx)
-                
-        except Error as e:
-            messagebox.showerror("Database Error", f"Error loading menu: {e}")
+        # Only the most recent category click gets rendered
+        self.menu_request = category
+        self.app.db_executor.submit(
+            db.fetchall,
+            "SELECT * FROM cafe_items WHERE category = %s AND available = TRUE ORDER BY item_name",
+            (category,),
+            on_success=lambda items: self.show_menu_items(category, items),
+            on_error=lambda e: messagebox.showerror("Database Error", f"Error loading menu: {e}")
+        )
+    
+    def show_menu_items(self, category, items):
+        """Render menu cards once load_menu_items has fetched them"""
+        if self.menu_request != category or not self.menu_items_frame.winfo_exists():
+            return
+        
+        if not items:
+            tk.Label(self.menu_items_frame, 
+                    text=f"No {category.lower()} items available",
+                    font=("Segoe UI", 12), bg=self.app.bg_color,
+                    fg=self.app.text_secondary).pack(pady=50)
+            return
+        
+        for idx, item in enumerate(items):
+            self.create_menu_item_card(item, idx)
     
     def create_menu_item_card(self, item, index):
         """Create a menu item card with image"""
@@ -409,16 +413,6 @@ class CafeFrame(tk.Frame):
         
         print(f"✓ Cart has {len(self.cart)} items")
         
-        # Check database connection
-        try:
-            if not self.app.db_connection.is_connected():
-                print("✗ Database not connected - reconnecting...")
-                self.app.setup_database()
-        except:
-            print("✗ Database connection error")
-            messagebox.showerror("Connection Error", "Database connection lost. Please restart the application.")
-            return
-        
         total = sum(item['price'] * item['quantity'] for item in self.cart)
         order_type_msg = self.order_type.get()
         
@@ -445,16 +439,17 @@ class CafeFrame(tk.Frame):
         print("\nSaving orders to database...")
         
         try:
-            cursor = self.app.db_connection.cursor()
-            order_count = 0
-            
-            # Insert each cart item as a separate order
+            user_id = self.app.current_user['user_id']
+            rows = []
             for item in self.cart:
                 item_total = item['price'] * item['quantity']
-                
                 print(f"  Inserting: {item['item_name']} x{item['quantity']} = ₱{item_total:.2f}")
-                
-                cursor.execute(
+                rows.append((user_id, item['item_name'], item['quantity'], item['price'],
+                             item_total, "Pending", order_type_msg))
+            
+            # One transaction: either the whole cart is ordered or none of it
+            with db.transaction() as tx:
+                tx.executemany(
                     """
                     INSERT INTO orders (
                         user_id,
@@ -467,21 +462,9 @@ class CafeFrame(tk.Frame):
                     )
                     VALUES (%s, %s, %s, %s, %s, %s, %s)
                     """,
-                    (
-                        self.app.current_user['user_id'],
-                        item['item_name'],
-                        item['quantity'],
-                        item['price'],
-                        item_total,
-                        "Pending",
-                        order_type_msg
-                    )
-
+                    rows
                 )
-                order_count += 1
-            
-            self.app.db_connection.commit()
-            cursor.close()
+            order_count = len(rows)
             
             print(f"\n✓✓✓ SUCCESS! {order_count} orders saved to database ✓✓✓")
             print("="*50 + "\n")
@@ -505,10 +488,6 @@ class CafeFrame(tk.Frame):
             print(f"Error: {str(e)}")
             print("="*50 + "\n")
             messagebox.showerror("Error", f"Failed to save order:\n\n{str(e)}\n\nPlease try again.")
-            try:
-                self.app.db_connection.rollback()
-            except:
-                pass
     
     def view_my_orders(self):
         """View user's order history with detailed information"""
@@ -587,10 +566,8 @@ class CafeFrame(tk.Frame):
                 orders_tree.delete(item)
             
             try:
-                cursor = self.app.db_connection.cursor(dictionary=True)
-                
                 if status_filter == "All":
-                    cursor.execute("""
+                    orders = db.fetchall("""
                         SELECT order_id, item_name, quantity, price, total_price, 
                                order_type, order_status, order_date
                         FROM orders
@@ -598,7 +575,7 @@ class CafeFrame(tk.Frame):
                         ORDER BY order_date DESC
                     """, (self.app.current_user['user_id'],))
                 else:
-                    cursor.execute("""
+                    orders = db.fetchall("""
                         SELECT order_id, item_name, quantity, price, total_price, 
                                order_type, order_status, order_date
                         FROM orders
@@ -606,9 +583,6 @@ class CafeFrame(tk.Frame):
                         ORDER BY order_date DESC
                     """, (self.app.current_user['user_id'], status_filter))
 
-                orders = cursor.fetchall()
-                cursor.close()
-
                 if not orders:
                     orders_tree.insert('', tk.END, values=('', 'No orders found for this status', '', '', '', '', '', ''), 
                                        tags=('empty_message',))
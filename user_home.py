@@ -1,6 +1,15 @@
 import tkinter as tk
 from tkinter import ttk
-from mysql.connector import Error
+from datetime import datetime
+import db
+import prepared
+
+SESSION_QUERY = """
+    SELECT pc.session_start, u.session_time_limit
+    FROM pc_units pc
+    JOIN users u ON pc.current_user_id = u.user_id
+    WHERE pc.unit_name = %s AND pc.current_user_id = %s
+"""
 
 class HomeFrame(tk.Frame):
     def __init__(self, parent, app):
@@ -66,18 +75,11 @@ class HomeFrame(tk.Frame):
                                       bg=app.secondary_bg, fg=app.accent_color)
         self.balance_label.pack(anchor='w', pady=(15, 10))
         
-        # Show hourly rate
-        try:
-            cursor = app.db_connection.cursor(dictionary=True)
-            cursor.execute("SELECT hourly_rate FROM users WHERE user_id = %s", (app.current_user['user_id'],))
-            rate_data = cursor.fetchone()
-            cursor.close()
-            hourly_rate = rate_data['hourly_rate'] if rate_data else 20.0
-        except:
-            hourly_rate = 20.0
-        
-        tk.Label(balance_card, text=f"Rate: ₱{hourly_rate:.2f}/hour", font=("Segoe UI", 11),
-                bg=app.secondary_bg, fg=app.text_secondary).pack(anchor='w', pady=(5, 0))
+        # Show hourly rate (the login row's until load_home_data reads the current one)
+        hourly_rate = app.current_user.get('hourly_rate') or 20.0
+        self.rate_label = tk.Label(balance_card, text=f"Rate: ₱{hourly_rate:.2f}/hour", font=("Segoe UI", 11),
+                                   bg=app.secondary_bg, fg=app.text_secondary)
+        self.rate_label.pack(anchor='w', pady=(5, 0))
         
         # Refresh balance button with sage green
         refresh_btn = tk.Button(balance_card, text="↻ Refresh Balance", font=("Segoe UI", 10),
@@ -100,43 +102,14 @@ class HomeFrame(tk.Frame):
         tk.Label(session_header, text="Current Session", font=("Segoe UI", 13),
                 bg=app.secondary_bg, fg=app.text_secondary).pack(side='left')
         
-        # Get session info
-        try:
-            cursor = app.db_connection.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT pc.session_start, u.session_time_limit, u.hourly_rate
-                FROM pc_units pc
-                JOIN users u ON pc.current_user_id = u.user_id
-                WHERE pc.unit_name = %s AND pc.current_user_id = %s
-            """, (app.selected_pc, app.current_user['user_id']))
-            session_data = cursor.fetchone()
-            cursor.close()
-            
-            if session_data and session_data['session_start']:
-                from datetime import datetime
-                duration = datetime.now() - session_data['session_start']
-                elapsed_minutes = int(duration.total_seconds() / 60)
-                remaining_minutes = max(0, session_data['session_time_limit'] - elapsed_minutes)
-                
-                hours, minutes = divmod(elapsed_minutes, 60)
-                rem_hours, rem_mins = divmod(remaining_minutes, 60)
-                
-                self.session_time_label = tk.Label(session_card, text=f"{hours:02d}:{minutes:02d}",
-                                                  font=("Segoe UI", 36, "bold"),
-                                                  bg=app.secondary_bg, fg=app.accent_color)
-                self.session_time_label.pack(anchor='w', pady=(10, 0))
-                
-                time_color = "#FFA726" if remaining_minutes < 30 else app.text_secondary
-                self.remaining_label = tk.Label(session_card, text=f"Left: {rem_hours:02d}:{rem_mins:02d}", 
-                                               font=("Segoe UI", 11),
-                                               bg=app.secondary_bg, fg=time_color)
-                self.remaining_label.pack(anchor='w', pady=(5, 0))
-            else:
-                tk.Label(session_card, text="No Session", font=("Segoe UI", 36, "bold"),
-                        bg=app.secondary_bg, fg=app.text_secondary).pack(anchor='w', pady=(10, 0))
-        except Error:
-            tk.Label(session_card, text="Error", font=("Segoe UI", 36, "bold"),
-                    bg=app.secondary_bg, fg="#e74c3c").pack(anchor='w', pady=(10, 0))
+        # Session info is filled in by refresh_session_info once its read comes back
+        self.session_time_label = tk.Label(session_card, text="--:--", font=("Segoe UI", 36, "bold"),
+                                           bg=app.secondary_bg, fg=app.accent_color)
+        self.session_time_label.pack(anchor='w', pady=(10, 0))
+        
+        self.remaining_label = tk.Label(session_card, text="", font=("Segoe UI", 11),
+                                        bg=app.secondary_bg, fg=app.text_secondary)
+        self.remaining_label.pack(anchor='w', pady=(5, 0))
         
         cards_frame.columnconfigure(0, weight=1)
         cards_frame.columnconfigure(1, weight=1)
@@ -158,23 +131,13 @@ class HomeFrame(tk.Frame):
         spacer = tk.Frame(orders_header, bg=app.secondary_bg)
         spacer.pack(side='left', fill='x', expand=True)
 
-        try:
-            cursor = app.db_connection.cursor()
-            cursor.execute(
-                "SELECT COUNT(*) FROM orders WHERE user_id = %s AND order_date >= DATE_SUB(NOW(), INTERVAL 7 DAY)",
-                (app.current_user['user_id'],)
-            )
-            order_count = cursor.fetchone()[0]
-            cursor.close()
-        except Error:
-            order_count = 0
-
         # Add right padding to account for scrollbar
         count_frame = tk.Frame(orders_header, bg=app.secondary_bg)
         count_frame.pack(side='right', padx=(0, 20))  # Add right padding
 
-        tk.Label(count_frame, text=f"{order_count} orders this week", font=("Segoe UI", 12),
-                bg=app.secondary_bg, fg=app.text_secondary).pack()
+        self.order_count_label = tk.Label(count_frame, text="", font=("Segoe UI", 12),
+                                          bg=app.secondary_bg, fg=app.text_secondary)
+        self.order_count_label.pack()
         
         # Cafe Promotions Section
         promo_frame = tk.Frame(container, bg=app.secondary_bg, padx=40, pady=35, relief='flat', bd=0)
@@ -235,74 +198,107 @@ class HomeFrame(tk.Frame):
             
             promo_container.columnconfigure(idx, weight=1)
         
+        # The rate and order count are read once, off the Tk thread
+        app.db_executor.submit(
+            self.load_home_data, app.current_user['user_id'],
+            on_success=self.on_home_data_loaded,
+            on_error=self.on_home_data_error
+        )
+        
         # Start auto-refresh for real-time updates
         self.start_auto_refresh()
     
+    def load_home_data(self, user_id):
+        """Worker half of the home screen: the current hourly rate and this week's order count"""
+        rate_data = db.fetchone("SELECT hourly_rate FROM users WHERE user_id = %s", (user_id,))
+        order_count = db.fetchone(
+            "SELECT COUNT(*) FROM orders WHERE user_id = %s AND order_date >= DATE_SUB(NOW(), INTERVAL 7 DAY)",
+            (user_id,), dictionary=False
+        )[0]
+        return {'hourly_rate': rate_data['hourly_rate'] if rate_data else 20.0, 'order_count': order_count}
+    
+    def on_home_data_loaded(self, data):
+        if not self.winfo_exists():
+            return
+        self.rate_label.config(text=f"Rate: ₱{data['hourly_rate']:.2f}/hour")
+        self.order_count_label.config(text=f"{data['order_count']} orders this week")
+    
+    def on_home_data_error(self, e):
+        print(f"Error loading home screen data: {e}")
+        if self.winfo_exists():
+            self.order_count_label.config(text="0 orders this week")
+    
     def refresh_balance(self):
-        """Refresh account balance from database"""
-        try:
-            cursor = self.app.db_connection.cursor(dictionary=True)
-            cursor.execute(
-                "SELECT account_balance FROM users WHERE user_id = %s",
-                (self.app.current_user['user_id'],)
-            )
-            result = cursor.fetchone()
-            cursor.close()
-            
-            if result:
-                self.app.current_user['account_balance'] = result['account_balance']
-                self.balance_label.config(text=f"₱{result['account_balance']:.2f}")
-                
-        except Error as e:
-            print(f"Error refreshing balance: {e}")
+        """Refresh account balance from database; the read runs on the database worker"""
+        if not self.app.current_user:
+            return
+        self.app.db_executor.submit(
+            prepared.fetchone, """
+                SELECT u.account_balance + COALESCE((
+                           SELECT SUM(l.amount) FROM balance_ledger l
+                           WHERE l.user_id = u.user_id AND l.rolled_up = FALSE
+                       ), 0) AS account_balance
+                FROM users u
+                WHERE u.user_id = %s
+            """, (self.app.current_user['user_id'],),
+            on_success=self.on_balance_refreshed,
+            on_error=lambda e: print(f"Error refreshing balance: {e}")
+        )
+    
+    def on_balance_refreshed(self, result):
+        # The user logged out or left the screen while the read was in flight
+        if not result or not self.app.current_user or not self.winfo_exists():
+            return
+        self.app.current_user['account_balance'] = result['account_balance']
+        self.balance_label.config(text=f"₱{result['account_balance']:.2f}")
     
     def start_auto_refresh(self):
         """Start auto-refresh for real-time updates"""
+        if not self.winfo_exists() or not self.app.current_user:
+            return  # logged out; the screen is gone
         self.refresh_session_info()
         # Schedule next refresh in 30 seconds
         self.after(30000, self.start_auto_refresh)
     
     def refresh_session_info(self):
-        """Refresh session information and balance"""
-        try:
-            # Refresh balance
-            self.refresh_balance()
-            
-            # Refresh session info if labels exist
-            if hasattr(self, 'session_time_label') and hasattr(self, 'remaining_label'):
-                cursor = self.app.db_connection.cursor(dictionary=True)
-                cursor.execute("""
-                    SELECT pc.session_start, u.session_time_limit
-                    FROM pc_units pc
-                    JOIN users u ON pc.current_user_id = u.user_id
-                    WHERE pc.unit_name = %s AND pc.current_user_id = %s
-                """, (self.app.selected_pc, self.app.current_user['user_id']))
-                session_data = cursor.fetchone()
-                cursor.close()
-                
-                if session_data and session_data['session_start']:
-                    from datetime import datetime
-                    duration = datetime.now() - session_data['session_start']
-                    elapsed_minutes = int(duration.total_seconds() / 60)
-                    remaining_minutes = max(0, session_data['session_time_limit'] - elapsed_minutes)
-                    
-                    hours, minutes = divmod(elapsed_minutes, 60)
-                    rem_hours, rem_mins = divmod(remaining_minutes, 60)
-                    
-                    self.session_time_label.config(text=f"{hours:02d}:{minutes:02d}")
-                    
-                    # Color coding for time warnings
-                    if remaining_minutes <= 10:
-                        time_color = "#e74c3c"  # Red
-                    elif remaining_minutes < 30:
-                        time_color = "#FFA726"  # Orange
-                    else:
-                        time_color = self.app.text_secondary
-                    
-                    self.remaining_label.config(text=f"Left: {rem_hours:02d}:{rem_mins:02d}", fg=time_color)
-                    
-        except Error as e:
-            print(f"Error refreshing session info: {e}")
-
-
-            
\ No newline at end of file
+        """Refresh session information and balance; the reads run on the database worker"""
+        self.refresh_balance()
+        self.app.db_executor.submit(
+            prepared.fetchone, SESSION_QUERY, (self.app.selected_pc, self.app.current_user['user_id']),
+            on_success=self.on_session_refreshed,
+            on_error=self.on_session_refresh_error
+        )
+    
+    def on_session_refreshed(self, session_data):
+        # The user logged out or left the screen while the read was in flight
+        if not self.app.current_user or not self.winfo_exists():
+            return
+        if not session_data or not session_data['session_start']:
+            self.session_time_label.config(text="No Session", fg=self.app.text_secondary)
+            self.remaining_label.config(text="")
+            return
+        
+        duration = datetime.now() - session_data['session_start']
+        elapsed_minutes = int(duration.total_seconds() / 60)
+        remaining_minutes = max(0, session_data['session_time_limit'] - elapsed_minutes)
+        
+        hours, minutes = divmod(elapsed_minutes, 60)
+        rem_hours, rem_mins = divmod(remaining_minutes, 60)
+        
+        self.session_time_label.config(text=f"{hours:02d}:{minutes:02d}", fg=self.app.accent_color)
+        
+        # Color coding for time warnings
+        if remaining_minutes <= 10:
+            time_color = "#e74c3c"  # Red
+        elif remaining_minutes < 30:
+            time_color = "#FFA726"  # Orange
+        else:
+            time_color = self.app.text_secondary
+        
+        self.remaining_label.config(text=f"Left: {rem_hours:02d}:{rem_mins:02d}", fg=time_color)
+    
+    def on_session_refresh_error(self, e):
+        print(f"Error refreshing session info: {e}")
+        # Keep the last good reading; only a screen that never loaded shows the error
+        if self.winfo_exists() and self.session_time_label.cget('text') == "--:--":
+            self.session_time_label.config(text="Error", fg="#e74c3c")